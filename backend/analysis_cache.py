@@ -0,0 +1,137 @@
+"""
+Caché LRU de análisis de manos
+Guarda sugerencias y análisis de bots por huella de la mano (multiconjunto de cartas + contrato)
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List
+
+from card_codec import codificar_mano
+
+CAPACIDAD_POR_DEFECTO = 4096
+
+
+class _PosicionCarta(int):
+    """Marca una carta de la mano dentro de un resultado guardado en caché"""
+
+
+def huella_mano(codigos: Iterable[int], contrato: int, etiqueta: str = '') -> bytes:
+    """
+    Huella canónica de una mano: códigos ordenados (un byte por carta) + contrato
+    Dos manos con las mismas cartas en distinto orden tienen la misma huella
+    """
+    return etiqueta.encode() + bytes([contrato & 0xFF]) + bytes(sorted(codigos))
+
+
+class CacheLRU:
+    """
+    Caché LRU acotada con contadores de aciertos, fallos y desalojos
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_POR_DEFECTO):
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self._lock = Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener(self, clave: Any, calcular: Callable[[], Any]) -> Any:
+        """Devuelve el valor guardado o lo calcula y lo guarda"""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave]
+            self.fallos += 1
+
+        valor = calcular()
+
+        with self._lock:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            self._recortar()
+        return valor
+
+    def redimensionar(self, capacidad: int):
+        with self._lock:
+            self.capacidad = capacidad
+            self._recortar()
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = 0
+            self.fallos = 0
+            self.desalojos = 0
+
+    def _recortar(self):
+        while len(self._entradas) > self.capacidad:
+            self._entradas.popitem(last=False)
+            self.desalojos += 1
+
+    def estadisticas(self) -> Dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            'capacidad': self.capacidad,
+            'entradas': len(self._entradas),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'desalojos': self.desalojos,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0
+        }
+
+
+# Caché compartida por la lógica del juego y los bots del proceso
+cache_analisis = CacheLRU()
+
+
+def _a_plantilla(valor: Any, posiciones: Dict[int, int]) -> Any:
+    if isinstance(valor, dict):
+        posicion = posiciones.get(id(valor))
+        if posicion is not None:
+            return _PosicionCarta(posicion)
+        return {k: _a_plantilla(v, posiciones) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_a_plantilla(v, posiciones) for v in valor]
+    if isinstance(valor, tuple):
+        return tuple(_a_plantilla(v, posiciones) for v in valor)
+    return valor
+
+
+def _desde_plantilla(valor: Any, cartas: List[Dict]) -> Any:
+    if isinstance(valor, _PosicionCarta):
+        return cartas[valor]
+    if isinstance(valor, dict):
+        return {k: _desde_plantilla(v, cartas) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_desde_plantilla(v, cartas) for v in valor]
+    if isinstance(valor, tuple):
+        return tuple(_desde_plantilla(v, cartas) for v in valor)
+    return valor
+
+
+def consultar_analisis(etiqueta: str, cartas: List[Dict], contrato: int,
+                       calcular: Callable[[List[Dict]], Any], cache: CacheLRU = None) -> Any:
+    """
+    Resuelve 'calcular(cartas)' pasando por la caché
+    Los resultados se guardan referenciando posiciones de la mano en orden canónico,
+    así un acierto devuelve las cartas del llamador y nunca objetos compartidos
+    """
+    if cache is None:
+        cache = cache_analisis
+
+    try:
+        codigos = codificar_mano(cartas)
+    except ValueError:
+        return calcular(cartas)
+
+    orden = sorted(range(len(cartas)), key=codigos.__getitem__)
+    canonicas = [cartas[i] for i in orden]
+
+    def calcular_plantilla():
+        posiciones = {id(carta): p for p, carta in enumerate(canonicas)}
+        return _a_plantilla(calcular(canonicas), posiciones)
+
+    plantilla = cache.obtener(huella_mano(codigos, contrato, etiqueta), calcular_plantilla)
+    return _desde_plantilla(plantilla, canonicas)
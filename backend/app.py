@@ -1,8 +1,8 @@
 from flask import Flask, request, jsonify, render_template, send_from_directory
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
-import pymysql
 import bcrypt
+import itertools
 import json
 from datetime import datetime, timedelta
 import random
@@ -10,27 +10,56 @@ import string
 import os
 from config import Config
 from game_logic import CariocaGameLogic
+from card_codec import TOTAL_CARTAS, decodificar_mano
+from analysis_cache import cache_analisis
+from game_manager import game_manager
+from bot_scheduler import PlanificadorBots
+from tournament_tables import TorneoMesas
+from db_pool import pool_conexiones
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
 app.config['SECRET_KEY'] = Config.SECRET_KEY
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, async_mode=Config.SOCKETIO_ASYNC_MODE, cors_allowed_origins="*")
 CORS(app)
 
 # Instancia de la lógica del juego
 game_logic = CariocaGameLogic()
+cache_analisis.redimensionar(Config.CACHE_ANALISIS_MAX_ENTRADAS)
+
+# Turnos de bots fuera del hilo de las peticiones
+planificador_bots = PlanificadorBots(
+    game_manager,
+    lambda evento, datos, sala: socketio.emit(evento, datos, to=sala),
+    trabajadores=Config.BOT_TRABAJADORES,
+    escala_pensamiento=Config.BOT_ESCALA_PENSAMIENTO
+)
 
 # Almacenar sesiones activas y partidas
 sesiones_activas = {}
 partidas_activas = {}
 salas_espera = {}
+torneos_activos = {}
+_ids_torneos = itertools.count(1)
+
+# El servidor programa cada turno de bot (al iniciar la partida y tras cada descarte);
+# los clientes solo reciben 'turno_bot' en la sala
+game_manager.al_turno_bot = planificador_bots.programar_turno
+
+def partida_terminada(partida_id, resultado):
+    """Fin de la última ronda: sin turnos de bots pendientes y aviso a la sala"""
+    planificador_bots.cancelar_partida(partida_id)
+    partidas_activas.pop(partida_id, None)
+    socketio.emit('partida_terminada', {'partida_id': partida_id, **resultado}, to=f"partida_{partida_id}")
+
+game_manager.al_terminar_partida = partida_terminada
+
 # Perfil de usuario: ver y modificar
 
 @app.route('/perfil/<int:user_id>', methods=['GET'])
 def ver_perfil(user_id):
     """Obtener información del perfil de un usuario"""
     try:
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 cursor.execute("""
                     SELECT id, nombre, email, avatar, nivel, experiencia, victorias, derrotas
@@ -40,8 +69,6 @@ def ver_perfil(user_id):
                 if not perfil:
                     return jsonify({"error": "Usuario no encontrado"}), 404
                 return jsonify(perfil), 200
-        finally:
-            connection.close()
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
 
@@ -57,8 +84,7 @@ def modificar_perfil(user_id):
         if not any([nombre, avatar, email]):
             return jsonify({"error": "No se enviaron datos para actualizar"}), 400
 
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 # Verificar si el nuevo nombre o email ya existen (y no es el mismo usuario)
                 if nombre:
@@ -87,8 +113,6 @@ def modificar_perfil(user_id):
                 cursor.execute(sql, tuple(valores))
                 connection.commit()
                 return jsonify({"mensaje": "Perfil actualizado correctamente"}), 200
-        finally:
-            connection.close()
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
 # Servir archivos estáticos
@@ -100,17 +124,6 @@ def serve_index():
 def serve_static(path):
     return send_from_directory('../frontend', path)
 
-# Conexión a la base de datos
-def get_db_connection():
-    return pymysql.connect(
-        host=Config.DB_HOST,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD,
-        database=Config.DB_NAME,
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
-    )
-
 @app.route('/api/status')
 def api_status():
     return jsonify({
@@ -126,10 +139,14 @@ def api_status():
             "/crear_sala - POST",
             "/unirse_sala - POST",
             "/stats/<user_id> - GET",
+            "/torneos - POST",
+            "/torneos/<torneo_id> - GET",
             "/contratos - GET",
             "/cartas - GET",
             "/cartas/test - GET"
         ],
+        "cache_analisis": game_logic.estadisticas_cache(),
+        "pool_db": pool_conexiones.estadisticas(),
         "cartas_totales": 112,
         "distribución": {
             "cartas_normales": 104,
@@ -152,8 +169,7 @@ def register():
         # Encriptar contraseña
         password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
         
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 # Verificar si el usuario ya existe por email
                 cursor.execute("SELECT id FROM usuarios WHERE email = %s", (email,))
@@ -196,8 +212,6 @@ def register():
                     "nombre": nombre
                 }), 201
                 
-        finally:
-            connection.close()
             
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
@@ -212,8 +226,7 @@ def login():
         if not all([email, password]):
             return jsonify({"error": "Email y contraseña son obligatorios"}), 400
         
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 cursor.execute(
                     "SELECT id, nombre, password, victorias, derrotas, nivel, experiencia FROM usuarios WHERE email = %s",
@@ -245,8 +258,6 @@ def login():
                 else:
                     return jsonify({"error": "Contraseña incorrecta"}), 401
                     
-        finally:
-            connection.close()
             
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
@@ -255,14 +266,11 @@ def login():
 def get_contratos():
     """Obtener información de todos los contratos"""
     try:
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 cursor.execute("SELECT * FROM contratos ORDER BY numero_contrato")
                 contratos = cursor.fetchall()
                 return jsonify(contratos), 200
-        finally:
-            connection.close()
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
 
@@ -289,9 +297,9 @@ def crear_sala():
         
         # Generar código único para la sala
         codigo_sala = generar_codigo_sala()
+        completa = 1 + len(configuracion_bots) >= max_jugadores
         
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 # Crear la partida
                 cursor.execute("""
@@ -324,22 +332,22 @@ def crear_sala():
                     UPDATE partidas SET jugadores_actuales = %s WHERE id = %s
                 """, (1 + len(configuracion_bots), partida_id))
                 
-                connection.commit()
-                
-                # Inicializar partida en memoria si está completa
-                if 1 + len(configuracion_bots) >= max_jugadores:
-                    inicializar_partida_carioca(partida_id)
-                
-                return jsonify({
-                    "mensaje": "Sala creada exitosamente",
-                    "partida_id": partida_id,
-                    "codigo_sala": codigo_sala,
-                    "jugadores_actuales": 1 + len(configuracion_bots),
-                    "max_jugadores": max_jugadores
-                }), 201
+                # Repartir en la misma transacción si la sala está completa
+                if completa:
+                    estado = inicializar_partida_carioca(cursor, partida_id)
                 
-        finally:
-            connection.close()
+                connection.commit()
+        
+        if completa:
+            partida_iniciada(partida_id, estado)
+        
+        return jsonify({
+            "mensaje": "Sala creada exitosamente",
+            "partida_id": partida_id,
+            "codigo_sala": codigo_sala,
+            "jugadores_actuales": 1 + len(configuracion_bots),
+            "max_jugadores": max_jugadores
+        }), 201
             
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
@@ -355,8 +363,7 @@ def unirse_sala():
         if not all([user_id, codigo_sala]):
             return jsonify({"error": "ID de usuario y código de sala requeridos"}), 400
         
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 # Buscar la partida
                 cursor.execute("""
@@ -409,22 +416,23 @@ def unirse_sala():
                     UPDATE partidas SET jugadores_actuales = %s WHERE id = %s
                 """, (nuevos_jugadores, partida['id']))
                 
-                connection.commit()
-                
-                # Si la sala está completa, inicializar partida
-                if nuevos_jugadores >= partida['max_jugadores']:
-                    inicializar_partida_carioca(partida['id'])
-                
-                return jsonify({
-                    "mensaje": "Te uniste a la sala exitosamente",
-                    "partida_id": partida['id'],
-                    "posicion": nueva_posicion,
-                    "jugadores_actuales": nuevos_jugadores,
-                    "max_jugadores": partida['max_jugadores']
-                }), 200
+                # Si la sala está completa, repartir en la misma transacción
+                completa = nuevos_jugadores >= partida['max_jugadores']
+                if completa:
+                    estado = inicializar_partida_carioca(cursor, partida['id'])
                 
-        finally:
-            connection.close()
+                connection.commit()
+        
+        if completa:
+            partida_iniciada(partida['id'], estado)
+        
+        return jsonify({
+            "mensaje": "Te uniste a la sala exitosamente",
+            "partida_id": partida['id'],
+            "posicion": nueva_posicion,
+            "jugadores_actuales": nuevos_jugadores,
+            "max_jugadores": partida['max_jugadores']
+        }), 200
             
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
@@ -432,8 +440,7 @@ def unirse_sala():
 @app.route('/stats/<int:user_id>')
 def get_stats(user_id):
     try:
-        connection = get_db_connection()
-        try:
+        with pool_conexiones.conexion() as connection:
             with connection.cursor() as cursor:
                 cursor.execute("""
                     SELECT u.nombre, u.victorias, u.derrotas, u.puntos_totales, u.nivel, u.experiencia,
@@ -457,168 +464,83 @@ def get_stats(user_id):
                 
                 return jsonify(stats), 200
                 
-        finally:
-            connection.close()
             
     except Exception as e:
         return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
 
-def generar_codigo_sala():
-    """Generar código único de 6 caracteres para la sala"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-
-def inicializar_partida_carioca(partida_id):
-    """Inicializar una partida de Carioca con todas las reglas"""
+@app.route('/torneos', methods=['POST'])
+def crear_torneo():
+    """Crear un torneo por mesas; las mesas con humanos se juegan en el servidor"""
     try:
-        connection = get_db_connection()
+        data = request.get_json() or {}
+        participantes = data.get('participantes')
+        mesas = data.get('mesas')
+        
+        if not participantes or not mesas:
+            return jsonify({"error": "Participantes y mesas requeridos"}), 400
+        
         try:
-            with connection.cursor() as cursor:
-                # Obtener jugadores de la partida
-                cursor.execute("""
-                    SELECT id, usuario_id, posicion, es_bot, nombre_bot, dificultad_bot
-                    FROM partida_jugadores 
-                    WHERE partida_id = %s 
-                    ORDER BY posicion
-                """, (partida_id,))
-                
-                jugadores = cursor.fetchall()
-                
-                # Crear mazo completo
-                mazo = crear_mazo_carioca()
-                random.shuffle(mazo)
-                
-                # Repartir cartas para el primer contrato (11 cartas cada uno)
-                cartas_por_jugador = 11
-                cartas_repartidas = 0
-                
-                for i, jugador in enumerate(jugadores):
-                    cartas_jugador = mazo[cartas_repartidas:cartas_repartidas + cartas_por_jugador]
-                    cartas_repartidas += cartas_por_jugador
-                    
-                    # Actualizar cartas en mano del jugador
-                    cursor.execute("""
-                        UPDATE partida_jugadores 
-                        SET cartas_en_mano = %s 
-                        WHERE id = %s
-                    """, (json.dumps(cartas_jugador), jugador['id']))
-                
-                # Cartas restantes en el mazo
-                mazo_restante = mazo[cartas_repartidas:]
-                
-                # Primera carta del descarte
-                carta_descarte = mazo_restante.pop(0)
-                descarte = [carta_descarte]
-                
-                # Crear estado del juego
-                cursor.execute("""
-                    INSERT INTO estado_juego (partida_id, mazo, descarte, ultima_carta_descartada, jugador_turno_id)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (partida_id, json.dumps(mazo_restante), json.dumps(descarte), 
-                      json.dumps(carta_descarte), jugadores[0]['id']))
-                
-                # Actualizar estado de la partida
-                cursor.execute("""
-                    UPDATE partidas 
-                    SET estado = 'en_curso', contrato_actual = 1, fecha_inicio = NOW()
-                    WHERE id = %s
-                """, (partida_id,))
-                
-                connection.commit()
-                
-                # Guardar en memoria para acceso rápido
-                partidas_activas[partida_id] = {
-                    'jugadores': jugadores,
-                    'contrato_actual': 1,
-                    'turno_actual': 0,
-                    'estado': 'en_curso'
-                }
-                
-                print(f"Partida {partida_id} inicializada con {len(jugadores)} jugadores")
-                
-        finally:
-            connection.close()
-            
+            torneo = TorneoMesas(game_manager, participantes, mesas, semilla=data.get('semilla', 0),
+                                 ruta_repartos=Config.RUTA_REPARTOS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        torneo_id = next(_ids_torneos)
+        torneos_activos[torneo_id] = torneo
+        resumen = torneo.iniciar()
+        
+        return jsonify({"torneo_id": torneo_id, **resumen}), 201
+        
     except Exception as e:
-        print(f"Error inicializando partida {partida_id}: {str(e)}")
+        return jsonify({"error": f"Error en el servidor: {str(e)}"}), 500
 
-def crear_mazo_carioca():
-    """Crear mazo completo de 112 cartas para Carioca (2 barajas + 8 jokers)"""
-    mazo = []
-    
-    # Palos y valores
-    palos = ['corazones', 'diamantes', 'treboles', 'picas']
-    valores = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-    
-    # Símbolos para los palos
-    simbolos_palos = {
-        'corazones': '♥️',
-        'diamantes': '♦️',
-        'treboles': '♣️',
-        'picas': '♠️'
-    }
-    
-    # Valores numéricos para ordenamiento y cálculos
-    valores_numericos = {
-        'A': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, 
-        '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13
-    }
+@app.route('/torneos/<int:torneo_id>')
+def ver_torneo(torneo_id):
+    """Posiciones del torneo con las mesas terminadas hasta ahora"""
+    torneo = torneos_activos.get(torneo_id)
+    if torneo is None:
+        return jsonify({"error": "Torneo no encontrado"}), 404
     
-    # Colores de las barajas
-    colores_baraja = {
-        'roja': '#DC2626',
-        'azul': '#2563EB'
+    return jsonify({
+        "torneo_id": torneo_id,
+        "terminado": torneo.terminado(),
+        "mesas_servidor": torneo.partidas,
+        "errores": torneo.errores,
+        "posiciones": torneo.posiciones()
+    }), 200
+
+def generar_codigo_sala():
+    """Generar código único de 6 caracteres para la sala"""
+    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+
+def inicializar_partida_carioca(cursor, partida_id):
+    """
+    Inicializar una partida de Carioca con todas las reglas
+    Reparte con game_manager (mismas cartas por contrato y mismo descarte que sus partidas)
+    usando el cursor de quien llama y sin confirmar: la transacción es la misma que completa
+    la sala. Devuelve el estado en memoria, que se registra tras el commit
+    """
+    return game_manager._repartir_partida(cursor, partida_id)
+
+def partida_iniciada(partida_id, estado):
+    """Tras confirmar el reparto (y devolver la conexión): memoria y primer turno de bot"""
+    # Guardar en memoria para acceso rápido
+    partidas_activas[partida_id] = {
+        'jugadores': estado.jugadores,
+        'contrato_actual': 1,
+        'turno_actual': 0,
+        'estado': 'en_curso'
     }
     
-    # Crear dos barajas completas (roja y azul)
-    for baraja in ['roja', 'azul']:
-        # Cartas normales (52 por baraja = 104 cartas totales)
-        for palo in palos:
-            for valor in valores:
-                carta_id = f"{valor}_{palo}_{baraja}"
-                mazo.append({
-                    'id': carta_id,
-                    'nombre': f"{valor} de {palo.title()}",
-                    'palo': palo,
-                    'valor': valor,
-                    'valor_numerico': valores_numericos[valor],
-                    'simbolo_palo': simbolos_palos[palo],
-                    'es_comodin': False,
-                    'es_joker': False,
-                    'color_carta': 'rojo' if palo in ['corazones', 'diamantes'] else 'negro',
-                    'color_baraja': colores_baraja[baraja],
-                    'baraja': baraja,
-                    'imagen': f"assets/cartas/frontal/{valor}_{palo}.png",
-                    'imagen_reverso': f"assets/cartas/reverso/{baraja}.png",
-                    'puntos': 10 if valor in ['J', 'Q', 'K'] else (15 if valor == 'A' else valores_numericos[valor])
-                })
-        
-        # 4 Jokers por baraja (8 jokers totales)
-        for i in range(1, 5):
-            joker_id = f"joker{i}_{baraja}"
-            mazo.append({
-                'id': joker_id,
-                'nombre': f"Joker {i} ({baraja.title()})",
-                'palo': 'joker',
-                'valor': 'joker',
-                'valor_numerico': 0,  # Los jokers pueden representar cualquier valor
-                'simbolo_palo': '🃏',
-                'es_comodin': True,
-                'es_joker': True,
-                'color_carta': 'multicolor',
-                'color_baraja': colores_baraja[baraja],
-                'baraja': baraja,
-                'imagen': f"assets/cartas/frontal/joker{i}_{baraja}.png",
-                'imagen_reverso': f"assets/cartas/reverso/{baraja}.png",
-                'puntos': 25  # Los jokers valen 25 puntos
-            })
-    
-    print(f"🃏 Mazo completo creado: {len(mazo)} cartas")
-    print(f"📊 Distribución:")
-    print(f"   - Cartas normales: 104 (52 por baraja x 2 barajas)")
-    print(f"   - Jokers: 8 (4 por baraja x 2 barajas)")
-    print(f"   - Total: {len(mazo)} cartas")
+    print(f"Partida {partida_id} inicializada con {len(estado.jugadores)} jugadores")
     
-    return mazo
+    # Registra el estado vivo; si empieza un bot, su turno se programa aquí
+    game_manager._partida_iniciada(estado)
+
+def crear_mazo_carioca():
+    """Crear mazo completo de 112 cartas para Carioca (2 barajas + 8 jokers)"""
+    # Copias del catálogo de card_codec (armado una vez); el orden coincide con los códigos 0-111
+    return decodificar_mano(range(TOTAL_CARTAS))
 
 @app.route('/cartas')
 def get_cartas():
@@ -726,6 +648,7 @@ def on_unirse_partida(data):
 def obtener_estado_partida(partida_id, user_id):
     """Obtener el estado actual de la partida para un jugador"""
     return {
+        **game_manager.contexto_turno(partida_id, usuario_id=user_id),
         "partida_id": partida_id,
         "user_id": user_id,
         "estado": "conectado"
@@ -0,0 +1,324 @@
+"""
+Inferencia de bots por lotes
+Junta las decisiones pendientes de muchas mesas en cada tick y calcula con NumPy, para
+todos los bots a la vez, la utilidad de la carta del descarte y el valor de cada
+descarte posible; las mismas fórmulas que CariocaBotAI, con las manos como matrices
+"""
+import random
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_scoring import SIN_CARTA, matriz_codigos
+from bot_ai import CariocaBotAI
+from card_codec import ES_COMODIN, FORMA, FORMA_JOKER, PALO, PUNTOS, RANGO, TOTAL_CARTAS, codificar_carta, codificar_mano
+from card_memory import COPIAS_POR_FORMA, COPIAS_POR_RANGO
+from contract_distance import cartas_esenciales
+
+# Tablas de 256 entradas indexadas por código; el relleno cae en la forma 53 (descartada)
+_FORMAS = FORMA_JOKER + 2
+_FORMA = np.full(256, FORMA_JOKER + 1, np.int64)
+_FORMA[:TOTAL_CARTAS] = FORMA
+_RANGO = np.ones(256, np.int64)
+_RANGO[:TOTAL_CARTAS] = [r or 1 for r in RANGO]
+_PALO = np.zeros(256, np.int64)
+_PALO[:TOTAL_CARTAS] = [p if p < 4 else 0 for p in PALO]
+_ES_COMODIN = np.zeros(256, bool)
+_ES_COMODIN[:TOTAL_CARTAS] = ES_COMODIN
+_ES_CARTA = np.zeros(256, bool)
+_ES_CARTA[:TOTAL_CARTAS] = True
+_PUNTOS = np.zeros(256, np.float64)
+_PUNTOS[:TOTAL_CARTAS] = PUNTOS
+_BITS_RANGO = 1 << np.arange(13)
+
+
+class SolicitudBot:
+    """
+    Decisión pendiente de un bot
+    tipo: 'accion' (bajar o robar, como decidir_accion), 'robo' o 'descarte'
+    """
+
+    def __init__(self, clave: Any, bot: CariocaBotAI, tipo: str, cartas_mano: List[Dict],
+                 contrato_actual: int, estado_juego: Optional[Dict] = None,
+                 despachar: Optional[Callable[[Dict], Any]] = None):
+        self.clave = clave
+        self.bot = bot
+        self.tipo = tipo
+        self.cartas_mano = cartas_mano
+        self.contrato_actual = contrato_actual
+        self.estado_juego = estado_juego or {}
+        self.despachar = despachar
+
+
+class _LoteManos:
+    """
+    Conteos de un lote de manos: copias por forma (B x 4 x 13, con dos columnas de
+    relleno a cada lado para consultar vecinos de escala) y cartas por rango
+    """
+
+    def __init__(self, manos: Sequence[Sequence[int]]):
+        self.codigos = matriz_codigos(manos).astype(np.int64)
+        self.n = len(manos)
+        filas = np.repeat(np.arange(self.n), self.codigos.shape[1])
+        conteos = np.bincount(filas * _FORMAS + _FORMA[self.codigos].ravel(),
+                              minlength=self.n * _FORMAS).reshape(self.n, _FORMAS)
+        self.comodines = conteos[:, FORMA_JOKER]
+        self.total = _ES_CARTA[self.codigos].sum(axis=1)
+        self.copias = np.zeros((self.n, 4, 17), np.int64)
+        self.copias[:, :, 2:15] = conteos[:, :FORMA_JOKER].reshape(self.n, 4, 13)
+        self.por_rango = self.copias.sum(axis=1)  # columna r + 1 = rango r
+
+    def copias_en(self, filas, palos, rangos, desplazamiento: int):
+        """Copias en mano de (palo, rango + desplazamiento); 0 fuera de A..K"""
+        return self.copias[filas, palos, rangos + 1 + desplazamiento]
+
+
+def _memorias(bots: Sequence[CariocaBotAI]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cartas vistas (sin las que están en la mano propia) por forma y por rango, factor de
+    memoria y total visto de cada bot
+    """
+    n = len(bots)
+    por_forma = np.zeros((n, FORMA_JOKER + 1), np.float64)
+    por_rango = np.zeros((n, 14), np.float64)
+    factores = np.zeros(n, np.float64)
+    totales = np.zeros(n, np.float64)
+    for b, bot in enumerate(bots):
+        memoria = bot.memoria
+        por_forma[b] = memoria.por_forma
+        por_rango[b] = memoria.por_rango
+        for forma, veces in memoria._mano_forma.items():
+            por_forma[b, forma] -= veces
+        for rango, veces in memoria._mano_rango.items():
+            por_rango[b, rango] -= veces
+        factores[b] = memoria.factor
+        totales[b] = memoria.total - memoria._mano_total
+    return por_forma, por_rango, factores, totales
+
+
+def utilidades_carta(lote: _LoteManos, cartas: np.ndarray) -> np.ndarray:
+    """Utilidad de una carta externa (la del descarte) para cada mano, como evaluar_utilidad_carta"""
+    filas = np.arange(lote.n)
+    palos = _PALO[cartas]
+    rangos = _RANGO[cartas]
+    mismo_valor = lote.por_rango[filas, rangos + 1]
+    utilidad = np.where(mismo_valor >= 2, 0.8, np.where(mismo_valor == 1, 0.4, 0.0))
+    utilidad = utilidad + 0.6 * (lote.copias_en(filas, palos, rangos, -1) + lote.copias_en(filas, palos, rangos, 1))
+    utilidad = utilidad + 0.3 * (lote.copias_en(filas, palos, rangos, -2) + lote.copias_en(filas, palos, rangos, 2))
+    return np.where(_ES_COMODIN[cartas], 0.9, np.minimum(utilidad, 1.0))
+
+
+def probabilidades_utiles(lote: _LoteManos, bots: Sequence[CariocaBotAI]) -> np.ndarray:
+    """Probabilidad por mano de que un robo a ciegas sirva (MemoriaCartas.probabilidad_util)"""
+    por_forma, _, factores, totales = _memorias(bots)
+    copias = lote.copias[:, :, 2:15]
+    presentes = copias > 0
+    vecinas = np.zeros_like(presentes)
+    vecinas[:, :, 1:] |= presentes[:, :, :-1]
+    vecinas[:, :, :-1] |= presentes[:, :, 1:]
+    trios = (lote.por_rango[:, 2:15] >= 2)[:, None, :]
+    candidatas = (vecinas & ~presentes) | trios
+
+    libres = (2 - copias) - factores[:, None, None] * por_forma[:, :FORMA_JOKER].reshape(-1, 4, 13)
+    utiles = np.where(candidatas & (libres > 0), libres, 0.0).sum(axis=(1, 2))
+    utiles += np.maximum(0.0, (COPIAS_POR_FORMA[FORMA_JOKER] - lote.comodines)
+                         - factores * por_forma[:, FORMA_JOKER])
+    ocultas = np.maximum(1.0, (TOTAL_CARTAS - lote.total) - factores * totales)
+    return np.minimum(1.0, utiles / ocultas)
+
+
+def perdidas_distancia(lote: _LoteManos,
+                       requeridos: Sequence[Optional[Tuple[int, int]]]) -> np.ndarray:
+    """
+    CariocaBotAI.perdidas_distancia para todo el lote (B x cartas): las máscaras de cada
+    mano salen de la matriz de copias y una sola búsqueda por mano (la caché de
+    cartas_esenciales) da las cartas esenciales
+    requeridos: (tríos, escalas) del contrato de cada mano, None si no es válido
+    """
+    copias = lote.copias[:, :, 2:15]
+    simples = ((copias >= 1) * _BITS_RANGO).sum(axis=2).tolist()
+    dobles = ((copias >= 2) * _BITS_RANGO).sum(axis=2).tolist()
+    comodines = lote.comodines.tolist()
+    perdidas = np.zeros(lote.codigos.shape, np.float64)
+
+    for b, fila in enumerate(lote.codigos.tolist()):
+        if requeridos[b] is None:
+            continue
+        faltan, esenciales = cartas_esenciales(tuple(simples[b]), tuple(dobles[b]), requeridos[b])
+        perdida = max(0, faltan + 1 - comodines[b]) - max(0, faltan - comodines[b])
+        for i, codigo in enumerate(fila):
+            if codigo == SIN_CARTA:
+                break
+            if ES_COMODIN[codigo] or esenciales[PALO[codigo]] >> (RANGO[codigo] - 1) & 1:
+                perdidas[b, i] = perdida
+    return perdidas
+
+
+def valores_descarte(lote: _LoteManos, bots: Sequence[CariocaBotAI],
+                     perdidas: np.ndarray) -> np.ndarray:
+    """
+    Valor de conservar cada carta (B x cartas) como evaluar_descartes; el relleno vale infinito
+    """
+    codigos = lote.codigos
+    filas = np.arange(lote.n)[:, None]
+    palos = _PALO[codigos]
+    rangos = _RANGO[codigos]
+
+    mismo_valor = lote.por_rango[filas, rangos + 1] - 1
+    utilidad = np.where(mismo_valor >= 2, 0.8, np.where(mismo_valor == 1, 0.4, 0.0))
+    utilidad = utilidad + 0.6 * (lote.copias_en(filas, palos, rangos, -1) + lote.copias_en(filas, palos, rangos, 1))
+    utilidad = utilidad + 0.3 * (lote.copias_en(filas, palos, rangos, -2) + lote.copias_en(filas, palos, rangos, 2))
+
+    # Vigencia según las cartas vistas (MemoriaCartas.vigencia)
+    por_forma, por_rango, factores, _ = _memorias(bots)
+    factores = factores[:, None]
+    en_mano = lote.por_rango[filas, rangos + 1]
+    vivas = np.maximum(0.0, (COPIAS_POR_RANGO - en_mano) - factores * por_rango[filas, rangos])
+    for desplazamiento in (-1, 1):
+        vecino = rangos + desplazamiento
+        valido = (vecino >= 1) & (vecino <= 13)
+        forma = np.clip(palos * 13 + vecino - 1, 0, FORMA_JOKER - 1)
+        restantes = np.maximum(0.0, (2 - lote.copias_en(filas, palos, rangos, desplazamiento))
+                               - factores * por_forma[filas, forma])
+        vivas = vivas + np.where(valido, restantes, 0.0)
+    vigencia = np.minimum(1.0, 0.5 + vivas / 4)
+
+    utilidad = np.where(_ES_COMODIN[codigos], 0.9, np.minimum(utilidad, 1.0) * vigencia)
+    valores = utilidad + 0.5 * perdidas - 0.2 * _PUNTOS[codigos] / 25
+    return np.where(codigos == SIN_CARTA, np.inf, valores)
+
+
+class ProgramadorBots:
+    """
+    Cola de decisiones de bots que se resuelven por lotes en cada tick
+    Los bots con búsqueda Monte Carlo y las bajadas se resuelven con la ruta de siempre
+    """
+
+    def __init__(self):
+        self._pendientes: List[SolicitudBot] = []
+        self._lock = Lock()
+
+    def encolar(self, clave: Any, bot: CariocaBotAI, tipo: str, cartas_mano: List[Dict],
+                contrato_actual: int, estado_juego: Optional[Dict] = None,
+                despachar: Optional[Callable[[Dict], Any]] = None) -> SolicitudBot:
+        solicitud = SolicitudBot(clave, bot, tipo, cartas_mano, contrato_actual, estado_juego, despachar)
+        with self._lock:
+            self._pendientes.append(solicitud)
+        return solicitud
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._pendientes)
+
+    def tick(self) -> List[Tuple[Any, Dict]]:
+        """
+        Resuelve todo lo encolado hasta ahora y despacha cada decisión a su partida
+        Devuelve (clave, decisión) en el orden en que se encolaron
+        """
+        with self._lock:
+            solicitudes, self._pendientes = self._pendientes, []
+        if not solicitudes:
+            return []
+
+        decisiones: Dict[int, Dict] = {}
+        robos = []
+        for i, solicitud in enumerate(solicitudes):
+            if solicitud.tipo == 'accion':
+                bajada = solicitud.bot.decidir_bajada(solicitud.cartas_mano, solicitud.contrato_actual)
+                if bajada:
+                    decisiones[i] = bajada
+                    continue
+            if solicitud.tipo in ('accion', 'robo'):
+                robos.append(i)
+
+        for i, roba_descarte in zip(robos, decidir_robos([solicitudes[i] for i in robos])):
+            decisiones[i] = {'accion': 'robar_descarte' if roba_descarte else 'robar_mazo'}
+
+        descartes = [i for i, s in enumerate(solicitudes) if s.tipo == 'descarte']
+        for i, decision in zip(descartes, decidir_descartes([solicitudes[i] for i in descartes])):
+            decisiones[i] = decision
+
+        resultados = []
+        for i, solicitud in enumerate(solicitudes):
+            decision = decisiones.get(i, {'error': f"Tipo de decisión desconocido: {solicitud.tipo}"})
+            if solicitud.despachar:
+                solicitud.despachar(decision)
+            resultados.append((solicitud.clave, decision))
+        return resultados
+
+
+def _usa_busqueda(solicitud: SolicitudBot) -> bool:
+    bot = solicitud.bot
+    return bot._contexto_busqueda(solicitud.estado_juego, solicitud.cartas_mano,
+                                  solicitud.contrato_actual) is not None
+
+
+def decidir_robos(solicitudes: Sequence[SolicitudBot]) -> List[bool]:
+    """
+    debe_robar_descarte para muchos bots: True si roban la carta del descarte
+    """
+    resultados: List[Optional[bool]] = [None] * len(solicitudes)
+    lote_idx = []
+    for i, solicitud in enumerate(solicitudes):
+        estado = solicitud.estado_juego
+        if not estado.get('ultima_carta_descartada'):
+            solicitud.bot.memoria.sincronizar(estado, codificar_mano(solicitud.cartas_mano))
+            resultados[i] = False
+        elif _usa_busqueda(solicitud):
+            resultados[i] = solicitud.bot.debe_robar_descarte(estado, solicitud.cartas_mano,
+                                                              solicitud.contrato_actual)
+        else:
+            solicitud.bot.memoria.sincronizar(estado, codificar_mano(solicitud.cartas_mano))
+            lote_idx.append(i)
+
+    if lote_idx:
+        lote = _LoteManos([codificar_mano(solicitudes[i].cartas_mano) for i in lote_idx])
+        bots = [solicitudes[i].bot for i in lote_idx]
+        cartas = np.array([codificar_carta(solicitudes[i].estado_juego['ultima_carta_descartada'])
+                           for i in lote_idx], np.int64)
+        agresividad = np.array([bot.config[bot.dificultad]['agresividad'] for bot in bots])
+        umbrales = 0.3 + agresividad * 0.4 + 0.2 * probabilidades_utiles(lote, bots)
+        for i, roba in zip(lote_idx, utilidades_carta(lote, cartas) > umbrales):
+            resultados[i] = bool(roba)
+    return resultados
+
+
+def decidir_descartes(solicitudes: Sequence[SolicitudBot]) -> List[Dict]:
+    """
+    decidir_descarte para muchos bots con una sola evaluación vectorizada
+    """
+    resultados: List[Optional[Dict]] = [None] * len(solicitudes)
+    lote_idx = []
+    manos = []
+    requeridos = []
+    for i, solicitud in enumerate(solicitudes):
+        if _usa_busqueda(solicitud):
+            resultados[i] = solicitud.bot.decidir_descarte(solicitud.cartas_mano, solicitud.contrato_actual,
+                                                           estado_juego=solicitud.estado_juego)
+            continue
+        codigos = codificar_mano(solicitud.cartas_mano)
+        solicitud.bot.memoria.fijar_mano(codigos)
+        lote_idx.append(i)
+        manos.append(codigos)
+        contrato = solicitud.bot.game_logic.contratos.get(solicitud.contrato_actual)
+        requeridos.append((contrato['trios'], contrato['escalas']) if contrato else None)
+
+    if lote_idx:
+        lote = _LoteManos(manos)
+        mejores = np.argmin(valores_descarte(lote, [solicitudes[i].bot for i in lote_idx],
+                                             perdidas_distancia(lote, requeridos)), axis=1)
+
+        # El error de cada dificultad se sortea bot por bot, igual que en decidir_descarte
+        for i, mejor in zip(lote_idx, mejores):
+            solicitud = solicitudes[i]
+            bot = solicitud.bot
+            indice_descarte = int(mejor)
+            if random.random() < bot.config[bot.dificultad]['probabilidad_error']:
+                indice_descarte = random.randint(0, len(solicitud.cartas_mano) - 1)
+            resultados[i] = {
+                'accion': 'descartar',
+                'carta': solicitud.cartas_mano[indice_descarte],
+                'indice': indice_descarte
+            }
+    return resultados
@@ -0,0 +1,112 @@
+"""
+Puntaje y validación por lotes con NumPy
+Las manos y combinaciones se reciben como matrices de códigos de carta (una fila por
+mano o combinación) rellenas con SIN_CARTA; pensado para cierres de ronda,
+repeticiones y re-puntaje de partidas históricas
+"""
+from typing import Dict, Sequence
+
+import numpy as np
+
+from card_codec import BIT_RANGO, ES_COMODIN, PALO, PALO_JOKER, PUNTOS, TOTAL_CARTAS
+from meld_tables import BITS, HUECOS_ESCALA
+
+# Relleno para filas de distinto largo
+SIN_CARTA = 255
+
+# Tablas de 256 entradas indexadas por código (el relleno no suma ni cuenta)
+_PUNTOS = np.zeros(256, np.int32)
+_PUNTOS[:TOTAL_CARTAS] = PUNTOS
+_BIT_RANGO = np.zeros(256, np.uint16)
+_BIT_RANGO[:TOTAL_CARTAS] = BIT_RANGO
+_BIT_PALO = np.zeros(256, np.uint8)
+_BIT_PALO[:TOTAL_CARTAS] = [0 if p == PALO_JOKER else 1 << p for p in PALO]
+_ES_COMODIN = np.zeros(256, np.int16)
+_ES_COMODIN[:TOTAL_CARTAS] = ES_COMODIN
+_ES_CARTA = np.zeros(256, np.int16)
+_ES_CARTA[:TOTAL_CARTAS] = 1
+_BITS = np.frombuffer(BITS, np.uint8)
+_HUECOS = np.frombuffer(HUECOS_ESCALA, np.uint8)
+
+
+def matriz_codigos(filas: Sequence[Sequence[int]]) -> np.ndarray:
+    """
+    Empaqueta manos o combinaciones de distinto largo en una matriz uint8
+    """
+    ancho = max((len(fila) for fila in filas), default=0)
+    matriz = np.full((len(filas), max(ancho, 1)), SIN_CARTA, np.uint8)
+    for i, fila in enumerate(filas):
+        matriz[i, :len(fila)] = fila
+    return matriz
+
+
+def _como_matriz(filas) -> np.ndarray:
+    if isinstance(filas, np.ndarray) and filas.ndim == 2:
+        return filas.astype(np.uint8, copy=False)
+    return matriz_codigos(filas)
+
+
+def puntos_manos(manos) -> np.ndarray:
+    """Puntos de cada mano (una fila por jugador)"""
+    matriz = _como_matriz(manos)
+    return _PUNTOS[matriz].sum(axis=1)
+
+
+def validar_trios(combinaciones) -> np.ndarray:
+    """Vector booleano: cada fila es un trío válido"""
+    matriz = _como_matriz(combinaciones)
+    total = _ES_CARTA[matriz].sum(axis=1)
+    rangos = np.bitwise_or.reduce(_BIT_RANGO[matriz], axis=1)
+    return (total >= 3) & (_BITS[rangos] <= 1)
+
+
+def validar_escalas(combinaciones) -> np.ndarray:
+    """Vector booleano: cada fila es una escala válida"""
+    matriz = _como_matriz(combinaciones)
+    total = _ES_CARTA[matriz].sum(axis=1)
+    comodines = _ES_COMODIN[matriz].sum(axis=1)
+    normales = total - comodines
+    mascara = np.bitwise_or.reduce(_BIT_RANGO[matriz], axis=1)
+    palos = np.bitwise_or.reduce(_BIT_PALO[matriz], axis=1)
+
+    un_palo = (palos & (palos - 1)) == 0
+    con_cartas = (total >= 3) & (comodines >= _HUECOS[mascara])
+    solo_comodines = (normales == 0) & (comodines >= 3)
+    return un_palo & np.where(mascara == 0, solo_comodines, con_cartas)
+
+
+def validar_contratos(contratos: Dict[int, Dict], numeros: Sequence[int],
+                      jugadas: Sequence[Sequence[Dict]]) -> np.ndarray:
+    """
+    Valida muchas bajadas a la vez con las mismas reglas que validar_contrato
+    jugadas[i]: combinaciones {'tipo', 'cartas': códigos} del jugador i para el contrato numeros[i]
+    """
+    filas = {'trio': [], 'escala': []}
+    duenos = {'trio': [], 'escala': []}
+    for i, jugada in enumerate(jugadas):
+        for combinacion in jugada:
+            tipo = combinacion.get('tipo')
+            if tipo in filas:
+                filas[tipo].append(combinacion.get('cartas', []))
+                duenos[tipo].append(i)
+
+    n = len(jugadas)
+    validas = {}
+    conteos = {}
+    for tipo, validar in (('trio', validar_trios), ('escala', validar_escalas)):
+        if filas[tipo]:
+            resultado = validar(filas[tipo])
+            idx = np.asarray(duenos[tipo], np.int64)
+            conteos[tipo] = np.bincount(idx, weights=resultado, minlength=n)
+            validas[tipo] = np.bincount(idx, weights=~resultado, minlength=n) == 0
+        else:
+            conteos[tipo] = np.zeros(n)
+            validas[tipo] = np.ones(n, bool)
+
+    requeridos = np.array([
+        (contratos[k]['trios'], contratos[k]['escalas']) if k in contratos else (np.inf, np.inf)
+        for k in numeros
+    ], dtype=float).reshape(n, 2)
+
+    return (validas['trio'] & validas['escala'] &
+            (conteos['trio'] >= requeridos[:, 0]) & (conteos['escala'] >= requeridos[:, 1]))
@@ -0,0 +1,201 @@
+"""
+Micro-benchmarks del motor de reglas y de los bots
+Uso:
+    python backend/benchmark.py
+    python backend/benchmark.py --guardar base.json
+    python backend/benchmark.py --comparar base.json --tolerancia 0.15
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from analysis_cache import cache_analisis
+from bot_ai import CariocaBotAI
+from card_codec import ES_COMODIN, TOTAL_CARTAS, componer_codigo, decodificar_mano
+from contract_distance import _trios_usados, cartas_esenciales, cartas_faltantes
+from contract_solver import _mejores_trios
+from game_logic import CariocaGameLogic
+
+JOKERS = [c for c in range(TOTAL_CARTAS) if ES_COMODIN[c]]
+NORMALES = [c for c in range(TOTAL_CARTAS) if not ES_COMODIN[c]]
+
+
+def generar_casos(semilla: int, cantidad: int) -> List[Dict]:
+    """
+    Manos sintéticas reproducibles: 2 a 11 cartas, 0 a 8 jokers, los 10 contratos
+    """
+    rng = random.Random(semilla)
+    casos = []
+    for i in range(cantidad):
+        tamano = rng.randint(2, 11)
+        jokers = rng.randint(0, min(8, tamano))
+        codigos = rng.sample(JOKERS, jokers) + rng.sample(NORMALES, tamano - jokers)
+        rng.shuffle(codigos)
+
+        # Escala candidata: tramo de un palo con algún hueco o comodín
+        palo = rng.randrange(4)
+        bajo = rng.randint(1, 10)
+        largo = rng.randint(3, 14 - bajo)
+        escala = [componer_codigo(palo, r, rng.randrange(2)) for r in range(bajo, bajo + largo)]
+        if rng.random() < 0.5:
+            escala[rng.randrange(largo)] = rng.choice(JOKERS)
+
+        rango = rng.randint(1, 13)
+        trio = [componer_codigo(rng.randrange(4), rango, rng.randrange(2)) for _ in range(rng.randint(3, 5))]
+
+        casos.append({
+            'mano': decodificar_mano(codigos),
+            'contrato': i % 10 + 1,
+            'escala': decodificar_mano(escala),
+            'trio': decodificar_mano(trio),
+            'descarte': decodificar_mano([rng.randrange(TOTAL_CARTAS)])[0]
+        })
+    return casos
+
+
+def limpiar_caches():
+    """Vacía las cachés de análisis, distancias y tríos"""
+    cache_analisis.limpiar()
+    cartas_faltantes.cache_clear()
+    cartas_esenciales.cache_clear()
+    _trios_usados.cache_clear()
+    _mejores_trios.cache_clear()
+
+
+def medir(funcion: Callable[[Dict], object], casos: Sequence[Dict], repeticiones: int,
+          preparar: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    Mide cada llamada por separado y resume ops/s y percentiles de latencia
+    preparar: se llama antes de cada repetición (sin medir)
+    """
+    tiempos = []
+    reloj = time.perf_counter_ns
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        for caso in casos:
+            inicio = reloj()
+            funcion(caso)
+            tiempos.append(reloj() - inicio)
+
+    tiempos.sort()
+    total = sum(tiempos)
+    return {
+        'llamadas': len(tiempos),
+        'ops_por_segundo': len(tiempos) / (total / 1e9) if total else 0.0,
+        'p50_us': tiempos[len(tiempos) // 2] / 1000,
+        'p99_us': tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))] / 1000
+    }
+
+
+def definir_pruebas() -> Dict[str, Callable[[Dict], object]]:
+    logica = CariocaGameLogic()
+    bots = {dificultad: CariocaBotAI(dificultad) for dificultad in ('facil', 'medio', 'dificil')}
+
+    def jugada(caso):
+        return [{'tipo': 'trio', 'cartas': caso['trio']}, {'tipo': 'escala', 'cartas': caso['escala']}]
+
+    pruebas = {
+        'validar_trio': lambda c: logica.validar_trio(c['trio']),
+        'validar_escala': lambda c: logica.validar_escala(c['escala']),
+        'validar_contrato': lambda c: logica.validar_contrato(c['contrato'], jugada(c)),
+        'calcular_puntos_mano': lambda c: logica.calcular_puntos_mano(c['mano']),
+        'generar_sugerencias': lambda c: logica.generar_sugerencias(c['mano'], c['contrato']),
+        'resolver_contrato': lambda c: logica.resolver_contrato(c['mano'], c['contrato']),
+        'distancia_contratos': lambda c: logica.distancia_contratos(c['mano']),
+    }
+    for dificultad, bot in bots.items():
+        pruebas[f'decidir_accion[{dificultad}]'] = (
+            lambda c, bot=bot: bot.decidir_accion({'ultima_carta_descartada': c['descarte']},
+                                                  c['mano'], c['contrato'])
+        )
+        pruebas[f'decidir_descarte[{dificultad}]'] = (
+            lambda c, bot=bot: bot.decidir_descarte(c['mano'], c['contrato'])
+        )
+    return pruebas
+
+
+def ejecutar(semilla: int, cantidad: int, repeticiones: int, filtro: str = '') -> Dict:
+    casos = generar_casos(semilla, cantidad)
+    resultados = {}
+    for nombre, funcion in definir_pruebas().items():
+        if filtro and filtro not in nombre:
+            continue
+        # Cada repetición parte con cachés vacías y la misma semilla: sin esto, desde la
+        # segunda repetición todas las llamadas son aciertos y la p50 mide la caché
+        def preparar():
+            limpiar_caches()
+            random.seed(semilla)
+        resultados[nombre] = medir(funcion, casos, repeticiones, preparar)
+    return {
+        'semilla': semilla,
+        'casos': cantidad,
+        'repeticiones': repeticiones,
+        'python': platform.python_version(),
+        'maquina': platform.machine(),
+        'resultados': resultados
+    }
+
+
+def comparar(actual: Dict, base: Dict, tolerancia: float) -> List[str]:
+    """Devuelve las funciones cuya p50 empeoró más que la tolerancia"""
+    regresiones = []
+    for nombre, medida in actual['resultados'].items():
+        anterior = base.get('resultados', {}).get(nombre)
+        if not anterior or not anterior['p50_us']:
+            continue
+        if medida['p50_us'] / anterior['p50_us'] > 1 + tolerancia:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def imprimir(actual: Dict, base: Dict = None):
+    print(f"{'función':32} {'ops/s':>12} {'p50 µs':>10} {'p99 µs':>10} {'vs base':>9}")
+    for nombre, medida in actual['resultados'].items():
+        delta = ''
+        anterior = (base or {}).get('resultados', {}).get(nombre)
+        if anterior and anterior['p50_us']:
+            delta = f"{(medida['p50_us'] / anterior['p50_us'] - 1) * 100:+.1f}%"
+        print(f"{nombre:32} {medida['ops_por_segundo']:>12.0f} {medida['p50_us']:>10.1f} "
+              f"{medida['p99_us']:>10.1f} {delta:>9}")
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks del motor Carioca')
+    parser.add_argument('--semilla', type=int, default=2025)
+    parser.add_argument('--casos', type=int, default=500, help='manos sintéticas distintas')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--filtro', default='', help='solo funciones que contengan este texto')
+    parser.add_argument('--guardar', help='escribe los resultados como JSON base')
+    parser.add_argument('--comparar', help='JSON base contra el cual comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.10,
+                        help='empeoramiento de p50 permitido antes de fallar (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    actual = ejecutar(args.semilla, args.casos, args.repeticiones, args.filtro)
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+
+    imprimir(actual, base)
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump(actual, archivo, indent=2)
+
+    if base:
+        regresiones = comparar(actual, base, args.tolerancia)
+        if regresiones:
+            print(f"Regresiones sobre {args.tolerancia:.0%}: {', '.join(regresiones)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
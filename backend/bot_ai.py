@@ -4,12 +4,24 @@ Tres niveles de dificultad: Fácil, Medio, Difícil
 """
 import random
 import json
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 from game_logic import CariocaGameLogic
+from card_codec import ES_COMODIN, PALO, PUNTOS, RANGO, codificar_carta, codificar_mano
+from analysis_cache import consultar_analisis
+from card_memory import MemoriaCartas
+from contract_distance import DistanciaContratos
+from hand_index import HandIndex
+from meld_tables import BITS
+from monte_carlo import BusquedaMonteCarlo, cartas_no_vistas
+from policy_tables import cargar_tablas
+from table_melds import CombinacionMesa
+
+# Descartes mejor evaluados que la búsqueda compara entre sí
+CANDIDATOS_DESCARTE = 4
 
 class CariocaBotAI:
     
-    def __init__(self, dificultad: str = 'medio'):
+    def __init__(self, dificultad: str = 'medio', config: Optional[Dict] = None):
         self.dificultad = dificultad.lower()
         self.game_logic = CariocaGameLogic()
         
@@ -19,187 +31,122 @@ class CariocaBotAI:
                 'probabilidad_error': 0.3,
                 'tiempo_pensamiento': (1, 3),
                 'agresividad': 0.2,
-                'memoria_cartas': 0.1
+                'memoria_cartas': 0.1,
+                'presupuesto_busqueda': 0.0,
+                'simulaciones_busqueda': 0
             },
             'medio': {
                 'probabilidad_error': 0.15,
                 'tiempo_pensamiento': (2, 5),
                 'agresividad': 0.5,
-                'memoria_cartas': 0.6
+                'memoria_cartas': 0.6,
+                'presupuesto_busqueda': 0.0,
+                'simulaciones_busqueda': 0
             },
             'dificil': {
                 'probabilidad_error': 0.05,
                 'tiempo_pensamiento': (3, 8),
                 'agresividad': 0.8,
-                'memoria_cartas': 0.9
+                'memoria_cartas': 0.9,
+                'presupuesto_busqueda': 0.02,  # segundos reales por decisión
+                'simulaciones_busqueda': 48
             }
         }
+        
+        # Ajustes propios sobre la dificultad (torneos y pruebas de configuraciones)
+        if config:
+            self.config[self.dificultad] = {**self.config.get(self.dificultad, {}), **config}
+        
+        # Búsqueda Monte Carlo para robo y descarte (solo con presupuesto de tiempo)
+        self.busqueda = None
+        config = self.config.get(self.dificultad, {})
+        if config.get('presupuesto_busqueda', 0) > 0:
+            self.busqueda = BusquedaMonteCarlo(
+                self.game_logic.contratos,
+                config['presupuesto_busqueda'],
+                config['simulaciones_busqueda'],
+                rng=random.Random(random.getrandbits(32))
+            )
+        
+        # Cartas vistas en la ronda, atenuadas por la memoria de la dificultad
+        self.memoria = MemoriaCartas(config.get('memoria_cartas', 0.0))
+        
+        # Tablas precalculadas de los primeros contratos (compartidas por mmap; None si no existen)
+        self.tablas = cargar_tablas()
     
     def decidir_accion(self, estado_juego: Dict, cartas_mano: List[Dict], 
                       contrato_actual: int) -> Dict[str, Any]:
         """
         Decide qué acción tomar basado en el estado del juego
         """
-        config = self.config[self.dificultad]
-        
-        # Simular tiempo de pensamiento
-        tiempo_pensamiento = random.uniform(*config['tiempo_pensamiento'])
-        
-        # Analizar cartas en mano
-        analisis = self.analizar_cartas(cartas_mano, contrato_actual)
+        # Indexar la mano una sola vez para todo el turno
+        indice = self.game_logic.seguimiento_distancia(cartas_mano)
         
         # Decidir acción principal
-        if analisis['puede_bajar'] and random.random() > config['probabilidad_error']:
-            return self.decidir_bajar_combinacion(cartas_mano, contrato_actual, analisis)
-        elif self.debe_robar_descarte(estado_juego, cartas_mano, contrato_actual):
+        bajada = self.decidir_bajada(cartas_mano, contrato_actual, indice)
+        if bajada:
+            return bajada
+        elif self.debe_robar_descarte(estado_juego, cartas_mano, contrato_actual, indice):
             return {'accion': 'robar_descarte'}
         else:
             return {'accion': 'robar_mazo'}
     
-    def analizar_cartas(self, cartas: List[Dict], contrato_actual: int) -> Dict:
+    def decidir_bajada(self, cartas_mano: List[Dict], contrato_actual: int,
+                       indice: Optional[DistanciaContratos] = None) -> Optional[Dict]:
+        """
+        Decide si bajar el contrato con la mano actual (None si no puede o se equivoca)
+        """
+        config = self.config[self.dificultad]
+        analisis = self.analizar_cartas(cartas_mano, contrato_actual, indice)
+        if analisis['puede_bajar'] and random.random() > config['probabilidad_error']:
+            return self.decidir_bajar_combinacion(cartas_mano, contrato_actual, analisis)
+        return None
+    
+    def analizar_cartas(self, cartas: List[Dict], contrato_actual: int,
+                        indice: Optional[DistanciaContratos] = None) -> Dict:
         """
         Analiza las cartas en mano para determinar posibles combinaciones
+        (memorizado por huella de la mano y contrato)
         """
-        # Separar cartas normales y comodines
-        comodines = [c for c in cartas if c.get('es_comodin', False)]
-        normales = [c for c in cartas if not c.get('es_comodin', False)]
-        
-        # Buscar tríos posibles
-        trios_posibles = self.buscar_trios_posibles(normales, comodines)
-        
-        # Buscar escalas posibles
-        escalas_posibles = self.buscar_escalas_posibles(normales, comodines)
-        
-        # Verificar si puede completar el contrato
-        puede_bajar = self.puede_completar_contrato(
-            contrato_actual, trios_posibles, escalas_posibles
-        )
+        return consultar_analisis('analisis', cartas, contrato_actual,
+                                  lambda canonicas: self._analizar_cartas(canonicas, contrato_actual, indice))
+    
+    def _analizar_cartas(self, cartas: List[Dict], contrato_actual: int,
+                         indice: Optional[DistanciaContratos] = None) -> Dict:
+        if indice is None:
+            indice = self.game_logic.seguimiento_distancia(cartas)
+        
+        # Cartas que faltan para cumplir el contrato (0 = puede bajarse)
+        distancia = None
+        if contrato_actual in self.game_logic.contratos:
+            distancia = self.distancia_contrato(indice, contrato_actual)
+        
+        trios_posibles = []
+        escalas_posibles = []
+        
+        if distancia == 0:
+            solucion = self.game_logic.resolver_contrato(cartas, contrato_actual)
+            for combinacion in (solucion or {}).get('combinaciones', []):
+                posible = {
+                    'tipo': combinacion['tipo'],
+                    'cartas': combinacion['cartas'],
+                    'completo': True,
+                    'usa_comodin': any(c.get('es_comodin', False) for c in combinacion['cartas'])
+                }
+                if combinacion['tipo'] == 'trio':
+                    trios_posibles.append(posible)
+                else:
+                    escalas_posibles.append(posible)
         
         return {
             'trios_posibles': trios_posibles,
             'escalas_posibles': escalas_posibles,
-            'puede_bajar': puede_bajar,
-            'comodines_disponibles': len(comodines),
+            'puede_bajar': bool(trios_posibles or escalas_posibles),
+            'distancia': distancia,
+            'comodines_disponibles': indice.comodines,
             'cartas_utiles': len(trios_posibles) + len(escalas_posibles)
         }
     
-    def buscar_trios_posibles(self, cartas_normales: List[Dict], 
-                             comodines: List[Dict]) -> List[Dict]:
-        """
-        Busca tríos posibles en las cartas
-        """
-        trios = []
-        
-        # Agrupar cartas por valor
-        por_valor = {}
-        for carta in cartas_normales:
-            valor = carta['valor']
-            if valor not in por_valor:
-                por_valor[valor] = []
-            por_valor[valor].append(carta)
-        
-        # Buscar tríos completos (3 cartas del mismo valor)
-        for valor, cartas_valor in por_valor.items():
-            if len(cartas_valor) >= 3:
-                trios.append({
-                    'tipo': 'trio',
-                    'cartas': cartas_valor[:3],
-                    'completo': True
-                })
-            elif len(cartas_valor) == 2 and len(comodines) > 0:
-                # Trío con comodín
-                trios.append({
-                    'tipo': 'trio',
-                    'cartas': cartas_valor + [comodines[0]],
-                    'completo': True,
-                    'usa_comodin': True
-                })
-        
-        return trios
-    
-    def buscar_escalas_posibles(self, cartas_normales: List[Dict], 
-                               comodines: List[Dict]) -> List[Dict]:
-        """
-        Busca escalas posibles en las cartas
-        """
-        escalas = []
-        
-        # Agrupar cartas por palo
-        por_palo = {}
-        for carta in cartas_normales:
-            palo = carta['palo']
-            if palo not in por_palo:
-                por_palo[palo] = []
-            por_palo[palo].append(carta)
-        
-        # Buscar escalas en cada palo
-        for palo, cartas_palo in por_palo.items():
-            if len(cartas_palo) >= 3:  # Mínimo 3 cartas para intentar escala
-                cartas_ordenadas = sorted(cartas_palo, key=lambda x: x['valor'])
-                escalas_palo = self.encontrar_escalas_en_palo(cartas_ordenadas, comodines)
-                escalas.extend(escalas_palo)
-        
-        return escalas
-    
-    def encontrar_escalas_en_palo(self, cartas_ordenadas: List[Dict], 
-                                 comodines: List[Dict]) -> List[Dict]:
-        """
-        Encuentra escalas posibles en un palo específico
-        """
-        escalas = []
-        
-        # Buscar secuencias consecutivas
-        for i in range(len(cartas_ordenadas) - 2):  # Mínimo 3 cartas
-            secuencia = [cartas_ordenadas[i]]
-            
-            for j in range(i + 1, len(cartas_ordenadas)):
-                carta_actual = cartas_ordenadas[j]
-                ultima_carta = secuencia[-1]
-                
-                if carta_actual['valor'] == ultima_carta['valor'] + 1:
-                    secuencia.append(carta_actual)
-                elif carta_actual['valor'] == ultima_carta['valor'] + 2 and len(comodines) > 0:
-                    # Puede usar comodín para llenar hueco
-                    secuencia.append(comodines[0])  # Comodín
-                    secuencia.append(carta_actual)
-                    break
-                else:
-                    break
-            
-            if len(secuencia) >= 4:  # Escala válida
-                escalas.append({
-                    'tipo': 'escala',
-                    'cartas': secuencia,
-                    'completo': True,
-                    'usa_comodin': any(c.get('es_comodin', False) for c in secuencia)
-                })
-        
-        return escalas
-    
-    def puede_completar_contrato(self, contrato_num: int, trios: List[Dict], 
-                                escalas: List[Dict]) -> bool:
-        """
-        Verifica si puede completar el contrato actual
-        """
-        contrato = self.game_logic.CONTRATOS.get(contrato_num, {})
-        
-        if contrato.get('tipo') == 'escala_falsa':
-            # Lógica especial para escala falsa
-            return False  # Simplificado por ahora
-        elif contrato.get('tipo') == 'escala_real':
-            # Lógica especial para escala real
-            return False  # Simplificado por ahora
-        else:
-            # Contratos normales
-            trios_necesarios = contrato.get('trios', 0)
-            escalas_necesarias = contrato.get('escalas', 0)
-            
-            trios_completos = len([t for t in trios if t.get('completo', False)])
-            escalas_completas = len([e for e in escalas if e.get('completo', False)])
-            
-            return (trios_completos >= trios_necesarios and 
-                   escalas_completas >= escalas_necesarias)
-    
     def decidir_bajar_combinacion(self, cartas_mano: List[Dict], contrato_actual: int, 
                                  analisis: Dict) -> Dict:
         """
@@ -223,68 +170,158 @@ class CariocaBotAI:
         }
     
     def debe_robar_descarte(self, estado_juego: Dict, cartas_mano: List[Dict], 
-                           contrato_actual: int) -> bool:
+                           contrato_actual: int, indice: Optional[HandIndex] = None) -> bool:
         """
         Decide si debe robar del descarte en lugar del mazo
         """
+        self.memoria.sincronizar(estado_juego, codificar_mano(cartas_mano))
+        
         if not estado_juego.get('ultima_carta_descartada'):
             return False
         
         carta_descarte = estado_juego['ultima_carta_descartada']
         config = self.config[self.dificultad]
         
+        # Con búsqueda: simular ambas opciones dentro del presupuesto
+        contexto = self._contexto_busqueda(estado_juego, cartas_mano, contrato_actual)
+        if contexto:
+            codigos, no_vistas, oponentes = contexto
+            eleccion = self.busqueda.elegir_robo(codigos, codificar_carta(carta_descarte),
+                                                 no_vistas, oponentes, contrato_actual)
+            if eleccion is not None:
+                return eleccion
+        
         # Evaluar utilidad de la carta del descarte
-        utilidad = self.evaluar_utilidad_carta(carta_descarte, cartas_mano, contrato_actual)
+        utilidad = self.evaluar_utilidad_carta(carta_descarte, cartas_mano, contrato_actual, indice)
         
         # Decisión basada en dificultad y utilidad
         umbral_decision = 0.3 + (config['agresividad'] * 0.4)
         
+        # Si el mazo aún esconde muchas cartas útiles, robar a ciegas rinde más
+        if indice is None:
+            indice = HandIndex.desde_cartas(cartas_mano)
+        umbral_decision += 0.2 * self.memoria.probabilidad_util(indice)
+        
         return utilidad > umbral_decision
     
     def evaluar_utilidad_carta(self, carta: Dict, cartas_mano: List[Dict], 
-                              contrato_actual: int) -> float:
+                              contrato_actual: int, indice: Optional[HandIndex] = None) -> float:
         """
         Evalúa qué tan útil es una carta para el bot
         """
         if carta.get('es_comodin', False):
             return 0.9  # Los comodines siempre son muy útiles
         
+        if indice is None:
+            indice = HandIndex.desde_cartas(cartas_mano)
+        
+        codigo = codificar_carta(carta)
+        rango = RANGO[codigo]
+        palo = PALO[codigo]
+        
         utilidad = 0.0
         
         # Verificar si completa un trío
-        cartas_mismo_valor = [c for c in cartas_mano 
-                             if c['valor'] == carta['valor'] and not c.get('es_comodin', False)]
+        cartas_mismo_valor = indice.conteo_rango(rango)
         
-        if len(cartas_mismo_valor) >= 2:
+        if cartas_mismo_valor >= 2:
             utilidad += 0.8  # Completa un trío
-        elif len(cartas_mismo_valor) == 1:
+        elif cartas_mismo_valor == 1:
             utilidad += 0.4  # Ayuda a formar un trío
         
         # Verificar si ayuda en escalas
-        cartas_mismo_palo = [c for c in cartas_mano 
-                            if c['palo'] == carta['palo'] and not c.get('es_comodin', False)]
-        
-        for carta_palo in cartas_mismo_palo:
-            diferencia = abs(carta_palo['valor'] - carta['valor'])
-            if diferencia == 1:
-                utilidad += 0.6  # Carta consecutiva
-            elif diferencia == 2:
-                utilidad += 0.3  # Carta cercana
+        utilidad += 0.6 * (indice.copias(palo, rango - 1) + indice.copias(palo, rango + 1))  # Consecutivas
+        utilidad += 0.3 * (indice.copias(palo, rango - 2) + indice.copias(palo, rango + 2))  # Cercanas
         
         return min(utilidad, 1.0)
     
-    def decidir_descarte(self, cartas_mano: List[Dict], contrato_actual: int) -> Dict:
+    def evaluar_descartes(self, cartas_mano: List[Dict], contrato_actual: int,
+                          indice: Optional[DistanciaContratos] = None) -> List[Tuple[int, float]]:
         """
-        Decide qué carta descartar
+        Evalúa todos los descartes posibles en una sola pasada
+        Devuelve (índice, valor de conservar la carta) ordenado de mejor a peor descarte
         """
-        # Evaluar utilidad de cada carta
-        utilidades = []
-        for i, carta in enumerate(cartas_mano):
-            utilidad = self.evaluar_utilidad_carta(carta, cartas_mano[:i] + cartas_mano[i+1:], contrato_actual)
-            utilidades.append((i, utilidad))
+        codigos = codificar_mano(cartas_mano)
+        if indice is None:
+            indice = DistanciaContratos(self.game_logic.contratos, codigos)
+        
+        perdidas = self.perdidas_distancia(codigos, contrato_actual, indice)
+        self.memoria.fijar_mano(codigos)
+        # Vale menos si las cartas que la completarían ya salieron
+        vigencias = self.memoria.vigencias(indice, codigos)
+        simples = indice.simples
+        dobles = indice.dobles
+        conteos = indice.conteos_rango
+        es_comodin, palos, rangos, bits, puntos = ES_COMODIN, PALO, RANGO, BITS, PUNTOS
+        evaluaciones = []
+        
+        for i, codigo in enumerate(codigos):
+            if es_comodin[codigo]:
+                utilidad = 0.9
+            else:
+                # Utilidad de la carta frente al resto de la mano (sin contarse a sí misma),
+                # con las copias vecinas contadas sobre las máscaras del palo
+                rango = rangos[codigo]
+                s = simples[palos[codigo]]
+                d = dobles[palos[codigo]]
+                bit = 1 << (rango - 1)
+                consecutivas = bit >> 1 | bit << 1
+                cercanas = bit >> 2 | bit << 2
+                mismo_valor = conteos[rango] - 1
+                utilidad = 0.8 if mismo_valor >= 2 else 0.4 if mismo_valor == 1 else 0.0
+                utilidad += 0.6 * (bits[s & consecutivas] + bits[d & consecutivas])
+                utilidad += 0.3 * (bits[s & cercanas] + bits[d & cercanas])
+                utilidad = min(utilidad, 1.0) * vigencias[i]
+            
+            # Las cartas de muchos puntos conviene soltarlas antes
+            evaluaciones.append((i, utilidad + 0.5 * perdidas[i] - 0.2 * puntos[codigo] / 25))
         
-        # Ordenar por utilidad (menor primero para descartar)
-        utilidades.sort(key=lambda x: x[1])
+        evaluaciones.sort(key=lambda x: x[1])
+        return evaluaciones
+    
+    def distancia_contrato(self, indice: DistanciaContratos, contrato_actual: int) -> int:
+        """
+        Cartas que faltan para bajarse: primero las tablas precalculadas,
+        si no cubren el contrato se analiza en vivo
+        """
+        if self.tablas is not None:
+            contrato = self.game_logic.contratos[contrato_actual]
+            faltan = self.tablas.faltantes(indice.simples, indice.dobles,
+                                           (contrato['trios'], contrato['escalas']),
+                                           indice.conteos_rango[1:])
+            if faltan is not None:
+                return max(0, faltan - indice.comodines)
+        return indice.distancia(contrato_actual)
+    
+    def perdidas_distancia(self, codigos, contrato_actual: int,
+                           indice: Optional[DistanciaContratos] = None) -> List[int]:
+        """
+        Cuánto se aleja la mano del contrato al soltar cada carta, con una sola búsqueda:
+        soltar una carta esencial suma una faltante (cota superior) y las demás, ninguna
+        """
+        if contrato_actual not in self.game_logic.contratos:
+            return [0] * len(codigos)
+        if indice is None:
+            indice = DistanciaContratos(self.game_logic.contratos, codigos)
+        
+        faltan, esenciales = indice.esenciales(contrato_actual)
+        distancia_actual = max(0, faltan - indice.comodines)
+        # Soltar un joker o una carta esencial: una faltante más, si los jokers no la cubren
+        perdida_esencial = max(0, faltan + 1 - indice.comodines) - distancia_actual
+        return [
+            perdida_esencial if ES_COMODIN[codigo] or esenciales[PALO[codigo]] >> (RANGO[codigo] - 1) & 1 else 0
+            for codigo in codigos
+        ]
+    
+    def decidir_descarte(self, cartas_mano: List[Dict], contrato_actual: int,
+                         indice: Optional[DistanciaContratos] = None,
+                         estado_juego: Optional[Dict] = None) -> Dict:
+        """
+        Decide qué carta descartar
+        Con búsqueda y un estado de juego informado, simula los mejores candidatos
+        """
+        # Utilidad de cada carta, ordenada (menor primero para descartar)
+        utilidades = self.evaluar_descartes(cartas_mano, contrato_actual, indice)
         
         # Agregar algo de aleatoriedad según dificultad
         config = self.config[self.dificultad]
@@ -294,12 +331,45 @@ class CariocaBotAI:
         else:
             # Decisión óptima
             indice_descarte = utilidades[0][0]
+            
+            contexto = self._contexto_busqueda(estado_juego, cartas_mano, contrato_actual)
+            if contexto and len(cartas_mano) > 1:
+                codigos, no_vistas, oponentes = contexto
+                candidatos = [i for i, _ in utilidades[:CANDIDATOS_DESCARTE]]
+                elegido = self.busqueda.elegir_descarte(codigos, candidatos, no_vistas,
+                                                        oponentes, contrato_actual)
+                if elegido is not None:
+                    indice_descarte = elegido
         
         return {
             'accion': 'descartar',
             'carta': cartas_mano[indice_descarte],
             'indice': indice_descarte
         }
+    
+    def _contexto_busqueda(self, estado_juego: Optional[Dict], cartas_mano: List[Dict],
+                           contrato_actual: int) -> Optional[Tuple[List[int], List[int], List[int]]]:
+        """
+        (códigos de la mano, cartas no vistas, tamaño de cada mano rival) para la búsqueda
+        None si el bot no busca o el estado no informa las manos rivales
+        """
+        if (self.busqueda is None or not estado_juego or 'cartas_oponentes' not in estado_juego
+                or contrato_actual not in self.game_logic.contratos):
+            return None
+        
+        try:
+            codigos = list(codificar_mano(cartas_mano))
+            visibles = list(codigos)
+            visibles.extend(codificar_mano(estado_juego.get('descarte') or []))
+            for combinacion in estado_juego.get('mesa') or []:
+                if isinstance(combinacion, CombinacionMesa):
+                    visibles.extend(combinacion.codigos)
+                else:
+                    visibles.extend(codificar_mano(combinacion.get('cartas', [])))
+        except ValueError:
+            return None
+        
+        return codigos, cartas_no_vistas(visibles), list(estado_juego['cartas_oponentes'])
 
 # Nombres temáticos para los bots según dificultad
 NOMBRES_BOTS = {
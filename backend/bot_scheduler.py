@@ -0,0 +1,182 @@
+"""
+Planificador de turnos de bots
+Los turnos se encolan con la demora de pensamiento de su dificultad como temporizador
+(un solo hilo con un heap de vencimientos, ningún trabajador duerme) y se ejecutan en un
+pool acotado de hilos, fuera del hilo de la petición; los que vencen a la vez van en un
+lote (game_manager.procesar_turnos_bot decide sus robos y descartes juntos con NumPy).
+El resultado de cada turno se emite a la sala partida_{id}. Pensado para el modo 'threading' de SocketIO (Config.SOCKETIO_ASYNC_MODE)
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+EVENTO_TURNO_BOT = 'turno_bot'
+
+# Demora para bots sin configuración conocida (segundos)
+TIEMPO_PENSAMIENTO_POR_DEFECTO = (2, 5)
+
+
+class PlanificadorBots:
+    """
+    Cola de turnos de bots con temporizadores
+    Un turno por (partida, jugador): reprogramarlo reemplaza al anterior; los turnos de
+    una misma partida nunca corren a la vez, los de partidas distintas sí
+    emitir(evento, datos, sala): normalmente socketio.emit con to=sala
+    """
+
+    def __init__(self, game_manager, emitir: Callable[[str, Dict, str], Any],
+                 trabajadores: int = 4, escala_pensamiento: float = 1.0):
+        self.game_manager = game_manager
+        self.emitir = emitir
+        self.escala_pensamiento = escala_pensamiento
+        self._pool = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix='bot')
+
+        self._condicion = threading.Condition()
+        self._vencimientos: List[Tuple[float, int, int, int]] = []  # (vence, secuencia, partida, jugador)
+        self._secuencias = itertools.count()
+        self._vigentes: Dict[Tuple[int, int], int] = {}
+        self._en_curso: Set[int] = set()
+        self._en_espera: Dict[int, Deque[Tuple[int, int]]] = {}
+        self._activo = True
+
+        self.programados = 0
+        self.ejecutados = 0
+        self.errores = 0
+        self.descartados = 0
+
+        self._hilo = threading.Thread(target=self._temporizador, name='planificador-bots', daemon=True)
+        self._hilo.start()
+
+    def demora_pensamiento(self, partida_id: int, jugador_id: int) -> float:
+        """Segundos de 'pensamiento' del bot según su dificultad"""
+        bot = self.game_manager.obtener_bot(partida_id, jugador_id)
+        rango = TIEMPO_PENSAMIENTO_POR_DEFECTO
+        if bot is not None:
+            rango = bot.config.get(bot.dificultad, {}).get('tiempo_pensamiento', rango)
+        return random.uniform(*rango) * self.escala_pensamiento
+
+    def programar_turno(self, partida_id: int, jugador_id: int,
+                        demora: Optional[float] = None) -> float:
+        """
+        Encola el turno del bot y vuelve de inmediato
+        Devuelve la demora aplicada en segundos
+        """
+        if demora is None:
+            demora = self.demora_pensamiento(partida_id, jugador_id)
+
+        with self._condicion:
+            if not self._activo:
+                raise RuntimeError("El planificador de bots está detenido")
+            secuencia = next(self._secuencias)
+            self._vigentes[(partida_id, jugador_id)] = secuencia
+            heapq.heappush(self._vencimientos, (time.monotonic() + demora, secuencia, partida_id, jugador_id))
+            self.programados += 1
+            self._condicion.notify()
+        return demora
+
+    def cancelar_partida(self, partida_id: int):
+        """Olvida los turnos pendientes de una partida (el que está corriendo termina)"""
+        with self._condicion:
+            for clave in [c for c in self._vigentes if c[0] == partida_id]:
+                del self._vigentes[clave]
+            self._en_espera.pop(partida_id, None)
+
+    def pendientes(self) -> int:
+        with self._condicion:
+            return len(self._vigentes)
+
+    def detener(self, esperar: bool = True):
+        """Detiene el temporizador y el pool; los turnos no vencidos se descartan"""
+        with self._condicion:
+            self._activo = False
+            self._vigentes.clear()
+            self._en_espera.clear()
+            self._condicion.notify()
+        self._hilo.join()
+        self._pool.shutdown(wait=esperar)
+
+    def estadisticas(self) -> Dict:
+        with self._condicion:
+            return {
+                'pendientes': len(self._vigentes),
+                'partidas_en_curso': len(self._en_curso),
+                'programados': self.programados,
+                'ejecutados': self.ejecutados,
+                'errores': self.errores,
+                'descartados': self.descartados
+            }
+
+    def _temporizador(self):
+        with self._condicion:
+            while self._activo:
+                if not self._vencimientos:
+                    self._condicion.wait()
+                    continue
+                espera = self._vencimientos[0][0] - time.monotonic()
+                if espera > 0:
+                    self._condicion.wait(espera)
+                    continue
+
+                # Todos los turnos vencidos salen juntos en un lote (uno por partida)
+                lote: List[Tuple[int, int, int]] = []
+                partidas: Set[int] = set()
+                ahora = time.monotonic()
+                while self._vencimientos and self._vencimientos[0][0] <= ahora:
+                    _, secuencia, partida_id, jugador_id = heapq.heappop(self._vencimientos)
+                    if self._vigentes.get((partida_id, jugador_id)) != secuencia:
+                        # Reprogramado o cancelado
+                        self.descartados += 1
+                    elif partida_id in self._en_curso or partida_id in partidas:
+                        self._en_espera.setdefault(partida_id, deque()).append((jugador_id, secuencia))
+                    else:
+                        partidas.add(partida_id)
+                        lote.append((partida_id, jugador_id, secuencia))
+                if lote:
+                    self._lanzar(lote)
+
+    def _lanzar(self, lote: List[Tuple[int, int, int]]):
+        # Se llama con la condición tomada
+        self._en_curso.update(partida_id for partida_id, _, _ in lote)
+        self._pool.submit(self._ejecutar, lote)
+
+    def _ejecutar(self, lote: List[Tuple[int, int, int]]):
+        try:
+            resultados = self.game_manager.procesar_turnos_bot([(p, j) for p, j, _ in lote])
+        except Exception as e:
+            resultados = [{"error": f"Error procesando turno bot: {str(e)}"}] * len(lote)
+
+        for (partida_id, jugador_id, _), resultado in zip(lote, resultados):
+            try:
+                self.emitir(EVENTO_TURNO_BOT, {'partida_id': partida_id, 'jugador_id': jugador_id, **resultado},
+                            f"partida_{partida_id}")
+            except Exception as e:
+                print(f"Error emitiendo turno bot de la partida {partida_id}: {str(e)}")
+
+        with self._condicion:
+            siguientes = []
+            for (partida_id, jugador_id, secuencia), resultado in zip(lote, resultados):
+                if 'error' in resultado:
+                    self.errores += 1
+                else:
+                    self.ejecutados += 1
+                if self._vigentes.get((partida_id, jugador_id)) == secuencia:
+                    del self._vigentes[(partida_id, jugador_id)]
+                self._en_curso.discard(partida_id)
+
+                # Turnos de la misma partida que vencieron mientras este corría
+                cola = self._en_espera.get(partida_id)
+                while cola:
+                    siguiente, secuencia = cola.popleft()
+                    if self._vigentes.get((partida_id, siguiente)) == secuencia and self._activo:
+                        siguientes.append((partida_id, siguiente, secuencia))
+                        break
+                    self.descartados += 1
+                if not cola:
+                    self._en_espera.pop(partida_id, None)
+            if siguientes:
+                self._lanzar(siguientes)
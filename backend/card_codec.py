@@ -0,0 +1,273 @@
+"""
+Representación compacta de las cartas del Carioca
+Cada carta del mazo de 112 (2 barajas + 8 jokers) es un entero entre 0 y 111
+"""
+import json
+import random
+import re
+from array import array
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+BARAJAS = ('roja', 'azul')
+PALOS = ('corazones', 'diamantes', 'treboles', 'picas')
+VALORES = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K')
+
+CARTAS_NORMALES_POR_BARAJA = 52
+JOKERS_POR_BARAJA = 4
+CARTAS_POR_BARAJA = CARTAS_NORMALES_POR_BARAJA + JOKERS_POR_BARAJA
+TOTAL_CARTAS = CARTAS_POR_BARAJA * len(BARAJAS)
+
+# Índices reservados para los jokers
+PALO_JOKER = len(PALOS)
+FORMA_JOKER = CARTAS_NORMALES_POR_BARAJA
+
+SIMBOLOS_PALOS = {
+    'corazones': '♥️',
+    'diamantes': '♦️',
+    'treboles': '♣️',
+    'picas': '♠️'
+}
+
+COLORES_BARAJA = {
+    'roja': '#DC2626',
+    'azul': '#2563EB'
+}
+
+_RANGO_POR_VALOR = {valor: i + 1 for i, valor in enumerate(VALORES)}
+_PALO_POR_NOMBRE = {palo: i for i, palo in enumerate(PALOS)}
+_BARAJA_POR_NOMBRE = {baraja: i for i, baraja in enumerate(BARAJAS)}
+# Cartas heredadas sin id de catálogo (filas de la tabla cartas): la baraja y el joker
+# salen de la imagen ('azul/as_corazones.png', 'roja/joker_negro.png', 'joker3_azul.png')
+_BARAJA_EN_TEXTO = re.compile(r'(?<![a-z])(roja|azul)(?![a-z])')
+_JOKER_EN_IMAGEN = re.compile(r'joker_?([1-4]|rojo|negro)')
+_NUMERO_JOKER = {'rojo': 1, 'negro': 2}
+
+
+def componer_codigo(palo: int, rango: int, baraja: int = 0) -> int:
+    """Código de una carta normal (palo 0-3, rango 1-13, baraja 0-1)"""
+    return baraja * CARTAS_POR_BARAJA + palo * 13 + rango - 1
+
+
+def componer_joker(numero: int, baraja: int = 0) -> int:
+    """Código de un joker (numero 1-4, baraja 0-1)"""
+    return baraja * CARTAS_POR_BARAJA + CARTAS_NORMALES_POR_BARAJA + numero - 1
+
+
+def _puntos_rango(rango: int) -> int:
+    if rango == 0:
+        return 25
+    if rango == 1:
+        return 15
+    if rango >= 11:
+        return 10
+    return rango
+
+
+# Tablas indexadas por código, calculadas una sola vez al importar
+RANGO = tuple(0 if c % CARTAS_POR_BARAJA >= FORMA_JOKER else c % CARTAS_POR_BARAJA % 13 + 1
+              for c in range(TOTAL_CARTAS))
+PALO = tuple(min(c % CARTAS_POR_BARAJA // 13, PALO_JOKER) for c in range(TOTAL_CARTAS))
+FORMA = tuple(min(c % CARTAS_POR_BARAJA, FORMA_JOKER) for c in range(TOTAL_CARTAS))
+BARAJA = tuple(c // CARTAS_POR_BARAJA for c in range(TOTAL_CARTAS))
+ES_COMODIN = tuple(RANGO[c] == 0 for c in range(TOTAL_CARTAS))
+PUNTOS = tuple(_puntos_rango(RANGO[c]) for c in range(TOTAL_CARTAS))
+BIT_RANGO = tuple(0 if RANGO[c] == 0 else 1 << (RANGO[c] - 1) for c in range(TOTAL_CARTAS))
+
+
+def _id_carta(codigo: int) -> str:
+    baraja = BARAJAS[BARAJA[codigo]]
+    if ES_COMODIN[codigo]:
+        return f"joker{codigo % CARTAS_POR_BARAJA - FORMA_JOKER + 1}_{baraja}"
+    return f"{VALORES[RANGO[codigo] - 1]}_{PALOS[PALO[codigo]]}_{baraja}"
+
+
+_CODIGO_POR_ID = {_id_carta(c): c for c in range(TOTAL_CARTAS)}
+
+
+def rango_de_valor(valor) -> int:
+    """
+    Convierte el valor de una carta a rango 1-13 (0 si no es válido)
+    Acepta tanto 'A'..'K' (mazo de la app) como 1..13 (tabla cartas)
+    """
+    if isinstance(valor, int):
+        return valor if 1 <= valor <= 13 else 0
+    return _RANGO_POR_VALOR.get(valor, 0)
+
+
+def codificar_carta(carta: Dict) -> int:
+    """
+    Convierte una carta en formato diccionario a su código entero
+    """
+    codigo = carta.get('codigo')
+    if isinstance(codigo, int):
+        # El código puede venir de un cliente: fuera de 0-111 no indexa ninguna tabla
+        if not 0 <= codigo < TOTAL_CARTAS:
+            raise ValueError(f"Código de carta fuera de rango: {codigo}")
+        return codigo
+
+    codigo = _CODIGO_POR_ID.get(carta.get('id'))
+    if codigo is not None:
+        return codigo
+
+    baraja = _baraja_de_carta(carta)
+    if carta.get('es_comodin', False):
+        joker = _JOKER_EN_IMAGEN.search(str(carta.get('imagen') or '').lower())
+        numero = int(_NUMERO_JOKER.get(joker.group(1), joker.group(1))) if joker else 1
+        return componer_joker(numero, baraja)
+
+    palo = _PALO_POR_NOMBRE.get(carta.get('palo'))
+    rango = rango_de_valor(carta.get('valor'))
+    if palo is None or rango == 0:
+        raise ValueError(f"Carta no reconocida: {carta}")
+    return componer_codigo(palo, rango, baraja)
+
+
+def _baraja_de_carta(carta: Dict) -> int:
+    """Baraja de la carta: la clave 'baraja' o, en cartas heredadas, la imagen o el nombre"""
+    baraja = carta.get('baraja')
+    if baraja in _BARAJA_POR_NOMBRE:
+        return _BARAJA_POR_NOMBRE[baraja]
+    for clave in ('imagen', 'imagen_reverso', 'nombre'):
+        encontrada = _BARAJA_EN_TEXTO.search(str(carta.get(clave) or '').lower())
+        if encontrada:
+            return _BARAJA_POR_NOMBRE[encontrada.group(1)]
+    return 0
+
+
+def _construir_carta(codigo: int) -> Dict:
+    """Arma el diccionario de una carta (solo para el catálogo)"""
+    baraja = BARAJAS[BARAJA[codigo]]
+
+    if ES_COMODIN[codigo]:
+        numero = codigo % CARTAS_POR_BARAJA - FORMA_JOKER + 1
+        return {
+            'id': _id_carta(codigo),
+            'codigo': codigo,
+            'nombre': f"Joker {numero} ({baraja.title()})",
+            'palo': 'joker',
+            'valor': 'joker',
+            'valor_numerico': 0,  # Los jokers pueden representar cualquier valor
+            'simbolo_palo': '🃏',
+            'es_comodin': True,
+            'es_joker': True,
+            'color_carta': 'multicolor',
+            'color_baraja': COLORES_BARAJA[baraja],
+            'baraja': baraja,
+            'imagen': f"assets/cartas/frontal/joker{numero}_{baraja}.png",
+            'imagen_reverso': f"assets/cartas/reverso/{baraja}.png",
+            'puntos': PUNTOS[codigo]
+        }
+
+    palo = PALOS[PALO[codigo]]
+    valor = VALORES[RANGO[codigo] - 1]
+    return {
+        'id': _id_carta(codigo),
+        'codigo': codigo,
+        'nombre': f"{valor} de {palo.title()}",
+        'palo': palo,
+        'valor': valor,
+        'valor_numerico': RANGO[codigo],
+        'simbolo_palo': SIMBOLOS_PALOS[palo],
+        'es_comodin': False,
+        'es_joker': False,
+        'color_carta': 'rojo' if palo in ['corazones', 'diamantes'] else 'negro',
+        'color_baraja': COLORES_BARAJA[baraja],
+        'baraja': baraja,
+        'imagen': f"assets/cartas/frontal/{valor}_{palo}.png",
+        'imagen_reverso': f"assets/cartas/reverso/{baraja}.png",
+        'puntos': PUNTOS[codigo]
+    }
+
+
+# Catálogo del mazo, construido una vez: el índice es el código de la carta
+_CARTAS = tuple(_construir_carta(c) for c in range(TOTAL_CARTAS))
+# Vista de solo lectura del catálogo
+CATALOGO_CARTAS: Tuple[Mapping, ...] = tuple(MappingProxyType(carta) for carta in _CARTAS)
+
+
+def decodificar_carta(codigo: int) -> Dict:
+    """
+    Diccionario de una carta a partir de su código (copia de su entrada del catálogo)
+    """
+    return _CARTAS[codigo].copy()
+
+
+def mazo_barajado(rng: random.Random = random) -> List[int]:
+    """Mazo completo barajado como permutación de códigos (sin armar diccionarios)"""
+    return rng.sample(range(TOTAL_CARTAS), TOTAL_CARTAS)
+
+
+def descarte_rebarajado(descarte: List[int], reparto_id: Optional[int], ronda: int,
+                        rng: random.Random = random) -> List[int]:
+    """
+    Mazo nuevo con el descarte menos la carta de arriba (se roba del final, como al repartir)
+    Con reparto de torneo el orden depende solo del reparto, la ronda y el descarte: el
+    servidor y el simulador rebarajan igual y las mesas duplicadas siguen viendo las mismas cartas
+    """
+    codigos = list(descarte[:-1])
+    if reparto_id is not None:
+        rng = random.Random(f"{reparto_id}:{ronda}:{len(codigos)}")
+    rng.shuffle(codigos)
+    return codigos
+
+
+def codificar_mano(cartas: Iterable[Dict]) -> array:
+    """Convierte una lista de cartas en un array de bytes con sus códigos"""
+    return array('B', [codificar_carta(carta) for carta in cartas])
+
+
+def decodificar_mano(codigos: Iterable[int]) -> List[Dict]:
+    """Convierte códigos de vuelta a cartas en formato diccionario"""
+    return [_CARTAS[codigo].copy() for codigo in codigos]
+
+
+# Formato de las columnas de cartas en la base de datos: byte de versión + un byte por carta
+# (el JSON heredado empieza con '[', '{' o 'n', nunca con un byte de control)
+VERSION_FORMATO_CARTAS = 1
+
+
+def empaquetar_cartas(codigos: Iterable[int]) -> bytes:
+    """Cartas como se guardan en mazo, descarte y cartas_en_mano"""
+    return bytes([VERSION_FORMATO_CARTAS]) + bytes(codigos)
+
+
+def desempaquetar_cartas(valor) -> List[int]:
+    """
+    Códigos de una columna de cartas guardada en formato binario o en el JSON heredado
+    (lista de cartas o una sola carta); None o vacío es una lista vacía
+    """
+    if not valor:
+        return []
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        valor = bytes(valor)
+        if valor[0] == VERSION_FORMATO_CARTAS:
+            return list(valor[1:])
+        if valor[0] < 0x20 and valor[:1] not in b'\t\n\r':
+            raise ValueError(f"Formato de cartas desconocido: versión {valor[0]}")
+        valor = valor.decode('utf-8')
+    datos = json.loads(valor)
+    if datos is None:
+        return []
+    if isinstance(datos, dict):
+        datos = [datos]
+    return list(codificar_mano(datos))
+
+
+def puntos_codigos(codigos: Iterable[int]) -> int:
+    """Suma los puntos de una mano codificada"""
+    return sum(PUNTOS[codigo] for codigo in codigos)
+
+
+def mascaras_por_palo(codigos: Iterable[int]) -> Tuple[List[int], int]:
+    """
+    Devuelve la máscara de 13 bits de rangos presentes por palo y la cantidad de jokers
+    """
+    mascaras = [0, 0, 0, 0]
+    comodines = 0
+    for codigo in codigos:
+        if ES_COMODIN[codigo]:
+            comodines += 1
+        else:
+            mascaras[PALO[codigo]] |= BIT_RANGO[codigo]
+    return mascaras, comodines
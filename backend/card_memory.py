@@ -0,0 +1,184 @@
+"""
+Memoria de cartas vistas por los bots
+Cuenta por forma (palo * 13 + rango - 1, jokers aparte) y por rango las cartas que pasaron
+boca arriba por el descarte o la mesa, con altas O(1); el factor de memoria de la
+dificultad atenúa cuánto de eso recuerda el bot
+"""
+from typing import Dict, Iterable, List
+
+from card_codec import BARAJAS, ES_COMODIN, FORMA, FORMA_JOKER, PALOS, RANGO, TOTAL_CARTAS, codificar_mano
+from hand_index import HandIndex
+
+# Copias de cada carta en el mazo de 112 (dos barajas, 8 jokers)
+COPIAS_POR_FORMA = tuple(
+    sum(1 for c in range(TOTAL_CARTAS) if FORMA[c] == forma) for forma in range(FORMA_JOKER + 1)
+)
+COPIAS_POR_RANGO = len(PALOS) * len(BARAJAS)
+
+
+class MemoriaCartas:
+    """
+    Cartas vistas en la ronda actual, sin contar las que el bot tiene en la mano
+    factor: 0 (no recuerda nada) a 1 (memoria perfecta)
+    """
+
+    def __init__(self, factor: float = 1.0):
+        self.factor = factor
+        self.reiniciar()
+
+    def reiniciar(self, clave=None):
+        self._clave = clave
+        self._vista = bytearray(TOTAL_CARTAS)
+        self.por_forma = [0] * (FORMA_JOKER + 1)
+        self.por_rango = [0] * 14
+        self.total = 0
+        self._largo_descarte = 0
+        self._largos_mesa: List[int] = []
+        # Cartas vistas que luego llegaron a la mano propia (no deben descontarse dos veces)
+        self._mano_forma: Dict[int, int] = {}
+        self._mano_rango: Dict[int, int] = {}
+        self._mano_total = 0
+
+    def observar(self, codigo: int):
+        """Registra una carta vista boca arriba (cada carta física cuenta una sola vez)"""
+        if self._vista[codigo]:
+            return
+        self._vista[codigo] = 1
+        self.por_forma[FORMA[codigo]] += 1
+        self.por_rango[RANGO[codigo]] += 1
+        self.total += 1
+
+    def sincronizar(self, estado_juego: Dict, codigos_mano: Iterable[int] = ()):
+        """
+        Incorpora lo nuevo del descarte y de la mesa desde la última llamada
+        Una ronda nueva o un descarte rebarajado al mazo reinician la memoria
+        """
+        clave = (estado_juego.get('partida_id'), estado_juego.get('ronda_actual'),
+                 estado_juego.get('contrato_actual'))
+        descarte = estado_juego.get('descarte') or []
+        if clave != self._clave or len(descarte) < self._largo_descarte - 1:
+            self.reiniciar(clave)
+
+        try:
+            # La carta de arriba pudo cambiar aunque el largo sea el mismo
+            desde = max(0, min(self._largo_descarte, len(descarte)) - 1)
+            for codigo in codificar_mano(descarte[desde:]):
+                self.observar(codigo)
+            self._largo_descarte = len(descarte)
+
+            for i, combinacion in enumerate(estado_juego.get('mesa') or []):
+                if i == len(self._largos_mesa):
+                    self._largos_mesa.append(0)
+                codigos = getattr(combinacion, 'codigos', None)
+                if codigos is None:
+                    codigos = codificar_mano(combinacion.get('cartas', []))
+                for codigo in codigos[self._largos_mesa[i]:]:
+                    self.observar(codigo)
+                self._largos_mesa[i] = len(codigos)
+        except ValueError:
+            pass
+
+        self.fijar_mano(codigos_mano)
+
+    def fijar_mano(self, codigos_mano: Iterable[int]):
+        """Marca qué cartas vistas están ahora en la mano propia"""
+        self._mano_forma = {}
+        self._mano_rango = {}
+        self._mano_total = 0
+        for codigo in codigos_mano:
+            if self._vista[codigo]:
+                forma = FORMA[codigo]
+                self._mano_forma[forma] = self._mano_forma.get(forma, 0) + 1
+                self._mano_rango[RANGO[codigo]] = self._mano_rango.get(RANGO[codigo], 0) + 1
+                self._mano_total += 1
+
+    def restantes_forma(self, forma: int, en_mano: int = 0) -> float:
+        """Copias de una forma que el bot cree que siguen ocultas (mazo o manos rivales)"""
+        vistas = self.por_forma[forma] - self._mano_forma.get(forma, 0)
+        return max(0.0, COPIAS_POR_FORMA[forma] - en_mano - self.factor * vistas)
+
+    def restantes_rango(self, rango: int, en_mano: int = 0) -> float:
+        """Cartas normales de un rango que el bot cree que siguen ocultas"""
+        vistas = self.por_rango[rango] - self._mano_rango.get(rango, 0)
+        return max(0.0, COPIAS_POR_RANGO - en_mano - self.factor * vistas)
+
+    def ocultas(self, cartas_en_mano: int) -> float:
+        """Cartas que el bot no ha visto o ya olvidó"""
+        return max(1.0, TOTAL_CARTAS - cartas_en_mano - self.factor * (self.total - self._mano_total))
+
+    def vigencia(self, indice: HandIndex, codigo: int) -> float:
+        """
+        Entre 0.5 y 1 según cuántas cartas que combinarían con 'codigo' (mismo rango
+        o vecinas de escala) siguen ocultas: baja solo cuando quedan menos de dos
+        """
+        if ES_COMODIN[codigo]:
+            return 1.0
+        rango = RANGO[codigo]
+        palo = FORMA[codigo] // 13
+        vivas = self.restantes_rango(rango, indice.conteo_rango(rango))
+        for vecino in (rango - 1, rango + 1):
+            if 1 <= vecino <= 13:
+                vivas += self.restantes_forma(palo * 13 + vecino - 1, indice.copias(palo, vecino))
+        return min(1.0, 0.5 + vivas / 4)
+
+    def vigencias(self, indice: HandIndex, codigos: Iterable[int]) -> List[float]:
+        """vigencia de cada carta de 'codigos' en una sola pasada (mismo resultado)"""
+        factor = self.factor
+        por_forma = self.por_forma
+        por_rango = self.por_rango
+        mano_forma = self._mano_forma
+        mano_rango = self._mano_rango
+        conteos = indice.conteos_rango
+        simples = indice.simples
+        dobles = indice.dobles
+
+        resultado = []
+        for codigo in codigos:
+            if ES_COMODIN[codigo]:
+                resultado.append(1.0)
+                continue
+            palo, r = divmod(FORMA[codigo], 13)
+            rango = r + 1
+            vivas = max(0.0, COPIAS_POR_RANGO - conteos[rango]
+                        - factor * (por_rango[rango] - mano_rango.get(rango, 0)))
+            if vivas >= 2:
+                # Las vecinas solo suman: la vigencia ya es 1
+                resultado.append(1.0)
+                continue
+            for vecino in (r - 1, r + 1):
+                if 0 <= vecino < 13:
+                    forma = palo * 13 + vecino
+                    en_mano = (simples[palo] >> vecino & 1) + (dobles[palo] >> vecino & 1)
+                    vivas += max(0.0, COPIAS_POR_FORMA[forma] - en_mano
+                                 - factor * (por_forma[forma] - mano_forma.get(forma, 0)))
+            resultado.append(min(1.0, 0.5 + vivas / 4))
+        return resultado
+
+    def probabilidad_util(self, indice: HandIndex) -> float:
+        """
+        Probabilidad de que una carta robada a ciegas sirva a la mano:
+        completa un trío, toca una escala o es joker
+        """
+        trios = 0
+        for rango in range(1, 14):
+            if indice.conteo_rango(rango) >= 2:
+                trios |= 1 << (rango - 1)
+
+        factor = self.factor
+        vistas = self.por_forma
+        en_mano_vistas = self._mano_forma
+        utiles = self.restantes_forma(FORMA_JOKER, indice.comodines)
+        for palo in range(len(PALOS)):
+            simples = indice.simples[palo]
+            dobles = indice.dobles[palo]
+            candidatas = (((simples << 1) | (simples >> 1)) & ~simples | trios) & 0x1FFF
+            while candidatas:
+                bit = candidatas & -candidatas
+                candidatas ^= bit
+                r = bit.bit_length() - 1
+                forma = palo * 13 + r
+                libres = (COPIAS_POR_FORMA[forma] - (1 if simples & bit else 0) - (1 if dobles & bit else 0)
+                          - factor * (vistas[forma] - en_mano_vistas.get(forma, 0)))
+                if libres > 0:
+                    utiles += libres
+        return min(1.0, utiles / self.ocultas(indice.total))
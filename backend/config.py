@@ -10,6 +10,12 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD', '2218')
     DB_NAME = os.getenv('DB_NAME', 'carioca_online')
     
+    # Pool de conexiones: tamaño, vida máxima y verificación por inactividad (segundos)
+    DB_POOL_TAMANO = int(os.getenv('DB_POOL_TAMANO', '10'))
+    DB_POOL_VIDA_MAXIMA = float(os.getenv('DB_POOL_VIDA_MAXIMA', '1800'))
+    DB_POOL_VERIFICAR_TRAS = float(os.getenv('DB_POOL_VERIFICAR_TRAS', '30'))
+    DB_POOL_ESPERA_MAXIMA = float(os.getenv('DB_POOL_ESPERA_MAXIMA', '5'))
+    
     # Configuración del servidor
     SECRET_KEY = os.getenv('SECRET_KEY', 'carioca_secret_key_2025')
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
@@ -45,8 +51,22 @@ class Config:
     JOKERS_POR_BARAJA = 2
     TOTAL_JOKERS = 4  # 2 por baraja
     
-    # Configuración de WebSocket
-    SOCKETIO_ASYNC_MODE = 'threading'
+    # Caché de análisis de manos (sugerencias y bots), en entradas
+    CACHE_ANALISIS_MAX_ENTRADAS = int(os.getenv('CACHE_ANALISIS_MAX_ENTRADAS', '4096'))
+    
+    # Turnos de bots en segundo plano: hilos de trabajo y escala de la demora de pensamiento
+    BOT_TRABAJADORES = int(os.getenv('BOT_TRABAJADORES', '4'))
+    BOT_ESCALA_PENSAMIENTO = float(os.getenv('BOT_ESCALA_PENSAMIENTO', '1.0'))
+    
+    # Lote de repartos de torneo (deal_generator.py); las partidas con 'reparto_id' lo usan
+    RUTA_REPARTOS = os.getenv('RUTA_REPARTOS')
+    
+    # Segundos entre escrituras por lotes del estado vivo de las partidas
+    INTERVALO_ESCRITURA_ESTADO = float(os.getenv('INTERVALO_ESCRITURA_ESTADO', '0.5'))
+    
+    # Configuración de WebSocket ('threading' por defecto: el planificador de bots y el pool
+    # de conexiones usan hilos; eventlet/gevent exigen monkey patching antes de importar app)
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
     SOCKETIO_CORS_ALLOWED_ORIGINS = "*"
     
     @staticmethod
@@ -0,0 +1,265 @@
+"""
+Distancia de una mano a cada contrato
+Cuántas cartas le faltan a la mano para poder bajarse (estilo shanten): se calcula
+la mínima cantidad de comodines que completarían el contrato y se restan los jokers en mano
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+from card_codec import ES_COMODIN
+from hand_index import HandIndex
+from meld_tables import BITS
+
+# Ventanas de escala de 3 cartas (A-2-3 ... J-Q-K); escalas más largas nunca faltan menos cartas
+VENTANAS_MINIMAS = tuple(0b111 << (bajo - 1) for bajo in range(1, 12))
+
+
+def _costos_trios(conteos: List[int], max_trios: int) -> List[int]:
+    """
+    Cartas faltantes para formar 0..max_trios tríos con los conteos por rango dados
+    """
+    costos = []
+    for cantidad in conteos:
+        while cantidad > 0:
+            costos.append(3 - min(cantidad, 3))
+            cantidad -= 3
+    costos.sort()
+    costos.extend([3] * max(0, max_trios - len(costos)))
+
+    acumulados = [0]
+    for t in range(max_trios):
+        acumulados.append(acumulados[-1] + costos[t])
+    return acumulados
+
+
+@lru_cache(maxsize=65536)
+def cartas_faltantes(simples: Tuple[int, ...], dobles: Tuple[int, ...],
+                     requeridos: Tuple[Tuple[int, int], ...]) -> Tuple[int, ...]:
+    """
+    Mínimo de cartas (comodines) que faltan con las cartas normales de la mano
+    para cada par (tríos, escalas) de 'requeridos'
+    simples/dobles: máscaras de rango por palo de la primera y segunda copia
+
+    Se enumeran solo las escalas con 2 o más cartas reales; una escala con una
+    sola carta real cuesta 2 y puede armarse con cualquier carta que no aporte a los tríos
+    """
+    max_trios = max(t for t, _ in requeridos)
+    max_escalas = max(e for _, e in requeridos)
+    mejor = [3 * (t + e) for t, e in requeridos]
+
+    simples_act = list(simples)
+    dobles_act = list(dobles)
+    conteos = [0] * 13
+    for palo in range(4):
+        for r in range(13):
+            bit = 1 << r
+            if simples[palo] & bit:
+                conteos[r] += 1
+                if dobles[palo] & bit:
+                    conteos[r] += 1
+
+    def evaluar(elegidas: int, costo: int, cartas: int):
+        trios = _costos_trios(conteos, max_trios)
+        for i, (t, e) in enumerate(requeridos):
+            if e < elegidas:
+                continue
+            restantes = e - elegidas
+            libres = cartas - (3 * t - trios[t])
+            total = costo + trios[t] + 3 * restantes - min(restantes, libres)
+            if total < mejor[i]:
+                mejor[i] = total
+
+    def recorrer(elegidas: int, palo_inicio: int, ventana_inicio: int, costo: int, cartas: int):
+        evaluar(elegidas, costo, cartas)
+        if elegidas == max_escalas:
+            return
+
+        for palo in range(palo_inicio, 4):
+            mascara = simples_act[palo]
+            if BITS[mascara] < 2:
+                continue
+            previas = 0
+            for i in range(ventana_inicio if palo == palo_inicio else 0, len(VENTANAS_MINIMAS)):
+                presentes = mascara & VENTANAS_MINIMAS[i]
+                # Misma ventana efectiva que la anterior: su rama ya cubre todo lo de esta
+                if BITS[presentes] < 2 or presentes == previas:
+                    continue
+                previas = presentes
+
+                antes = (simples_act[palo], dobles_act[palo])
+                simples_act[palo] = mascara & ~(presentes & ~antes[1])
+                dobles_act[palo] = antes[1] & ~presentes
+                for r in range(i, i + 3):
+                    if presentes >> r & 1:
+                        conteos[r] -= 1
+
+                recorrer(elegidas + 1, palo, i, costo + 3 - BITS[presentes],
+                         cartas - BITS[presentes])
+
+                for r in range(i, i + 3):
+                    if presentes >> r & 1:
+                        conteos[r] += 1
+                simples_act[palo], dobles_act[palo] = antes
+
+    recorrer(0, 0, 0, 0, sum(conteos))
+    return tuple(mejor)
+
+
+@lru_cache(maxsize=65536)
+def _trios_usados(conteos: Tuple[int, ...], trios: int) -> Tuple[int, int, int]:
+    """
+    Los 'trios' tríos más baratos (cartas por rango en grupos de a 3, como _costos_trios):
+    cartas que faltan, cartas usadas y máscara de rangos con cartas fuera de los tríos
+    """
+    grupos = []
+    for r, cantidad in enumerate(conteos):
+        while cantidad > 0:
+            grupos.append((3 - min(cantidad, 3), r, min(cantidad, 3)))
+            cantidad -= 3
+    grupos.sort()
+    usadas = [0] * 13
+    costo = 3 * max(0, trios - len(grupos))
+    for faltan, r, tamano in grupos[:trios]:
+        costo += faltan
+        usadas[r] += tamano
+    sueltas = 0
+    for r in range(13):
+        if conteos[r] > usadas[r]:
+            sueltas |= 1 << r
+    return costo, sum(usadas), sueltas
+
+
+@lru_cache(maxsize=65536)
+def cartas_esenciales(simples: Tuple[int, ...], dobles: Tuple[int, ...],
+                      requerido: Tuple[int, int]) -> Tuple[int, Tuple[int, ...]]:
+    """
+    Cartas que faltan para un contrato y, en la misma búsqueda, las formas esenciales:
+    máscaras de rango por palo de las cartas que usan todos los planes óptimos vistos
+    Soltar una carta suma a lo sumo una faltante; si la carta no es esencial hay un plan
+    óptimo que no la necesita y no suma nada (las esenciales son una cota superior)
+    """
+    trios, escalas = requerido
+    mejor = [3 * (trios + escalas)]
+    esenciales = [simples]
+
+    simples_act = list(simples)
+    dobles_act = list(dobles)
+    conteos = [0] * 13
+    for palo in range(4):
+        for r in range(13):
+            bit = 1 << r
+            if simples[palo] & bit:
+                conteos[r] += 1
+                if dobles[palo] & bit:
+                    conteos[r] += 1
+
+    def evaluar(elegidas: int, costo: int, cartas: int):
+        if escalas < elegidas:
+            return
+        costo_trios, usadas, sueltas = _trios_usados(tuple(conteos), trios)
+        restantes = escalas - elegidas
+        libres = cartas - usadas
+        total = costo + costo_trios + 3 * restantes - min(restantes, libres)
+        if total > mejor[0]:
+            return
+
+        # Con cartas libres de sobra, una carta con copias fuera de las escalas se reemplaza
+        # por otra libre de su rango (en un trío) o por su copia (en una escala); si no,
+        # todas las cartas cuentan
+        if libres > restantes:
+            mascaras = tuple(s & ~(a & sueltas) for s, a in zip(simples, simples_act))
+        else:
+            mascaras = simples
+        if total < mejor[0]:
+            mejor[0] = total
+            esenciales[0] = mascaras
+        else:
+            esenciales[0] = tuple(a & b for a, b in zip(esenciales[0], mascaras))
+
+    def recorrer(elegidas: int, palo_inicio: int, ventana_inicio: int, costo: int, cartas: int):
+        evaluar(elegidas, costo, cartas)
+        if elegidas == escalas:
+            return
+
+        for palo in range(palo_inicio, 4):
+            mascara = simples_act[palo]
+            if BITS[mascara] < 2:
+                continue
+            previas = 0
+            for i in range(ventana_inicio if palo == palo_inicio else 0, len(VENTANAS_MINIMAS)):
+                presentes = mascara & VENTANAS_MINIMAS[i]
+                # Misma ventana efectiva que la anterior: su rama ya cubre todo lo de esta
+                if BITS[presentes] < 2 or presentes == previas:
+                    continue
+                previas = presentes
+
+                antes = (simples_act[palo], dobles_act[palo])
+                simples_act[palo] = mascara & ~(presentes & ~antes[1])
+                dobles_act[palo] = antes[1] & ~presentes
+                for r in range(i, i + 3):
+                    if presentes >> r & 1:
+                        conteos[r] -= 1
+
+                recorrer(elegidas + 1, palo, i, costo + 3 - BITS[presentes],
+                         cartas - BITS[presentes])
+
+                for r in range(i, i + 3):
+                    if presentes >> r & 1:
+                        conteos[r] += 1
+                simples_act[palo], dobles_act[palo] = antes
+
+    recorrer(0, 0, 0, 0, sum(conteos))
+    return mejor[0], esenciales[0]
+
+
+class DistanciaContratos(HandIndex):
+    """
+    Distancia de una mano a cada contrato, actualizada carta a carta
+    Agregar o quitar una carta es O(1); el cálculo se repite solo si cambiaron
+    las cartas normales y reutiliza los resultados ya vistos para la misma mano
+    """
+
+    def __init__(self, contratos: Dict[int, Dict], codigos: Iterable[int] = ()):
+        self.contratos = contratos
+        self._faltantes = None
+        super().__init__(codigos)
+
+    def agregar(self, codigo: int):
+        super().agregar(codigo)
+        if not ES_COMODIN[codigo]:
+            self._faltantes = None
+
+    def quitar(self, codigo: int):
+        super().quitar(codigo)
+        if not ES_COMODIN[codigo]:
+            self._faltantes = None
+
+    def faltantes_sin_comodines(self) -> Dict[int, int]:
+        """Cartas que faltan por contrato sin contar los jokers de la mano"""
+        if self._faltantes is None:
+            requeridos = tuple((c['trios'], c['escalas']) for c in self.contratos.values())
+            faltantes = cartas_faltantes(tuple(self.simples), tuple(self.dobles), requeridos)
+            self._faltantes = dict(zip(self.contratos, faltantes))
+        return self._faltantes
+
+    def distancias(self) -> Dict[int, int]:
+        """Cartas que le faltan a la mano para cumplir cada contrato (0 = puede bajarse)"""
+        return {
+            numero: max(0, faltan - self.comodines)
+            for numero, faltan in self.faltantes_sin_comodines().items()
+        }
+
+    def esenciales(self, numero_contrato: int) -> Tuple[int, Tuple[int, ...]]:
+        """Cartas que faltan sin jokers y máscaras de formas esenciales (cartas_esenciales)"""
+        contrato = self.contratos[numero_contrato]
+        return cartas_esenciales(tuple(self.simples), tuple(self.dobles),
+                                 (contrato['trios'], contrato['escalas']))
+
+    def distancia(self, numero_contrato: int) -> int:
+        """Cartas que faltan para un solo contrato (no calcula los demás)"""
+        if self._faltantes is not None:
+            faltan = self._faltantes[numero_contrato]
+        else:
+            # Misma búsqueda (y caché) que las cartas esenciales del descarte
+            faltan = self.esenciales(numero_contrato)[0]
+        return max(0, faltan - self.comodines)
@@ -0,0 +1,223 @@
+"""
+Resolución exacta de contratos
+Busca un conjunto disjunto de tríos y escalas que cumpla el contrato
+dejando en mano la menor cantidad de puntos posible
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from card_codec import ES_COMODIN, FORMA, PUNTOS
+from meld_tables import BITS, TOTAL_MASCARAS
+
+# Puntos por rango (índice 1-13)
+PUNTOS_RANGO = (0, 15, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10)
+
+# Suma de los puntos de los rangos presentes en cada máscara
+PUNTOS_MASCARA = tuple(
+    sum(PUNTOS_RANGO[r + 1] for r in range(13) if m >> r & 1) for m in range(TOTAL_MASCARAS)
+)
+
+# Máscara de la ventana [bajo, alto] (rangos 1-13)
+VENTANAS = {
+    (bajo, alto): ((1 << (alto - bajo + 1)) - 1) << (bajo - 1)
+    for bajo in range(1, 14) for alto in range(bajo, 14)
+}
+
+
+def _rangos(mascara: int) -> List[int]:
+    return [r + 1 for r in range(13) if mascara >> r & 1]
+
+
+@lru_cache(maxsize=65536)
+def _mejores_trios(conteos: Tuple[Tuple[int, int], ...], trios: int,
+                   comodines: int) -> Tuple[int, Optional[Tuple[Tuple[int, int], ...]]]:
+    """
+    Elige los rangos para los tríos maximizando los puntos bajados
+    conteos: pares (rango, cantidad) con cantidad > 0
+    Devuelve (puntos, ((rango, cantidad_de_trios), ...)); rango 0 = trío solo de comodines
+    """
+    if trios == 0:
+        return 0, ()
+
+    if not conteos:
+        if 3 * trios <= comodines:
+            return 0, ((0, trios),)
+        return -1, None
+
+    (rango, cantidad), resto = conteos[0], conteos[1:]
+    mejor = _mejores_trios(resto, trios, comodines)
+
+    for k in range(1, trios + 1):
+        necesarios = max(0, 3 * k - cantidad)
+        if necesarios > comodines:
+            break
+        puntos, plan = _mejores_trios(resto, trios - k, comodines - necesarios)
+        if plan is None:
+            continue
+        puntos += cantidad * PUNTOS_RANGO[rango]
+        if puntos > mejor[0]:
+            mejor = (puntos, ((rango, k),) + plan)
+
+    return mejor
+
+
+def _conteos_por_rango(simples: List[int], dobles: List[int]) -> Tuple[Tuple[int, int], ...]:
+    conteos = []
+    for r in range(13):
+        bit = 1 << r
+        cantidad = 0
+        for palo in range(4):
+            if simples[palo] & bit:
+                cantidad += 1
+            if dobles[palo] & bit:
+                cantidad += 1
+        if cantidad:
+            conteos.append((r + 1, cantidad))
+    return tuple(conteos)
+
+
+def _buscar(simples: List[int], dobles: List[int], comodines: int, trios: int,
+            escalas: int, total_puntos: int):
+    """
+    Recorre las escalas en orden canónico (palo, bajo, alto) y resuelve los tríos
+    sobre las cartas restantes. Las copias de la segunda baraja se guardan en 'dobles'
+    """
+    mejor = {'puntos': -1, 'escalas': None, 'trios': None}
+
+    def recorrer(restantes: int, inicio: Tuple[int, int, int], comodines_libres: int,
+                 puntos: int, elegidas: List[Tuple[int, int, int, int]],
+                 puntos_libres: int):
+        if mejor['puntos'] == total_puntos or puntos + puntos_libres <= mejor['puntos']:
+            return
+
+        if restantes == 0:
+            puntos_trios, plan = _mejores_trios(
+                _conteos_por_rango(simples, dobles), trios, comodines_libres
+            )
+            if plan is not None and puntos + puntos_trios > mejor['puntos']:
+                mejor.update(puntos=puntos + puntos_trios, escalas=list(elegidas), trios=plan)
+            return
+
+        # Escalas formadas solo por comodines
+        if 3 * restantes <= comodines_libres:
+            recorrer(0, (4, 0, 0), comodines_libres - 3 * restantes, puntos,
+                     elegidas + [(-1, 0, 0, 0)] * restantes, puntos_libres)
+
+        for palo in range(inicio[0], 4):
+            mascara = simples[palo]
+            rangos = _rangos(mascara)
+            for bajo in rangos:
+                if palo == inicio[0] and bajo < inicio[1]:
+                    continue
+                for alto in rangos:
+                    if alto < bajo or (palo == inicio[0] and bajo == inicio[1] and alto < inicio[2]):
+                        continue
+                    presentes = mascara & VENTANAS[(bajo, alto)]
+                    necesarios = max(3, alto - bajo + 1) - BITS[presentes]
+                    if necesarios > comodines_libres:
+                        continue
+
+                    # Quitar una copia de cada rango usado
+                    antes = (simples[palo], dobles[palo])
+                    simples[palo] = mascara & ~(presentes & ~antes[1])
+                    dobles[palo] = antes[1] & ~presentes
+                    ganados = PUNTOS_MASCARA[presentes]
+                    elegidas.append((palo, presentes, bajo, alto))
+
+                    recorrer(restantes - 1, (palo, bajo, alto), comodines_libres - necesarios,
+                             puntos + ganados, elegidas, puntos_libres - ganados)
+
+                    elegidas.pop()
+                    simples[palo], dobles[palo] = antes
+
+    recorrer(escalas, (0, 1, 1), comodines, 0, [], total_puntos)
+    return mejor
+
+
+def resolver_contrato(codigos: Iterable[int], trios: int, escalas: int) -> Optional[Dict]:
+    """
+    Resuelve un contrato sobre una mano codificada
+    Devuelve las combinaciones (listas de códigos), las cartas sobrantes y sus puntos,
+    o None si la mano no puede cumplir el contrato
+    """
+    codigos = list(codigos)
+    por_forma: Dict[int, List[int]] = {}
+    jokers = []
+    sobrantes = []
+    simples = [0, 0, 0, 0]
+    dobles = [0, 0, 0, 0]
+    total_puntos = 0
+
+    for codigo in codigos:
+        if ES_COMODIN[codigo]:
+            jokers.append(codigo)
+            continue
+        copias = por_forma.setdefault(FORMA[codigo], [])
+        if len(copias) >= 2:
+            # Más de dos copias solo ocurre con cartas fuera del catálogo
+            sobrantes.append(codigo)
+            continue
+        copias.append(codigo)
+        palo, bit = divmod(FORMA[codigo], 13)
+        if len(copias) == 1:
+            simples[palo] |= 1 << bit
+        else:
+            dobles[palo] |= 1 << bit
+        total_puntos += PUNTOS[codigo]
+
+    mejor = _buscar(simples, dobles, len(jokers), trios, escalas, total_puntos)
+    if mejor['escalas'] is None:
+        return None
+
+    combinaciones = []
+
+    # Materializar escalas en orden, con comodines en los huecos
+    for palo, presentes, bajo, alto in mejor['escalas']:
+        cartas = []
+        if palo < 0:
+            cartas = [jokers.pop() for _ in range(3)]
+        else:
+            for rango in range(bajo, alto + 1):
+                if presentes >> (rango - 1) & 1:
+                    cartas.append(por_forma[palo * 13 + rango - 1].pop(0))
+                else:
+                    cartas.append(jokers.pop())
+            while len(cartas) < 3:
+                cartas.append(jokers.pop())
+        combinaciones.append({'tipo': 'escala', 'cartas': cartas})
+
+    # Materializar tríos repartiendo las cartas del rango entre los tríos elegidos
+    inicio_trios = len(combinaciones)
+    restantes_por_rango: Dict[int, List[int]] = {}
+    for forma, copias in por_forma.items():
+        restantes_por_rango.setdefault(forma % 13 + 1, []).extend(copias)
+
+    for rango, cantidad in mejor['trios']:
+        grupos = [[] for _ in range(cantidad)]
+        for i, codigo in enumerate(restantes_por_rango.pop(rango, []) if rango else []):
+            grupos[i % cantidad].append(codigo)
+        for grupo in grupos:
+            while len(grupo) < 3:
+                grupo.append(jokers.pop())
+            combinaciones.append({'tipo': 'trio', 'cartas': grupo})
+
+    for copias in restantes_por_rango.values():
+        sobrantes.extend(copias)
+
+    # Los comodines sobrantes se bajan: en un trío sin límite, en una escala hasta 13 cartas
+    while jokers:
+        if len(combinaciones) > inicio_trios:
+            combinaciones[inicio_trios]['cartas'].extend(jokers)
+            jokers = []
+            break
+        abiertas = [c for c in combinaciones if len(c['cartas']) < 13]
+        if not abiertas:
+            break
+        abiertas[0]['cartas'].append(jokers.pop())
+    sobrantes.extend(jokers)
+
+    return {
+        'combinaciones': combinaciones,
+        'sobrantes': sobrantes,
+        'puntos_restantes': sum(PUNTOS[codigo] for codigo in sobrantes)
+    }
@@ -0,0 +1,195 @@
+"""
+Pool de conexiones MySQL compartido
+Las rutas y el gestor de partidas piden una conexión con 'with pool_conexiones.conexion()'
+en vez de abrir una por consulta: el handshake TCP + autenticación se paga una vez por
+conexión. Usa primitivas de threading, que eventlet/gevent parchean al hacer monkey
+patching, así que sirve tanto con hilos como con green threads
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Tuple
+
+import pymysql
+
+from config import Config
+
+
+def crear_conexion_mysql():
+    return pymysql.connect(
+        host=Config.DB_HOST,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME,
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+
+class PoolAgotado(Exception):
+    """No se liberó ninguna conexión dentro de la espera máxima"""
+
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones reutilizables
+    tamano: conexiones abiertas como máximo (en uso + libres)
+    vida_maxima: segundos tras los que una conexión se cierra y se reemplaza
+    verificar_tras: segundos de inactividad tras los que se hace ping antes de entregarla
+    espera_maxima: segundos que se espera una conexión libre antes de PoolAgotado
+    """
+
+    def __init__(self, crear: Callable = crear_conexion_mysql, tamano: int = 10,
+                 vida_maxima: float = 1800, verificar_tras: float = 30, espera_maxima: float = 5):
+        self.crear = crear
+        self.tamano = tamano
+        self.vida_maxima = vida_maxima
+        self.verificar_tras = verificar_tras
+        self.espera_maxima = espera_maxima
+
+        self._condicion = threading.Condition()
+        self._libres: Deque[Tuple[object, float, float]] = deque()  # (conexión, creada, devuelta)
+        self._abiertas = 0
+
+        self.entregas = 0
+        self.creadas = 0
+        self.recicladas = 0
+        self.descartadas = 0
+        self.agotado = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    @contextmanager
+    def conexion(self) -> Iterator:
+        """
+        Presta una conexión; al salir se deshace lo no confirmado y vuelve al pool
+        Si el bloque falla por un error de conexión, la conexión se descarta
+        """
+        connection, creada = self._tomar()
+        try:
+            yield connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self._descartar(connection)
+            raise
+        except BaseException:
+            self._devolver(connection, creada)
+            raise
+        else:
+            self._devolver(connection, creada)
+
+    def _tomar(self) -> Tuple[object, float]:
+        inicio = time.monotonic()
+        with self._condicion:
+            while True:
+                if self._libres:
+                    connection, creada, devuelta = self._libres.pop()
+                    break
+                if self._abiertas < self.tamano:
+                    self._abiertas += 1
+                    connection = None
+                    break
+                restante = self.espera_maxima - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self.agotado += 1
+                    raise PoolAgotado(f"Sin conexiones libres tras {self.espera_maxima}s "
+                                      f"({self.tamano} en uso)")
+                self._condicion.wait(restante)
+
+            espera = time.monotonic() - inicio
+            self.entregas += 1
+            if espera > 0.001:  # tuvo que esperar a que se liberara una
+                self.esperas += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+
+        # Abrir, verificar o reciclar fuera del lock
+        ahora = time.monotonic()
+        if connection is not None:
+            if ahora - creada > self.vida_maxima:
+                self._cerrar(connection)
+                with self._condicion:
+                    self.recicladas += 1
+                connection = None
+            elif ahora - devuelta > self.verificar_tras:
+                try:
+                    connection.ping(reconnect=False)
+                except Exception:
+                    self._cerrar(connection)
+                    with self._condicion:
+                        self.descartadas += 1
+                    connection = None
+
+        if connection is None:
+            try:
+                connection = self.crear()
+            except BaseException:
+                with self._condicion:
+                    self._abiertas -= 1
+                    self._condicion.notify()
+                raise
+            creada = ahora
+            with self._condicion:
+                self.creadas += 1
+        return connection, creada
+
+    def _devolver(self, connection, creada: float):
+        try:
+            # Cierra la transacción abierta (también la de solo lectura) para no ver datos viejos
+            connection.rollback()
+        except Exception:
+            self._descartar(connection)
+            return
+        with self._condicion:
+            self._libres.append((connection, creada, time.monotonic()))
+            self._condicion.notify()
+
+    def _descartar(self, connection):
+        self._cerrar(connection)
+        with self._condicion:
+            self._abiertas -= 1
+            self.descartadas += 1
+            self._condicion.notify()
+
+    @staticmethod
+    def _cerrar(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def cerrar(self):
+        """Cierra las conexiones libres (p. ej. al apagar el servidor)"""
+        with self._condicion:
+            libres = list(self._libres)
+            self._libres.clear()
+            self._abiertas -= len(libres)
+        for connection, _, _ in libres:
+            self._cerrar(connection)
+
+    def estadisticas(self) -> Dict:
+        with self._condicion:
+            return {
+                'tamano': self.tamano,
+                'abiertas': self._abiertas,
+                'libres': len(self._libres),
+                'en_uso': self._abiertas - len(self._libres),
+                'entregas': self.entregas,
+                'creadas': self.creadas,
+                'recicladas': self.recicladas,
+                'descartadas': self.descartadas,
+                'agotado': self.agotado,
+                'esperas': self.esperas,
+                'espera_media_ms': self.espera_total / self.entregas * 1000 if self.entregas else 0.0,
+                'espera_max_ms': self.espera_max * 1000
+            }
+
+
+# Instancia global del pool
+pool_conexiones = PoolConexiones(
+    tamano=Config.DB_POOL_TAMANO,
+    vida_maxima=Config.DB_POOL_VIDA_MAXIMA,
+    verificar_tras=Config.DB_POOL_VERIFICAR_TRAS,
+    espera_maxima=Config.DB_POOL_ESPERA_MAXIMA
+)
@@ -0,0 +1,101 @@
+"""
+Repartos precalculados para torneos y partidas duplicadas
+Genera miles de repartos de una vez a partir de una semilla: cada reparto es una
+permutación de los códigos 0-111 por ronda (un byte por carta), barajadas todas juntas
+con NumPy. El lote se guarda en un archivo binario que se abre con mmap, así crear una
+mesa de torneo es leer el reparto por su número en vez de armar y barajar un mazo
+Uso:
+    python backend/deal_generator.py --semilla 2025 --cantidad 10000 --salida repartos.bin
+"""
+import argparse
+import mmap
+import struct
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+from card_codec import TOTAL_CARTAS
+from config import Config
+
+MAGIA = b'CREP'
+VERSION = 1
+CABECERA = struct.Struct('<4sHHqII')  # magia, versión, cartas, semilla, repartos, rondas
+
+
+class LoteRepartos:
+    """
+    Repartos (cantidad x rondas x 112) de una semilla; el número de reparto es su fila
+    """
+
+    def __init__(self, permutaciones: np.ndarray, semilla: int):
+        self.permutaciones = permutaciones
+        self.semilla = semilla
+        self._mmap = None
+
+    @classmethod
+    def generar(cls, semilla: int, cantidad: int, rondas: int = Config.MAX_CONTRATOS) -> 'LoteRepartos':
+        """Baraja todas las rondas de todos los repartos en una sola operación"""
+        rng = np.random.Generator(np.random.PCG64(semilla))
+        mazos = np.tile(np.arange(TOTAL_CARTAS, dtype=np.uint8), (cantidad * rondas, 1))
+        permutaciones = rng.permuted(mazos, axis=1).reshape(cantidad, rondas, TOTAL_CARTAS)
+        return cls(permutaciones, semilla)
+
+    @classmethod
+    def abrir(cls, ruta: str) -> 'LoteRepartos':
+        """Abre un lote guardado sin copiarlo a memoria (mmap de solo lectura)"""
+        with open(ruta, 'rb') as archivo:
+            datos = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, version, cartas, semilla, cantidad, rondas = CABECERA.unpack_from(datos)
+        if (magia != MAGIA or version != VERSION or cartas != TOTAL_CARTAS
+                or len(datos) != CABECERA.size + cantidad * rondas * cartas):
+            datos.close()
+            raise ValueError(f"Archivo de repartos inválido o de otra versión: {ruta}")
+        permutaciones = np.frombuffer(datos, np.uint8, offset=CABECERA.size).reshape(cantidad, rondas, cartas)
+        lote = cls(permutaciones, semilla)
+        lote._mmap = datos
+        return lote
+
+    def guardar(self, ruta: str):
+        cantidad, rondas, cartas = self.permutaciones.shape
+        with open(ruta, 'wb') as archivo:
+            archivo.write(CABECERA.pack(MAGIA, VERSION, cartas, self.semilla, cantidad, rondas))
+            archivo.write(np.ascontiguousarray(self.permutaciones).tobytes())
+
+    @property
+    def cantidad(self) -> int:
+        return self.permutaciones.shape[0]
+
+    @property
+    def rondas(self) -> int:
+        return self.permutaciones.shape[1]
+
+    def reparto(self, numero: int) -> np.ndarray:
+        """Mazos de todas las rondas de un reparto (rondas x 112)"""
+        return self.permutaciones[numero]
+
+    def mazo(self, numero: int, ronda: int = 1) -> List[int]:
+        """Orden del mazo de una ronda (1 = primer contrato) como códigos de carta"""
+        return self.permutaciones[numero, ronda - 1].tolist()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Genera repartos reproducibles para torneos')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--cantidad', type=int, default=1000)
+    parser.add_argument('--rondas', type=int, default=Config.MAX_CONTRATOS, help='mazos por reparto')
+    parser.add_argument('--salida', required=True)
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    lote = LoteRepartos.generar(args.semilla, args.cantidad, args.rondas)
+    lote.guardar(args.salida)
+    duracion = time.perf_counter() - inicio
+    print(f"{lote.cantidad} repartos de {lote.rondas} rondas en {args.salida} "
+          f"({lote.permutaciones.nbytes / 2 ** 20:.1f} MiB, {duracion:.2f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
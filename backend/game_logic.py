@@ -1,6 +1,16 @@
 import json
 import random
-from typing import List, Dict, Tuple, Any
+from array import array
+from typing import List, Dict, Tuple, Any, Iterable, Optional
+from analysis_cache import cache_analisis, consultar_analisis
+from card_codec import (ES_COMODIN, FORMA, codificar_carta, codificar_mano,
+                        decodificar_mano, puntos_codigos)
+from contract_distance import DistanciaContratos
+from contract_solver import resolver_contrato as resolver_contrato_codigos
+from hand_index import HandIndex
+from meld_tables import (escala_valida, mascara_de_valores,
+                         validar_escala_codigos, validar_trio_codigos)
+from table_melds import CombinacionMesa
 
 class CariocaGameLogic:
     def __init__(self):
@@ -69,24 +79,10 @@ class CariocaGameLogic:
         if len(cartas) < 3:
             return False
         
-        # Obtener valores de las cartas (sin comodines)
-        valores = []
-        comodines = 0
-        
-        for carta in cartas:
-            if carta.get('es_comodin', False):
-                comodines += 1
-            else:
-                valores.append(carta.get('valor'))
-        
-        # Si hay cartas normales, todas deben tener el mismo valor
-        if valores:
-            valor_base = valores[0]
-            if not all(v == valor_base for v in valores):
-                return False
-        
-        # Un trío debe tener al menos 3 cartas
-        return len(cartas) >= 3
+        try:
+            return validar_trio_codigos(codificar_mano(cartas))
+        except ValueError:
+            return False
     
     def validar_escala(self, cartas: List[Dict]) -> bool:
         """
@@ -95,41 +91,10 @@ class CariocaGameLogic:
         if len(cartas) < 3:
             return False
         
-        # Separar cartas por palo
-        palos = {}
-        comodines = []
-        
-        for carta in cartas:
-            if carta.get('es_comodin', False):
-                comodines.append(carta)
-            else:
-                palo = carta.get('palo')
-                if palo not in palos:
-                    palos[palo] = []
-                palos[palo].append(carta)
-        
-        # Una escala debe ser del mismo palo
-        if len(palos) > 1:
+        try:
+            return validar_escala_codigos(codificar_mano(cartas))
+        except ValueError:
             return False
-        
-        if len(palos) == 0:  # Solo comodines
-            return len(comodines) >= 3
-        
-        # Obtener el palo de la escala
-        palo_escala = list(palos.keys())[0]
-        cartas_palo = palos[palo_escala]
-        
-        # Convertir valores a números
-        valores_numericos = []
-        for carta in cartas_palo:
-            valor = carta.get('valor')
-            if valor in self.valores_cartas:
-                valores_numericos.append(self.valores_cartas[valor])
-        
-        valores_numericos.sort()
-        
-        # Verificar secuencia con comodines
-        return self.verificar_secuencia_con_comodines(valores_numericos, len(comodines))
     
     def verificar_secuencia_con_comodines(self, valores: List[int], comodines: int) -> bool:
         """
@@ -141,17 +106,12 @@ class CariocaGameLogic:
         if len(valores) == 0:
             return False
         
-        # Eliminar duplicados y ordenar
-        valores_unicos = sorted(set(valores))
-        
-        # Calcular huecos en la secuencia
-        huecos = 0
-        for i in range(1, len(valores_unicos)):
-            huecos += valores_unicos[i] - valores_unicos[i-1] - 1
+        # Valores fuera de A-K no forman secuencia (ni caben en la máscara de rangos)
+        if not all(1 <= valor <= 13 for valor in valores):
+            return False
         
         # Los comodines deben cubrir los huecos y completar al menos 3 cartas
-        total_cartas = len(valores) + comodines
-        return total_cartas >= 3 and comodines >= huecos
+        return escala_valida(mascara_de_valores(valores), len(valores), comodines)
     
     def calcular_puntos_carta(self, carta: Dict) -> int:
         """
@@ -174,20 +134,74 @@ class CariocaGameLogic:
         """
         return sum(self.calcular_puntos_carta(carta) for carta in cartas)
     
-    def puede_agregar_a_combinacion(self, carta: Dict, combinacion: List[Dict]) -> bool:
+    def codificar_mano(self, cartas: List[Dict]) -> array:
+        """
+        Convierte una mano al formato compacto (un byte por carta)
+        """
+        return codificar_mano(cartas)
+    
+    def decodificar_mano(self, codigos: Iterable[int]) -> List[Dict]:
+        """
+        Convierte una mano compacta al formato diccionario usado por la API
+        """
+        return decodificar_mano(codigos)
+    
+    def calcular_puntos_codigos(self, codigos: Iterable[int]) -> int:
+        """
+        Calcula el total de puntos de una mano en formato compacto
+        """
+        return puntos_codigos(codigos)
+    
+    def puede_agregar_a_combinacion(self, carta: Dict, combinacion) -> bool:
         """
         Verifica si una carta puede agregarse a una combinación existente
+        Acepta una CombinacionMesa (consulta O(1)) o una lista de cartas
         """
         if not combinacion:
             return False
         
-        # Determinar tipo de combinación
-        if self.es_trio(combinacion):
-            return self.puede_agregar_a_trio(carta, combinacion)
-        elif self.es_escala(combinacion):
-            return self.puede_agregar_a_escala(carta, combinacion)
-        
-        return False
+        try:
+            if not isinstance(combinacion, CombinacionMesa):
+                combinacion = CombinacionMesa(combinacion)
+            return combinacion.acepta(codificar_carta(carta))
+        except ValueError:
+            return False
+    
+    def preparar_mesa(self, combinaciones: List[Dict]) -> List[CombinacionMesa]:
+        """
+        Convierte las combinaciones bajadas ({'tipo', 'cartas'} o listas de cartas)
+        en combinaciones indexadas por cartas aceptadas
+        """
+        mesa = []
+        for combinacion in combinaciones:
+            if isinstance(combinacion, CombinacionMesa):
+                mesa.append(combinacion)
+            elif isinstance(combinacion, dict):
+                mesa.append(CombinacionMesa(combinacion.get('cartas', []), combinacion.get('tipo')))
+            else:
+                mesa.append(CombinacionMesa(combinacion))
+        return mesa
+    
+    def cartas_agregables(self, cartas_mano: List[Dict],
+                          mesa: List[CombinacionMesa]) -> List[Tuple[int, int]]:
+        """
+        Pares (índice de carta en mano, índice de combinación en mesa) que pueden agregarse
+        Se cruza el conjunto de cartas de la mano con las aceptadas por cada combinación
+        """
+        codigos = codificar_mano(cartas_mano)
+        formas_mano = {FORMA[c] for c in codigos if not ES_COMODIN[c]}
+        posiciones_comodines = [i for i, c in enumerate(codigos) if ES_COMODIN[c]]
+        
+        agregables = []
+        for j, combinacion in enumerate(mesa):
+            comunes = formas_mano & combinacion.aceptadas
+            if comunes:
+                agregables.extend((i, j) for i, c in enumerate(codigos)
+                                  if not ES_COMODIN[c] and FORMA[c] in comunes)
+            if posiciones_comodines and combinacion.acepta(codigos[posiciones_comodines[0]]):
+                agregables.extend((i, j) for i in posiciones_comodines)
+        
+        return agregables
     
     def es_trio(self, combinacion: List[Dict]) -> bool:
         """
@@ -256,7 +270,18 @@ class CariocaGameLogic:
     def generar_sugerencias(self, cartas_mano: List[Dict], contrato_actual: int) -> List[Dict]:
         """
         Genera sugerencias de combinaciones posibles para el jugador
+        (memorizadas por huella de la mano y contrato)
+        """
+        return consultar_analisis('sugerencias', cartas_mano, contrato_actual,
+                                  lambda cartas: self._generar_sugerencias(cartas, contrato_actual))
+    
+    def estadisticas_cache(self) -> Dict:
+        """
+        Aciertos, fallos y desalojos de la caché de análisis compartida
         """
+        return cache_analisis.estadisticas()
+    
+    def _generar_sugerencias(self, cartas_mano: List[Dict], contrato_actual: int) -> List[Dict]:
         sugerencias = []
         
         # Buscar posibles tríos
@@ -269,6 +294,60 @@ class CariocaGameLogic:
         
         return sugerencias
     
+    def resolver_contrato(self, cartas_mano: List[Dict], numero_contrato: int) -> Optional[Dict]:
+        """
+        Busca tríos y escalas disjuntos que cumplan el contrato dejando
+        la menor cantidad de puntos en mano (usa comodines si hacen falta)
+        """
+        if numero_contrato not in self.contratos:
+            return None
+        
+        contrato = self.contratos[numero_contrato]
+        try:
+            codigos = codificar_mano(cartas_mano)
+        except ValueError:
+            return None
+        
+        solucion = resolver_contrato_codigos(codigos, contrato["trios"], contrato["escalas"])
+        if solucion is None:
+            return None
+        
+        # Devolver las mismas cartas recibidas, no copias decodificadas
+        originales = {}
+        for codigo, carta in zip(codigos, cartas_mano):
+            originales.setdefault(codigo, []).append(carta)
+        
+        return {
+            'combinaciones': [
+                {
+                    'tipo': combinacion['tipo'],
+                    'cartas': [originales[codigo].pop() for codigo in combinacion['cartas']]
+                }
+                for combinacion in solucion['combinaciones']
+            ],
+            'cartas_restantes': [originales[codigo].pop() for codigo in solucion['sobrantes']],
+            'puntos_restantes': solucion['puntos_restantes']
+        }
+    
+    def indexar_mano(self, cartas_mano: List[Dict]) -> HandIndex:
+        """
+        Crea el índice incremental de la mano (conteos por rango, máscaras por palo, jokers)
+        """
+        return HandIndex.desde_cartas(cartas_mano)
+    
+    def seguimiento_distancia(self, cartas_mano: List[Dict]) -> DistanciaContratos:
+        """
+        Crea un seguimiento de la distancia a cada contrato que se actualiza
+        carta a carta con agregar()/quitar() (códigos de carta)
+        """
+        return DistanciaContratos(self.contratos, codificar_mano(cartas_mano))
+    
+    def distancia_contratos(self, cartas_mano: List[Dict]) -> Dict[int, int]:
+        """
+        Cuántas cartas le faltan a la mano para cumplir cada uno de los 10 contratos
+        """
+        return self.seguimiento_distancia(cartas_mano).distancias()
+    
     def buscar_trios_posibles(self, cartas: List[Dict]) -> List[Dict]:
         """
         Busca posibles tríos en las cartas
@@ -2,13 +2,18 @@
 Gestor principal del juego Carioca
 Maneja el flujo completo de las partidas
 """
+import atexit
 import json
 import random
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from game_logic import CariocaGameLogic
+from batch_inference import ProgramadorBots
 from bot_ai import CariocaBotAI, obtener_nombre_bot
-import pymysql
+from card_codec import desempaquetar_cartas, empaquetar_cartas, mazo_barajado
+from deal_generator import LoteRepartos
+from game_state import AccionInvalida, AlmacenPartidas, EstadoPartida
+from db_pool import pool_conexiones
 from config import Config
 
 class CariocaGameManager:
@@ -17,62 +22,71 @@ class CariocaGameManager:
         self.game_logic = CariocaGameLogic()
         self.partidas_activas = {}
         self.bots_activos = {}
-    
-    def get_db_connection(self):
-        return pymysql.connect(
-            host=Config.DB_HOST,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME,
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        # (partida_id, id en partida_jugadores) -> clave en bots_activos
+        self.claves_bot = {}
+        # Repartos de torneo (deal_generator.LoteRepartos); las partidas los piden con 'reparto_id'
+        # Se abre Config.RUTA_REPARTOS la primera vez que una partida lo pide
+        self.repartos = None
+        # Estado vivo de las partidas (fuente de verdad) con escritura diferida a la base de datos
+        self.estados = AlmacenPartidas(pool_conexiones.conexion, Config.INTERVALO_ESCRITURA_ESTADO)
+        atexit.register(self.estados.detener)
+        # al_turno_bot(partida_id, jugador_id): lo fija el servidor para programar los turnos de bots
+        self.al_turno_bot: Optional[Callable[[int, int], Any]] = None
+        # al_terminar_partida(partida_id, resultado): p. ej. cancelar los turnos de bots pendientes
+        self.al_terminar_partida: Optional[Callable[[int, Dict], Any]] = None
+        # partida_id -> callback(resultado) de una sola partida (p. ej. la mesa de un torneo)
+        self.al_terminar_por_partida: Dict[int, Callable[[Dict], Any]] = {}
     
     def crear_partida_completa(self, configuracion: Dict) -> Dict:
         """
         Crea una partida completa con jugadores y bots
         """
         try:
-            connection = self.get_db_connection()
-            try:
+            with pool_conexiones.conexion() as connection:
                 with connection.cursor() as cursor:
                     # Crear partida base
                     partida_id = self._crear_partida_base(cursor, configuracion)
                     
-                    # Agregar jugadores humanos
-                    posicion = 1
-                    for user_id in configuracion.get('jugadores_humanos', []):
-                        cursor.execute("""
-                            INSERT INTO partida_jugadores (partida_id, usuario_id, posicion)
-                            VALUES (%s, %s, %s)
-                        """, (partida_id, user_id, posicion))
-                        posicion += 1
+                    # Asientos en orden: 'asientos' ({'usuario_id'} o config de bot) o, si no
+                    # viene, primero los humanos y después los bots
+                    asientos = configuracion.get('asientos') or (
+                        [{'usuario_id': user_id} for user_id in configuracion.get('jugadores_humanos', [])]
+                        + list(configuracion.get('bots', [])))
                     
-                    # Agregar bots
-                    for bot_config in configuracion.get('bots', []):
-                        nombre_bot = obtener_nombre_bot(bot_config['dificultad'])
+                    posicion = 1
+                    for asiento in asientos:
+                        if 'usuario_id' in asiento:
+                            # Jugador humano
+                            cursor.execute("""
+                                INSERT INTO partida_jugadores (partida_id, usuario_id, posicion)
+                                VALUES (%s, %s, %s)
+                            """, (partida_id, asiento['usuario_id'], posicion))
+                            posicion += 1
+                            continue
+                        
+                        nombre_bot = obtener_nombre_bot(asiento['dificultad'])
                         cursor.execute("""
                             INSERT INTO partida_jugadores (partida_id, posicion, es_bot, nombre_bot, dificultad_bot)
                             VALUES (%s, %s, TRUE, %s, %s)
-                        """, (partida_id, posicion, nombre_bot, bot_config['dificultad']))
+                        """, (partida_id, posicion, nombre_bot, asiento['dificultad']))
                         
                         # Crear instancia de IA para el bot
-                        self.bots_activos[f"{partida_id}_{posicion}"] = CariocaBotAI(bot_config['dificultad'])
+                        bot_key = f"{partida_id}_{posicion}"
+                        self.bots_activos[bot_key] = CariocaBotAI(asiento['dificultad'], asiento.get('config'))
+                        self.claves_bot[(partida_id, cursor.lastrowid)] = bot_key
                         posicion += 1
                     
-                    connection.commit()
-                    
-                    # Inicializar partida
-                    self.inicializar_partida(partida_id)
+                    # Repartir en la misma transacción y con el mismo cursor
+                    estado = self._repartir_partida(cursor, partida_id, configuracion.get('reparto_id'))
                     
-                    return {
-                        'exito': True,
-                        'partida_id': partida_id,
-                        'mensaje': 'Partida creada exitosamente'
-                    }
-                    
-            finally:
-                connection.close()
+                    connection.commit()
+            
+            self._partida_iniciada(estado)
+            return {
+                'exito': True,
+                'partida_id': partida_id,
+                'mensaje': 'Partida creada exitosamente'
+            }
                 
         except Exception as e:
             return {
@@ -96,177 +110,324 @@ class CariocaGameManager:
         
         return cursor.lastrowid
     
-    def inicializar_partida(self, partida_id: int):
-        """Inicializa una partida con cartas y estado inicial"""
+    def inicializar_partida(self, partida_id: int, reparto_id: Optional[int] = None) -> Dict:
+        """
+        Inicializa una partida con cartas y estado inicial, en su propia transacción
+        Con reparto_id el mazo sale del lote de repartos cargado, sin barajar
+        """
         try:
-            connection = self.get_db_connection()
-            try:
+            with pool_conexiones.conexion() as connection:
                 with connection.cursor() as cursor:
-                    # Obtener jugadores
-                    cursor.execute("""
-                        SELECT id, usuario_id, posicion, es_bot, nombre_bot, dificultad_bot
-                        FROM partida_jugadores 
-                        WHERE partida_id = %s 
-                        ORDER BY posicion
-                    """, (partida_id,))
-                    
-                    jugadores = cursor.fetchall()
-                    
-                    # Crear y barajar mazo
-                    mazo = self._crear_mazo_completo(cursor)
-                    random.shuffle(mazo)
-                    
-                    # Repartir cartas para el primer contrato
-                    cartas_por_jugador = Config.CARTAS_INICIALES_POR_CONTRATO[1]
-                    cartas_repartidas = 0
-                    
-                    for jugador in jugadores:
-                        cartas_jugador = mazo[cartas_repartidas:cartas_repartidas + cartas_por_jugador]
-                        cartas_repartidas += cartas_por_jugador
-                        
-                        cursor.execute("""
-                            UPDATE partida_jugadores 
-                            SET cartas_en_mano = %s 
-                            WHERE id = %s
-                        """, (json.dumps(cartas_jugador), jugador['id']))
-                    
-                    # Configurar mazo y descarte
-                    mazo_restante = mazo[cartas_repartidas:]
-                    primera_descarte = mazo_restante.pop(0)
-                    
-                    # Crear estado inicial del juego
-                    cursor.execute("""
-                        INSERT INTO estado_juego (partida_id, mazo, descarte, ultima_carta_descartada, jugador_turno_id)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (
-                        partida_id,
-                        json.dumps(mazo_restante),
-                        json.dumps([primera_descarte]),
-                        json.dumps(primera_descarte),
-                        jugadores[0]['id']
-                    ))
-                    
-                    # Actualizar estado de partida
-                    cursor.execute("""
-                        UPDATE partidas 
-                        SET estado = 'en_curso', contrato_actual = 1, fecha_inicio = NOW(),
-                            jugadores_actuales = %s
-                        WHERE id = %s
-                    """, (len(jugadores), partida_id))
-                    
+                    estado = self._repartir_partida(cursor, partida_id, reparto_id)
                     connection.commit()
-                    
-                    # Guardar en memoria
-                    self.partidas_activas[partida_id] = {
-                        'jugadores': jugadores,
-                        'contrato_actual': 1,
-                        'turno_actual': 0,
-                        'estado': 'en_curso',
-                        'fecha_inicio': datetime.now()
-                    }
-                    
-            finally:
-                connection.close()
-                
         except Exception as e:
             print(f"Error inicializando partida {partida_id}: {str(e)}")
+            return {'exito': False, 'error': f'Error inicializando partida: {str(e)}'}
+        
+        self._partida_iniciada(estado)
+        return {'exito': True, 'partida_id': partida_id}
     
-    def _crear_mazo_completo(self, cursor) -> List[Dict]:
-        """Crea el mazo completo de 54 cartas"""
-        cursor.execute("SELECT * FROM cartas ORDER BY palo, valor")
-        cartas_db = cursor.fetchall()
+    def _repartir_partida(self, cursor, partida_id: int, reparto_id: Optional[int] = None) -> EstadoPartida:
+        """
+        Reparte el primer contrato con el cursor de quien llama, sin confirmar ni pedir
+        otra conexión al pool; los errores se propagan para que la transacción no se confirme
+        """
+        # Obtener jugadores
+        cursor.execute("""
+            SELECT id, usuario_id, posicion, es_bot, nombre_bot, dificultad_bot
+            FROM partida_jugadores 
+            WHERE partida_id = %s 
+            ORDER BY posicion
+        """, (partida_id,))
+        
+        jugadores = cursor.fetchall()
+        if not jugadores:
+            raise ValueError("La partida no tiene jugadores")
+        
+        # Barajar una permutación de códigos (o tomar el reparto de torneo)
+        if reparto_id is not None:
+            self._validar_reparto(reparto_id)
+            mazo = self.repartos.mazo(reparto_id, 1)
+        else:
+            mazo = mazo_barajado()
+        
+        # Repartir cartas para el primer contrato
+        cartas_por_jugador = Config.CARTAS_INICIALES_POR_CONTRATO[1]
+        cartas_repartidas = 0
+        manos = {}
+        
+        for jugador in jugadores:
+            cartas_jugador = mazo[cartas_repartidas:cartas_repartidas + cartas_por_jugador]
+            cartas_repartidas += cartas_por_jugador
+            manos[jugador['id']] = cartas_jugador
+            
+            cursor.execute("""
+                UPDATE partida_jugadores 
+                SET cartas_en_mano = %s 
+                WHERE id = %s
+            """, (empaquetar_cartas(cartas_jugador), jugador['id']))
+        
+        # Configurar mazo y descarte (la última carta abre el descarte, como en el simulador:
+        # un mismo reparto da las mismas cartas en mesas del servidor y de bots)
+        mazo_restante = mazo[cartas_repartidas:]
+        primera_descarte = mazo_restante.pop()
+        
+        # Crear estado inicial del juego
+        cursor.execute("""
+            INSERT INTO estado_juego (partida_id, mazo, descarte, ultima_carta_descartada, jugador_turno_id)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (
+            partida_id,
+            empaquetar_cartas(mazo_restante),
+            empaquetar_cartas([primera_descarte]),
+            empaquetar_cartas([primera_descarte]),
+            jugadores[0]['id']
+        ))
         
-        mazo = []
-        for carta in cartas_db:
-            mazo.append({
-                'id': carta['id'],
-                'nombre': carta['nombre'],
-                'palo': carta['palo'],
-                'valor': carta['valor'],
-                'es_comodin': carta['es_comodin'],
-                'imagen': carta['imagen']
-            })
+        # Actualizar estado de partida
+        cursor.execute("""
+            UPDATE partidas 
+            SET estado = 'en_curso', contrato_actual = 1, fecha_inicio = NOW(),
+                jugadores_actuales = %s
+            WHERE id = %s
+        """, (len(jugadores), partida_id))
         
-        return mazo
+        return EstadoPartida(partida_id, jugadores, mazo_restante, [primera_descarte], manos, jugadores[0]['id'],
+                             reparto_id=reparto_id)
+    
+    def _validar_reparto(self, reparto_id: int):
+        """Abre el lote de repartos si hace falta; ValueError si no hay lote o el número no existe"""
+        if self.repartos is None and Config.RUTA_REPARTOS:
+            self.repartos = LoteRepartos.abrir(Config.RUTA_REPARTOS)
+        if self.repartos is None:
+            raise ValueError("No hay lote de repartos cargado (RUTA_REPARTOS)")
+        if not isinstance(reparto_id, int) or not 0 <= reparto_id < self.repartos.cantidad:
+            raise ValueError(f"Reparto {reparto_id} fuera del lote (0-{self.repartos.cantidad - 1})")
+        if self.repartos.rondas < Config.MAX_CONTRATOS:
+            raise ValueError(f"El lote de repartos tiene {self.repartos.rondas} rondas y la partida "
+                             f"juega {Config.MAX_CONTRATOS}")
+    
+    def _partida_iniciada(self, estado: EstadoPartida):
+        """Tras confirmar el reparto (con la conexión ya devuelta): memoria y primer turno de bot"""
+        self.partidas_activas[estado.partida_id] = {
+            'jugadores': estado.jugadores,
+            'contrato_actual': 1,
+            'turno_actual': 0,
+            'estado': 'en_curso',
+            'fecha_inicio': datetime.now()
+        }
+        self._avisar_turno_bot(self.estados.registrar(estado))
     
     def procesar_turno_bot(self, partida_id: int, jugador_bot_id: int):
-        """Procesa el turno de un bot"""
-        try:
-            bot_key = f"{partida_id}_{self._obtener_posicion_jugador(partida_id, jugador_bot_id)}"
-            bot_ai = self.bots_activos.get(bot_key)
-            
+        """
+        Juega el turno completo de un bot: robo, bajada si puede y descarte
+        Solo si es su turno; el estado valida fase y contrato de cada acción
+        """
+        return self.procesar_turnos_bot([(partida_id, jugador_bot_id)])[0]
+    
+    def procesar_turnos_bot(self, turnos: List[Tuple[int, int]]) -> List[Dict]:
+        """
+        Juega los turnos de varios bots (partida_id, jugador_id) de partidas distintas
+        Los robos y los descartes de todos se deciden juntos con ProgramadorBots (NumPy);
+        las bajadas, una por una. Devuelve un resultado por turno, en el mismo orden
+        """
+        resultados: List[Optional[Dict]] = [None] * len(turnos)
+        acciones: List[List[Dict]] = [[] for _ in turnos]
+        bots: Dict[int, CariocaBotAI] = {}
+        
+        def jugar(i: int, decision: Dict) -> bool:
+            resultado = self._ejecutar_accion_bot(*turnos[i], decision)
+            if 'error' in resultado:
+                resultados[i] = resultado
+                return False
+            acciones[i].append(resultado)
+            return True
+        
+        def contexto(i: int) -> Dict:
+            try:
+                return self.contexto_turno(*turnos[i])
+            except Exception as e:
+                resultados[i] = {"error": f"Error procesando turno bot: {str(e)}"}
+                return {}
+        
+        contextos: Dict[int, Dict] = {}
+        for i, (partida_id, jugador_bot_id) in enumerate(turnos):
+            try:
+                bot_ai = self.obtener_bot(partida_id, jugador_bot_id)
+            except Exception as e:
+                resultados[i] = {"error": f"Error procesando turno bot: {str(e)}"}
+                continue
             if not bot_ai:
-                return {"error": "Bot no encontrado"}
-            
-            # Obtener estado actual
-            estado_juego = self._obtener_estado_juego(partida_id)
-            cartas_mano = self._obtener_cartas_jugador(partida_id, jugador_bot_id)
-            contrato_actual = estado_juego['contrato_actual']
-            
-            # Bot decide acción
-            decision = bot_ai.decidir_accion(estado_juego, cartas_mano, contrato_actual)
-            
-            # Ejecutar acción
-            return self._ejecutar_accion_bot(partida_id, jugador_bot_id, decision)
-            
-        except Exception as e:
-            return {"error": f"Error procesando turno bot: {str(e)}"}
+                resultados[i] = {"error": "Bot no encontrado"}
+                continue
+            # Una sola lectura del contexto del turno
+            actual = contexto(i)
+            if resultados[i] is not None:
+                continue
+            if not actual:
+                resultados[i] = {"error": "Partida no encontrada"}
+            elif not actual['es_su_turno']:
+                resultados[i] = {"error": "No es el turno del bot"}
+            else:
+                bots[i] = bot_ai
+                contextos[i] = actual
+        
+        # Robos del lote
+        programador = ProgramadorBots()
+        for i, actual in contextos.items():
+            if actual['fase_turno'] == 'robar':
+                programador.encolar(i, bots[i], 'robo', actual['mano'], actual['contrato_actual'], actual)
+        for i, decision in programador.tick():
+            if jugar(i, decision):
+                contextos[i] = contexto(i)
+        
+        # Bajadas (una bajada que no cumple el contrato se salta y el bot solo descarta)
+        for i, actual in contextos.items():
+            if resultados[i] is not None or actual.get('fase_turno') != 'bajar':
+                continue
+            bajada = bots[i].decidir_bajada(actual['mano'], actual['contrato_actual'])
+            if bajada and bajada.get('combinaciones'):
+                resultado = self._ejecutar_accion_bot(*turnos[i], bajada)
+                if 'error' not in resultado:
+                    acciones[i].append(resultado)
+                    contextos[i] = contexto(i)
+        
+        # Cartas que los bots ya bajados pueden agregar a la mesa (pueden quedarse sin mano)
+        for i, actual in contextos.items():
+            if resultados[i] is not None or actual.get('fase_turno') not in ('bajar', 'descartar'):
+                continue
+            resultado = self._bot_agregar_a_mesa(*turnos[i])
+            if resultado.get('cartas'):
+                acciones[i].append(resultado)
+                contextos[i] = contexto(i)
+        
+        # Descartes del lote
+        for i, actual in contextos.items():
+            if resultados[i] is None and actual.get('fase_turno') in ('bajar', 'descartar') and actual['mano']:
+                programador.encolar(i, bots[i], 'descarte', actual['mano'], actual['contrato_actual'], actual)
+        for i, decision in programador.tick():
+            jugar(i, decision)
+        
+        for i in contextos:
+            if resultados[i] is not None:
+                continue
+            actual = contexto(i)
+            if resultados[i] is None:  # contexto() deja el error si falla
+                resultados[i] = {
+                    "exito": True, "acciones": acciones[i],
+                    "jugador_turno_id": actual.get('jugador_turno_id'),
+                    "fase_turno": actual.get('fase_turno')
+                }
+        return resultados
     
-    def _obtener_estado_juego(self, partida_id: int) -> Dict:
-        """Obtiene el estado actual del juego"""
-        try:
-            connection = self.get_db_connection()
+    def obtener_bot(self, partida_id: int, jugador_bot_id: int) -> Optional[CariocaBotAI]:
+        """IA de un bot de la partida (la posición se consulta solo si no está en memoria)"""
+        bot_key = self.claves_bot.get((partida_id, jugador_bot_id))
+        if bot_key is None:
+            bot_key = f"{partida_id}_{self._obtener_posicion_jugador(partida_id, jugador_bot_id)}"
+        bot_ai = self.bots_activos.get(bot_key)
+        if bot_ai is None:
+            # Partidas creadas desde las salas: la IA se crea con la dificultad guardada
+            estado = self.estado_partida(partida_id)
+            jugador = next((j for j in estado.jugadores if j['id'] == jugador_bot_id), None) if estado else None
+            if jugador and jugador.get('es_bot'):
+                bot_ai = self.bots_activos.setdefault(bot_key, CariocaBotAI(jugador.get('dificultad_bot') or 'medio'))
+                self.claves_bot[(partida_id, jugador_bot_id)] = bot_key
+        return bot_ai
+    
+    def estado_partida(self, partida_id: int) -> Optional[EstadoPartida]:
+        """Estado vivo de la partida; si no está en memoria se carga una vez de la base de datos"""
+        estado = self.estados.obtener(partida_id)
+        if estado is None:
+            estado = self._cargar_estado_partida(partida_id)
+            if estado is not None:
+                estado = self.estados.registrar(estado)
+                # Recién cargada (p. ej. tras reiniciar): retomar el turno del bot si le tocaba
+                self._avisar_turno_bot(estado)
+        return estado
+    
+    def avisar_turno_bot(self, partida_id: int):
+        """Programa el turno si le toca a un bot (p. ej. tras iniciar la partida desde una sala)"""
+        estado = self.estados.obtener(partida_id)
+        if estado is None:
+            # estado_partida avisa al cargarla
+            self.estado_partida(partida_id)
+        else:
+            self._avisar_turno_bot(estado)
+    
+    def _avisar_turno_bot(self, estado: EstadoPartida):
+        """Llama a al_turno_bot si el turno es de un bot que todavía no roba"""
+        if self.al_turno_bot is None:
+            return
+        with estado.lock:
+            jugador_id = estado.jugador_turno_id
+            es_bot = estado.fase_turno == 'robar' and any(
+                j['id'] == jugador_id and j.get('es_bot') for j in estado.jugadores)
+        if es_bot:
             try:
+                self.al_turno_bot(estado.partida_id, jugador_id)
+            except Exception as e:
+                print(f"Error programando turno bot de la partida {estado.partida_id}: {str(e)}")
+    
+    def _cargar_estado_partida(self, partida_id: int) -> Optional[EstadoPartida]:
+        """Reconstruye el estado vivo desde estado_juego y partida_jugadores (p. ej. tras reiniciar)"""
+        try:
+            with pool_conexiones.conexion() as connection:
                 with connection.cursor() as cursor:
+                    # Una fila por jugador con los datos de la partida repetidos: un solo viaje
                     cursor.execute("""
-                        SELECT p.contrato_actual, p.ronda_actual, eg.descarte, eg.ultima_carta_descartada
+                        SELECT p.contrato_actual, p.ronda_actual, p.configuracion, eg.mazo, eg.descarte,
+                               eg.jugador_turno_id, eg.fase_turno,
+                               pj.id, pj.usuario_id, pj.posicion, pj.es_bot, pj.nombre_bot,
+                               pj.dificultad_bot, pj.cartas_en_mano, pj.combinaciones_bajadas,
+                               pj.puntos_totales
                         FROM partidas p
                         JOIN estado_juego eg ON p.id = eg.partida_id
-                        WHERE p.id = %s
+                        JOIN partida_jugadores pj ON p.id = pj.partida_id
+                        WHERE p.id = %s AND p.estado = 'en_curso'
+                        ORDER BY pj.posicion
                     """, (partida_id,))
+                    jugadores = cursor.fetchall()
+                    if not jugadores:
+                        return None
+                    partida = jugadores[0]
                     
-                    resultado = cursor.fetchone()
-                    if resultado:
-                        return {
-                            'contrato_actual': resultado['contrato_actual'],
-                            'ronda_actual': resultado['ronda_actual'],
-                            'descarte': json.loads(resultado['descarte']) if resultado['descarte'] else [],
-                            'ultima_carta_descartada': json.loads(resultado['ultima_carta_descartada']) if resultado['ultima_carta_descartada'] else None
-                        }
-                    
-                    return {}
-                    
-            finally:
-                connection.close()
-                
         except Exception as e:
-            print(f"Error obteniendo estado: {str(e)}")
-            return {}
+            print(f"Error cargando estado de la partida {partida_id}: {str(e)}")
+            return None
+        
+        return EstadoPartida(
+            partida_id,
+            [{k: j[k] for k in ('id', 'usuario_id', 'posicion', 'es_bot', 'nombre_bot', 'dificultad_bot')}
+             for j in jugadores],
+            desempaquetar_cartas(partida['mazo']),
+            desempaquetar_cartas(partida['descarte']),
+            {j['id']: desempaquetar_cartas(j['cartas_en_mano']) for j in jugadores},
+            partida['jugador_turno_id'],
+            contrato_actual=partida['contrato_actual'],
+            ronda_actual=partida['ronda_actual'],
+            fase_turno=partida['fase_turno'] or 'robar',
+            bajadas={j['id']: json.loads(j['combinaciones_bajadas']) if j['combinaciones_bajadas'] else []
+                     for j in jugadores},
+            puntos_totales={j['id']: j['puntos_totales'] or 0 for j in jugadores},
+            reparto_id=json.loads(partida['configuracion'] or '{}').get('reparto_id')
+        )
     
-    def _obtener_cartas_jugador(self, partida_id: int, jugador_id: int) -> List[Dict]:
-        """Obtiene las cartas en mano de un jugador"""
-        try:
-            connection = self.get_db_connection()
-            try:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT cartas_en_mano 
-                        FROM partida_jugadores 
-                        WHERE partida_id = %s AND id = %s
-                    """, (partida_id, jugador_id))
-                    
-                    resultado = cursor.fetchone()
-                    if resultado and resultado['cartas_en_mano']:
-                        return json.loads(resultado['cartas_en_mano'])
-                    
-                    return []
-                    
-            finally:
-                connection.close()
-                
-        except Exception as e:
-            print(f"Error obteniendo cartas: {str(e)}")
-            return []
+    def contexto_turno(self, partida_id: int, jugador_id: Optional[int] = None,
+                       usuario_id: Optional[int] = None) -> Dict:
+        """
+        Contexto del turno de un jugador de la partida (por su id en partida_jugadores o por
+        usuario_id): se lee de memoria y se reutiliza mientras el estado no cambie
+        """
+        estado = self.estado_partida(partida_id)
+        if estado is None:
+            return {}
+        with estado.lock:
+            if jugador_id is None:
+                jugador_id = estado.jugador_de_usuario(usuario_id)
+            if jugador_id is None or estado.posicion(jugador_id) is None:
+                return {}
+            return estado.contexto_turno(jugador_id)
     
     def _ejecutar_accion_bot(self, partida_id: int, jugador_id: int, decision: Dict) -> Dict:
         """Ejecuta la acción decidida por el bot"""
@@ -285,23 +446,154 @@ class CariocaGameManager:
     
     def _bot_robar_mazo(self, partida_id: int, jugador_id: int) -> Dict:
         """Bot roba carta del mazo"""
-        # Implementar lógica de robar del mazo
+        estado = self.estado_partida(partida_id)
+        if estado is None:
+            return {"error": "Partida no encontrada"}
+        try:
+            with estado.lock:
+                estado.robar_mazo(jugador_id)
+        except AccionInvalida as e:
+            return {"error": str(e)}
         return {"exito": True, "accion": "robar_mazo"}
     
     def _bot_robar_descarte(self, partida_id: int, jugador_id: int) -> Dict:
         """Bot roba carta del descarte"""
-        # Implementar lógica de robar del descarte
-        return {"exito": True, "accion": "robar_descarte"}
+        estado = self.estado_partida(partida_id)
+        if estado is None:
+            return {"error": "Partida no encontrada"}
+        try:
+            with estado.lock:
+                carta = estado.robar_descarte(jugador_id)
+        except AccionInvalida as e:
+            return {"error": str(e)}
+        return {"exito": True, "accion": "robar_descarte", "carta": carta}
     
     def _bot_bajar_combinacion(self, partida_id: int, jugador_id: int, combinaciones: List[Dict]) -> Dict:
         """Bot baja combinaciones"""
-        # Implementar lógica de bajar combinaciones
-        return {"exito": True, "accion": "bajar_combinacion", "combinaciones": combinaciones}
+        estado = self.estado_partida(partida_id)
+        if estado is None:
+            return {"error": "Partida no encontrada"}
+        try:
+            with estado.lock:
+                estado.bajar(jugador_id, combinaciones)
+                resultado = {"exito": True, "accion": "bajar_combinacion", "combinaciones": combinaciones}
+                if not estado.manos.get(jugador_id):
+                    resultado['puntos_ronda'] = estado.cerrar_ronda()
+        except AccionInvalida as e:
+            return {"error": str(e)}
+        if 'puntos_ronda' in resultado:
+            fin = self._ronda_terminada(estado)
+            if fin:
+                resultado['fin_partida'] = fin
+        return resultado
+    
+    def _bot_agregar_a_mesa(self, partida_id: int, jugador_id: int) -> Dict:
+        """Bot agrega a la mesa todas las cartas que puede (jokers al final)"""
+        estado = self.estado_partida(partida_id)
+        if estado is None:
+            return {"error": "Partida no encontrada"}
+        cartas = []
+        resultado = {"exito": True, "accion": "agregar_a_mesa", "cartas": cartas}
+        try:
+            with estado.lock:
+                if not estado.bajadas.get(jugador_id):
+                    return resultado
+                # Las combinaciones del estado crecen en su lugar con cada agregar
+                mesa = [(jugador['id'], k, combinacion) for jugador in estado.jugadores
+                        for k, combinacion in enumerate(estado.mesa_de(jugador['id']))]
+                combinaciones = [m[2] for m in mesa]
+                while estado.manos.get(jugador_id):
+                    mano = estado.mano(jugador_id)
+                    agregables = self.game_logic.cartas_agregables(mano, combinaciones)
+                    if not agregables:
+                        break
+                    i, j = min(agregables, key=lambda par: mano[par[0]]['es_comodin'])
+                    estado.agregar(jugador_id, mano[i], mesa[j][0], mesa[j][1])
+                    cartas.append(mano[i])
+                if cartas and not estado.manos.get(jugador_id):
+                    resultado['puntos_ronda'] = estado.cerrar_ronda()
+        except AccionInvalida as e:
+            return {"error": str(e)}
+        if 'puntos_ronda' in resultado:
+            fin = self._ronda_terminada(estado)
+            if fin:
+                resultado['fin_partida'] = fin
+        return resultado
     
     def _bot_descartar(self, partida_id: int, jugador_id: int, carta: Dict) -> Dict:
         """Bot descarta una carta"""
-        # Implementar lógica de descarte
-        return {"exito": True, "accion": "descartar", "carta": carta}
+        estado = self.estado_partida(partida_id)
+        if estado is None:
+            return {"error": "Partida no encontrada"}
+        try:
+            with estado.lock:
+                estado.descartar(jugador_id, carta)
+                resultado = {"exito": True, "accion": "descartar", "carta": carta}
+                if not estado.manos.get(jugador_id):
+                    resultado['puntos_ronda'] = estado.cerrar_ronda()
+        except AccionInvalida as e:
+            return {"error": str(e)}
+        if 'puntos_ronda' in resultado:
+            fin = self._ronda_terminada(estado)
+            if fin:
+                resultado['fin_partida'] = fin
+        else:
+            self._avisar_turno_bot(estado)
+        return resultado
+    
+    def _ronda_terminada(self, estado: EstadoPartida) -> Optional[Dict]:
+        """
+        Tras cerrar una ronda (fuera del lock de la partida): reparte el siguiente contrato
+        o, si era el último, termina la partida y devuelve su resultado
+        """
+        with estado.lock:
+            if estado.contrato_actual >= Config.MAX_CONTRATOS:
+                estado.finalizar()
+                terminada = True
+            else:
+                terminada = False
+                estado.repartir_ronda(self._mazo_ronda(estado, estado.ronda_actual + 1),
+                                      Config.CARTAS_INICIALES_POR_CONTRATO[estado.contrato_actual + 1])
+        if terminada:
+            return self._terminar_partida(estado)
+        # Fin de ronda: se escribe ya
+        self.estados.guardar_ahora(estado.partida_id)
+        self._avisar_turno_bot(estado)
+        return None
+    
+    def _mazo_ronda(self, estado: EstadoPartida, ronda: int) -> List[int]:
+        """Orden del mazo para repartir una ronda: del reparto de la partida o barajado"""
+        if estado.reparto_id is not None:
+            self._validar_reparto(estado.reparto_id)
+            return self.repartos.mazo(estado.reparto_id, ronda)
+        return mazo_barajado()
+    
+    def _terminar_partida(self, estado: EstadoPartida) -> Dict:
+        """Escribe el resultado, saca la partida de memoria y avisa (al_terminar_partida)"""
+        partida_id = estado.partida_id
+        with estado.lock:
+            ganador_id = estado.ganador()
+            resultado = {
+                'ganador_id': ganador_id,
+                'puntos_totales': {j['id']: estado.puntos_totales.get(j['id'], 0) for j in estado.jugadores},
+                'jugadores': [dict(j) for j in estado.jugadores]
+            }
+        
+        self.estados.olvidar(partida_id)
+        self.partidas_activas.pop(partida_id, None)
+        for clave in [c for c in self.claves_bot if c[0] == partida_id]:
+            self.bots_activos.pop(self.claves_bot.pop(clave), None)
+        
+        avisos = [(self.al_terminar_partida, (partida_id, resultado)),
+                  (self.al_terminar_por_partida.pop(partida_id, None), (resultado,))]
+        for avisar, argumentos in avisos:
+            if avisar is None:
+                continue
+            try:
+                avisar(*argumentos)
+            except Exception as e:
+                print(f"Error cerrando la partida {partida_id}: {str(e)}")
+        return resultado
     
     def _generar_codigo_sala(self) -> str:
         """Genera código único para la sala"""
@@ -310,23 +602,11 @@ class CariocaGameManager:
     
     def _obtener_posicion_jugador(self, partida_id: int, jugador_id: int) -> int:
         """Obtiene la posición de un jugador en la partida"""
-        try:
-            connection = self.get_db_connection()
-            try:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT posicion FROM partida_jugadores 
-                        WHERE partida_id = %s AND id = %s
-                    """, (partida_id, jugador_id))
-                    
-                    resultado = cursor.fetchone()
-                    return resultado['posicion'] if resultado else 1
-                    
-            finally:
-                connection.close()
-                
-        except Exception as e:
+        estado = self.estado_partida(partida_id)
+        if estado is None:
             return 1
+        posicion = estado.posicion(jugador_id)
+        return posicion if posicion is not None else 1
 
 # Instancia global del gestor
 game_manager = CariocaGameManager()
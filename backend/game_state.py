@@ -0,0 +1,493 @@
+"""
+Estado vivo de las partidas con persistencia diferida
+Mientras una partida está en memoria su estado (mazo, descarte, manos, bajadas, turno)
+es la fuente de verdad: las lecturas no tocan la base de datos y cada cambio solo marca
+qué filas quedaron sucias. Un hilo escribe esas filas por lotes en estado_juego,
+partida_jugadores y partidas; el fin de ronda se escribe de inmediato
+"""
+import json
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from batch_scoring import puntos_manos
+from card_codec import (codificar_carta, decodificar_carta, decodificar_mano, descarte_rebarajado,
+                        empaquetar_cartas)
+from game_logic import CariocaGameLogic
+from table_melds import CombinacionMesa
+
+# Segundos entre escrituras por lotes
+INTERVALO_ESCRITURA = 0.5
+
+_game_logic = CariocaGameLogic()
+
+
+class AccionInvalida(ValueError):
+    """Acción fuera de turno, en otra fase o con cartas o combinaciones inválidas"""
+
+
+class EstadoPartida:
+    """
+    Estado de una partida en curso; los métodos que lo modifican se llaman con 'lock' tomado
+    y lanzan AccionInvalida si no es el turno del jugador, la fase no corresponde o las
+    cartas no son válidas (el estado queda intacto)
+    jugadores: filas de partida_jugadores (id, usuario_id, posicion, es_bot, ...) en orden de turno
+    mazo, descarte y manos guardan códigos de carta (card_codec); los diccionarios se arman
+    solo en las vistas que salen hacia los jugadores y se persisten con empaquetar_cartas
+    """
+
+    def __init__(self, partida_id: int, jugadores: List[Dict], mazo: List[int], descarte: List[int],
+                 manos: Dict[int, List[int]], jugador_turno_id: int, contrato_actual: int = 1,
+                 ronda_actual: int = 1, fase_turno: str = 'robar',
+                 bajadas: Optional[Dict[int, List[Dict]]] = None,
+                 puntos_totales: Optional[Dict[int, int]] = None,
+                 reparto_id: Optional[int] = None,
+                 al_cambiar: Optional[Callable[[int], None]] = None):
+        self.partida_id = partida_id
+        self.jugadores = list(jugadores)
+        self.mazo = mazo
+        self.descarte = descarte
+        self.manos = manos
+        # Combinaciones bajadas por jugador: se mantienen como CombinacionMesa (crecen con
+        # agregar) y pasan a diccionario solo para persistir y para las vistas
+        self.bajadas: Dict[int, List[CombinacionMesa]] = {j['id']: [] for j in self.jugadores}
+        for jugador_id, combinaciones in (bajadas or {}).items():
+            self.bajadas[jugador_id] = [CombinacionMesa.desde_dict(c) for c in combinaciones]
+        self.puntos_totales = puntos_totales if puntos_totales is not None else {j['id']: 0 for j in self.jugadores}
+        self.puntos_ronda = {j['id']: 0 for j in self.jugadores}
+        self.jugador_turno_id = jugador_turno_id
+        self.contrato_actual = contrato_actual
+        self.ronda_actual = ronda_actual
+        self.fase_turno = fase_turno
+        # Número de reparto del lote de torneo (todas las rondas salen de él); None = barajar
+        self.reparto_id = reparto_id
+
+        # Cada cambio sube la versión (las cachés de contexto de turno se invalidan con ella)
+        self.version = 0
+        self.lock = threading.RLock()
+        # Serializa las escrituras de la partida: de tomar_cambios hasta el commit
+        # Orden de locks: escritura -> lock -> almacén (nunca pedir escritura con lock tomado)
+        self.escritura = threading.Lock()
+        self._contextos: Dict[int, Dict] = {}
+        self._al_cambiar = al_cambiar
+        self._estado_sucio = False
+        self._partida_sucia = False
+        self._jugadores_sucios: Set[int] = set()
+
+    # Lecturas
+
+    def posicion(self, jugador_id: int) -> Optional[int]:
+        for jugador in self.jugadores:
+            if jugador['id'] == jugador_id:
+                return jugador['posicion']
+        return None
+
+    def jugador_de_usuario(self, usuario_id: int) -> Optional[int]:
+        for jugador in self.jugadores:
+            if jugador.get('usuario_id') == usuario_id:
+                return jugador['id']
+        return None
+
+    def mano(self, jugador_id: int) -> List[Dict]:
+        return decodificar_mano(self.manos.get(jugador_id, []))
+
+    def vista(self, jugador_id: Optional[int] = None) -> Dict:
+        """
+        Estado visible para decidir un turno (mismo formato que lee el gestor)
+        Con jugador_id incluye el tamaño de las manos rivales en orden de turno
+        """
+        vista = {
+            'partida_id': self.partida_id,
+            'contrato_actual': self.contrato_actual,
+            'ronda_actual': self.ronda_actual,
+            'descarte': decodificar_mano(self.descarte),
+            'ultima_carta_descartada': decodificar_carta(self.descarte[-1]) if self.descarte else None,
+            'mesa': [c.a_dict() for j in self.jugadores for c in self.bajadas.get(j['id'], [])],
+            'jugador_turno_id': self.jugador_turno_id,
+            'fase_turno': self.fase_turno
+        }
+        if jugador_id is not None and self.posicion(jugador_id) is not None:
+            ids = [j['id'] for j in self.jugadores]
+            inicio = ids.index(jugador_id)
+            rivales = ids[inicio + 1:] + ids[:inicio]
+            vista['cartas_oponentes'] = [len(self.manos.get(j_id, [])) for j_id in rivales]
+        return vista
+
+    def contexto_turno(self, jugador_id: int) -> Dict:
+        """
+        Todo lo que necesita el turno de un jugador (bot o humano): partida, contrato,
+        dueño del turno, tope del descarte, su mano y el tamaño de todas las manos
+        Se arma una vez por versión del estado; no modificar el diccionario devuelto
+        """
+        contexto = self._contextos.get(jugador_id)
+        if contexto is not None and contexto['version'] == self.version:
+            return contexto
+
+        contexto = self.vista(jugador_id)
+        contexto.update({
+            'version': self.version,
+            'jugador_id': jugador_id,
+            'posicion': self.posicion(jugador_id),
+            'es_su_turno': self.jugador_turno_id == jugador_id,
+            'mano': self.mano(jugador_id),
+            'cartas_por_jugador': {j['id']: len(self.manos.get(j['id'], [])) for j in self.jugadores}
+        })
+        self._contextos[jugador_id] = contexto
+        return contexto
+
+    # Cambios
+
+    def marcar(self, estado: bool = False, jugadores: Iterable[int] = (), partida: bool = False):
+        self.version += 1
+        self._estado_sucio |= estado
+        self._partida_sucia |= partida
+        self._jugadores_sucios.update(jugadores)
+        if self._al_cambiar:
+            self._al_cambiar(self.partida_id)
+
+    def _exigir_turno(self, jugador_id: int, *fases: str):
+        if self.jugador_turno_id != jugador_id:
+            raise AccionInvalida("No es el turno del jugador")
+        if self.fase_turno not in fases:
+            raise AccionInvalida(f"Acción no permitida en la fase '{self.fase_turno}'")
+
+    def robar_mazo(self, jugador_id: int) -> Dict:
+        self._exigir_turno(jugador_id, 'robar')
+        if not self.mazo and len(self.descarte) > 1:
+            # Mazo agotado: se rebaraja el descarte, menos la carta de arriba
+            self.mazo = descarte_rebarajado(self.descarte, self.reparto_id, self.ronda_actual)
+            del self.descarte[:-1]
+        if not self.mazo:
+            raise AccionInvalida("El mazo está vacío")
+        # Se roba del final del mazo, igual que en el simulador
+        codigo = self.mazo.pop()
+        self.manos.setdefault(jugador_id, []).append(codigo)
+        self.fase_turno = 'bajar'
+        self.marcar(estado=True, jugadores=[jugador_id])
+        return decodificar_carta(codigo)
+
+    def robar_descarte(self, jugador_id: int) -> Dict:
+        self._exigir_turno(jugador_id, 'robar')
+        if not self.descarte:
+            raise AccionInvalida("El descarte está vacío")
+        codigo = self.descarte.pop()
+        self.manos.setdefault(jugador_id, []).append(codigo)
+        self.fase_turno = 'bajar'
+        self.marcar(estado=True, jugadores=[jugador_id])
+        return decodificar_carta(codigo)
+
+    def _quitar_de_mano(self, jugador_id: int, codigos: Iterable[int]) -> bool:
+        restante = list(self.manos.get(jugador_id, []))
+        for codigo in codigos:
+            if codigo not in restante:
+                return False
+            restante.remove(codigo)
+        self.manos[jugador_id] = restante
+        return True
+
+    def bajar(self, jugador_id: int, combinaciones: List[Dict]):
+        """Baja el contrato de la ronda (una vez por ronda, después de robar)"""
+        self._exigir_turno(jugador_id, 'bajar')
+        if self.bajadas.get(jugador_id):
+            raise AccionInvalida("El jugador ya bajó su contrato en esta ronda")
+        valido, mensaje, _ = _game_logic.validar_contrato(self.contrato_actual, combinaciones)
+        if not valido:
+            raise AccionInvalida(mensaje)
+        try:
+            codigos = [codificar_carta(carta) for combinacion in combinaciones
+                       for carta in combinacion.get('cartas', [])]
+        except ValueError as e:
+            raise AccionInvalida(str(e))
+        if not self._quitar_de_mano(jugador_id, codigos):
+            raise AccionInvalida("Las combinaciones no están en la mano del jugador")
+        self.bajadas.setdefault(jugador_id, []).extend(
+            CombinacionMesa(c.get('cartas', []), c.get('tipo')) for c in combinaciones)
+        self.fase_turno = 'descartar'
+        self.marcar(jugadores=[jugador_id])
+
+    def mesa_de(self, jugador_id: int) -> List[CombinacionMesa]:
+        """Combinaciones bajadas de un jugador (las del estado: no modificarlas fuera de agregar)"""
+        return self.bajadas.get(jugador_id, [])
+
+    def agregar(self, jugador_id: int, carta: Dict, dueno_id: int, indice: int):
+        """Agrega una carta de la mano a una combinación bajada (solo quien ya bajó)"""
+        self._exigir_turno(jugador_id, 'bajar', 'descartar')
+        if not self.bajadas.get(jugador_id):
+            raise AccionInvalida("Hay que bajar el contrato antes de agregar cartas")
+        combinaciones = self.bajadas.get(dueno_id) or []
+        if not 0 <= indice < len(combinaciones):
+            raise AccionInvalida("Combinación no encontrada")
+        try:
+            codigo = codificar_carta(carta or {})
+        except ValueError as e:
+            raise AccionInvalida(str(e))
+        combinacion = combinaciones[indice]
+        if not combinacion.acepta(codigo):
+            raise AccionInvalida("La carta no se puede agregar a esa combinación")
+        if not self._quitar_de_mano(jugador_id, [codigo]):
+            raise AccionInvalida("La carta no está en la mano del jugador")
+        combinacion.agregar(decodificar_carta(codigo))
+        self.fase_turno = 'descartar'
+        self.marcar(jugadores=[jugador_id, dueno_id])
+
+    def descartar(self, jugador_id: int, carta: Dict):
+        self._exigir_turno(jugador_id, 'bajar', 'descartar')
+        try:
+            codigo = codificar_carta(carta or {})
+        except ValueError as e:
+            raise AccionInvalida(str(e))
+        if not self._quitar_de_mano(jugador_id, [codigo]):
+            raise AccionInvalida("La carta no está en la mano del jugador")
+        self.descarte.append(codigo)
+        if self.manos.get(jugador_id):
+            self.jugador_turno_id = self._siguiente(jugador_id)
+        self.fase_turno = 'robar'
+        self.marcar(estado=True, jugadores=[jugador_id])
+
+    def _siguiente(self, jugador_id: int) -> int:
+        ids = [j['id'] for j in self.jugadores]
+        return ids[(ids.index(jugador_id) + 1) % len(ids)]
+
+    def cerrar_ronda(self) -> Dict[int, int]:
+        """Suma a cada jugador los puntos de las cartas que le quedaron en la mano"""
+        puntos_por_mano = puntos_manos(list(self.manos.values())).tolist()
+        for jugador_id, puntos in zip(self.manos, puntos_por_mano):
+            self.puntos_ronda[jugador_id] = puntos
+            self.puntos_totales[jugador_id] = self.puntos_totales.get(jugador_id, 0) + puntos
+        self.fase_turno = 'fin_ronda'
+        self.marcar(estado=True, jugadores=list(self.manos), partida=True)
+        return dict(self.puntos_ronda)
+
+    def repartir_ronda(self, mazo: List[int], cartas_por_jugador: int):
+        """
+        Pasa al siguiente contrato: reparte 'mazo' (códigos en orden), abre el descarte con
+        la última carta (como el simulador) y empieza el siguiente jugador en la rotación
+        """
+        if self.fase_turno != 'fin_ronda':
+            raise AccionInvalida("La ronda no terminó")
+        ids = [j['id'] for j in self.jugadores]
+        mazo = list(mazo)
+        self.manos = {jugador_id: mazo[i * cartas_por_jugador:(i + 1) * cartas_por_jugador]
+                      for i, jugador_id in enumerate(ids)}
+        del mazo[:len(ids) * cartas_por_jugador]
+        self.descarte = [mazo.pop()]
+        self.mazo = mazo
+        self.bajadas = {jugador_id: [] for jugador_id in ids}
+        self.contrato_actual += 1
+        self.ronda_actual += 1
+        self.jugador_turno_id = ids[(self.ronda_actual - 1) % len(ids)]
+        self.fase_turno = 'robar'
+        self.marcar(estado=True, jugadores=ids, partida=True)
+
+    def finalizar(self) -> int:
+        """Cierra la partida tras la última ronda; devuelve el jugador con menos puntos"""
+        if self.fase_turno != 'fin_ronda':
+            raise AccionInvalida("La ronda no terminó")
+        self.fase_turno = 'fin_partida'
+        self.marcar(estado=True, partida=True)
+        return self.ganador()
+
+    def ganador(self) -> int:
+        ids = [j['id'] for j in self.jugadores]
+        return min(ids, key=lambda jugador_id: self.puntos_totales.get(jugador_id, 0))
+
+    # Persistencia
+
+    def tomar_cambios(self) -> Optional[Dict]:
+        """Filas sucias ya serializadas; limpia las marcas (devolver_cambios las repone)"""
+        if not (self._estado_sucio or self._partida_sucia or self._jugadores_sucios):
+            return None
+        cambios = {'version': self.version, 'estado': None, 'partida': None, 'jugadores': []}
+        if self._estado_sucio:
+            cambios['estado'] = (
+                empaquetar_cartas(self.mazo), empaquetar_cartas(self.descarte),
+                empaquetar_cartas(self.descarte[-1:]) if self.descarte else None,
+                self.jugador_turno_id,
+                self.fase_turno if self.fase_turno in ('robar', 'bajar', 'descartar') else 'robar',
+                self.partida_id
+            )
+        if self._partida_sucia:
+            if self.fase_turno == 'fin_partida':
+                ganador = next(j for j in self.jugadores if j['id'] == self.ganador())
+                cambios['partida'] = (self.contrato_actual, self.ronda_actual, 'finalizada',
+                                      ganador.get('usuario_id'), datetime.now(), self.partida_id)
+            else:
+                cambios['partida'] = (self.contrato_actual, self.ronda_actual, 'en_curso',
+                                      None, None, self.partida_id)
+        for jugador_id in sorted(self._jugadores_sucios):
+            cambios['jugadores'].append((
+                empaquetar_cartas(self.manos.get(jugador_id, [])),
+                bool(self.bajadas.get(jugador_id)),
+                json.dumps([c.a_dict() for c in self.bajadas.get(jugador_id, [])]),
+                self.puntos_ronda.get(jugador_id, 0),
+                self.puntos_totales.get(jugador_id, 0),
+                jugador_id
+            ))
+        self._estado_sucio = False
+        self._partida_sucia = False
+        self._jugadores_sucios = set()
+        return cambios
+
+    def devolver_cambios(self, cambios: Dict):
+        """Vuelve a marcar lo que no se pudo escribir (se reescribe con el estado más nuevo)"""
+        self._estado_sucio |= cambios['estado'] is not None
+        self._partida_sucia |= cambios['partida'] is not None
+        self._jugadores_sucios.update(fila[-1] for fila in cambios['jugadores'])
+
+
+class AlmacenPartidas:
+    """
+    Partidas vivas por id y escritura diferida de sus cambios
+    conexion: context manager que presta una conexión (db_pool.pool_conexiones.conexion)
+    """
+
+    def __init__(self, conexion: Callable, intervalo: float = INTERVALO_ESCRITURA):
+        self.conexion = conexion
+        self.intervalo = intervalo
+        self._partidas: Dict[int, EstadoPartida] = {}
+        self._sucias: Set[int] = set()
+        self._condicion = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self._activo = True
+
+        self.escrituras = 0
+        self.lotes = 0
+        self.errores = 0
+        self.ultimo_lote_ms = 0.0
+
+    def registrar(self, estado: EstadoPartida) -> EstadoPartida:
+        estado._al_cambiar = self._marcar_sucia
+        with self._condicion:
+            self._partidas[estado.partida_id] = estado
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escritor, name='escritura-partidas', daemon=True)
+                self._hilo.start()
+        return estado
+
+    def obtener(self, partida_id: int) -> Optional[EstadoPartida]:
+        return self._partidas.get(partida_id)
+
+    def olvidar(self, partida_id: int):
+        """Escribe lo pendiente y saca la partida de memoria"""
+        self.guardar_ahora(partida_id)
+        with self._condicion:
+            self._partidas.pop(partida_id, None)
+
+    def _marcar_sucia(self, partida_id: int):
+        with self._condicion:
+            self._sucias.add(partida_id)
+
+    def guardar_ahora(self, partida_id: Optional[int] = None) -> bool:
+        """
+        Escribe ya una partida (fin de ronda) o todas las sucias
+        No llamar con el lock de una partida tomado (espera a su escritura en curso)
+        """
+        with self._condicion:
+            if partida_id is None:
+                ids = list(self._sucias)
+                self._sucias.clear()
+            else:
+                ids = [partida_id]
+                self._sucias.discard(partida_id)
+        return self._escribir(ids)
+
+    def _escritor(self):
+        while True:
+            with self._condicion:
+                if not self._activo:
+                    return
+                self._condicion.wait(self.intervalo)
+                ids = list(self._sucias)
+                self._sucias.clear()
+            if ids:
+                self._escribir(ids)
+
+    def _escribir(self, ids: List[int]) -> bool:
+        estados = [self._partidas.get(partida_id) for partida_id in sorted(set(ids))]
+        with ExitStack() as escrituras:
+            # Mientras se escribe una partida nadie más toma sus cambios: una foto vieja no
+            # puede confirmarse después de una más nueva (en orden de id, sin interbloqueos)
+            for estado in estados:
+                if estado is not None:
+                    escrituras.enter_context(estado.escritura)
+            return self._escribir_tomados(estados)
+
+    def _escribir_tomados(self, estados: List[Optional[EstadoPartida]]) -> bool:
+        tomados = []
+        for estado in estados:
+            if estado is None:
+                continue
+            with estado.lock:
+                cambios = estado.tomar_cambios()
+            if cambios:
+                tomados.append((estado, cambios))
+        if not tomados:
+            return True
+
+        inicio = time.perf_counter()
+        try:
+            with self.conexion() as connection:
+                with connection.cursor() as cursor:
+                    filas_estado = [c['estado'] for _, c in tomados if c['estado']]
+                    if filas_estado:
+                        cursor.executemany("""
+                            UPDATE estado_juego
+                            SET mazo = %s, descarte = %s, ultima_carta_descartada = %s,
+                                jugador_turno_id = %s, fase_turno = %s
+                            WHERE partida_id = %s
+                        """, filas_estado)
+                    filas_jugadores = [fila for _, c in tomados for fila in c['jugadores']]
+                    if filas_jugadores:
+                        cursor.executemany("""
+                            UPDATE partida_jugadores
+                            SET cartas_en_mano = %s, ha_bajado = %s, combinaciones_bajadas = %s,
+                                puntos_ronda = %s, puntos_totales = %s
+                            WHERE id = %s
+                        """, filas_jugadores)
+                    filas_partida = [c['partida'] for _, c in tomados if c['partida']]
+                    if filas_partida:
+                        cursor.executemany("""
+                            UPDATE partidas
+                            SET contrato_actual = %s, ronda_actual = %s, estado = %s,
+                                ganador_id = %s, fecha_fin = %s
+                            WHERE id = %s
+                        """, filas_partida)
+                connection.commit()
+        except Exception as e:
+            print(f"Error guardando partidas {[e_.partida_id for e_, _ in tomados]}: {str(e)}")
+            # Orden de locks: primero el de la partida, después el del almacén
+            for estado, cambios in tomados:
+                with estado.lock:
+                    estado.devolver_cambios(cambios)
+            with self._condicion:
+                self.errores += 1
+                self._sucias.update(estado.partida_id for estado, _ in tomados)
+            return False
+
+        with self._condicion:
+            self.lotes += 1
+            self.escrituras += len(tomados)
+            self.ultimo_lote_ms = (time.perf_counter() - inicio) * 1000
+        return True
+
+    def detener(self):
+        """Escribe todo lo pendiente y detiene el hilo"""
+        with self._condicion:
+            self._activo = False
+            self._condicion.notify()
+        if self._hilo is not None:
+            self._hilo.join()
+        self.guardar_ahora()
+
+    def estadisticas(self) -> Dict:
+        with self._condicion:
+            return {
+                'partidas': len(self._partidas),
+                'sucias': len(self._sucias),
+                'lotes': self.lotes,
+                'escrituras': self.escrituras,
+                'errores': self.errores,
+                'ultimo_lote_ms': self.ultimo_lote_ms
+            }
@@ -0,0 +1,85 @@
+"""
+Índice incremental de una mano
+Mantiene conteos por rango, máscaras de rango por palo y jokers con altas y bajas O(1)
+"""
+from typing import Dict, Iterable, List
+
+from card_codec import ES_COMODIN, FORMA, PUNTOS, codificar_mano
+
+
+class HandIndex:
+    """
+    Resumen de una mano que se actualiza carta a carta
+    simples/dobles: máscara de rangos por palo de la primera y segunda copia (2 barajas)
+    """
+
+    def __init__(self, codigos: Iterable[int] = ()):
+        conteos = self.conteos_rango = [0] * 14
+        simples = self.simples = [0, 0, 0, 0]
+        dobles = self.dobles = [0, 0, 0, 0]
+        comodines = total = puntos = 0
+        # Igual que agregar carta a carta, sin una llamada por carta
+        for codigo in codigos:
+            total += 1
+            puntos += PUNTOS[codigo]
+            if ES_COMODIN[codigo]:
+                comodines += 1
+                continue
+            palo, r = divmod(FORMA[codigo], 13)
+            bit = 1 << r
+            if simples[palo] & bit:
+                dobles[palo] |= bit
+            else:
+                simples[palo] |= bit
+            conteos[r + 1] += 1
+        self.comodines = comodines
+        self.total = total
+        self.puntos = puntos
+
+    @classmethod
+    def desde_cartas(cls, cartas: List[Dict]) -> 'HandIndex':
+        """Crea el índice a partir de cartas en formato diccionario"""
+        return cls(codificar_mano(cartas))
+
+    def agregar(self, codigo: int):
+        self.total += 1
+        self.puntos += PUNTOS[codigo]
+        if ES_COMODIN[codigo]:
+            self.comodines += 1
+            return
+        palo, r = divmod(FORMA[codigo], 13)
+        bit = 1 << r
+        if self.simples[palo] & bit:
+            self.dobles[palo] |= bit
+        else:
+            self.simples[palo] |= bit
+        self.conteos_rango[r + 1] += 1
+
+    def quitar(self, codigo: int):
+        self.total -= 1
+        self.puntos -= PUNTOS[codigo]
+        if ES_COMODIN[codigo]:
+            self.comodines -= 1
+            return
+        palo, r = divmod(FORMA[codigo], 13)
+        bit = 1 << r
+        if self.dobles[palo] & bit:
+            self.dobles[palo] &= ~bit
+        else:
+            self.simples[palo] &= ~bit
+        self.conteos_rango[r + 1] -= 1
+
+    def copias(self, palo: int, rango: int) -> int:
+        """Cantidad de copias (0-2) de una carta normal en la mano"""
+        if not 1 <= rango <= 13:
+            return 0
+        bit = 1 << (rango - 1)
+        return (1 if self.simples[palo] & bit else 0) + (1 if self.dobles[palo] & bit else 0)
+
+    def conteo_rango(self, rango: int) -> int:
+        """Cantidad de cartas normales de un rango, sin importar el palo"""
+        return self.conteos_rango[rango]
+
+    def mascara_palo(self, palo: int) -> int:
+        """Máscara de rangos presentes en un palo"""
+        return self.simples[palo]
@@ -0,0 +1,82 @@
+"""
+Validación de combinaciones mediante máscaras de bits
+Los rangos de un palo se representan como una máscara de 13 bits (A=bit 0, K=bit 12)
+y las comprobaciones se responden con tablas precalculadas al importar
+"""
+from typing import Iterable
+
+from card_codec import BIT_RANGO, ES_COMODIN, PALO
+
+MASCARA_COMPLETA = (1 << 13) - 1
+TOTAL_MASCARAS = 1 << 13
+
+
+def _huecos(mascara: int) -> int:
+    if mascara == 0:
+        return 0
+    bajo = (mascara & -mascara).bit_length()
+    alto = mascara.bit_length()
+    return alto - bajo + 1 - bin(mascara).count('1')
+
+
+# Cantidad de rangos presentes en cada máscara
+BITS = bytes(bin(m).count('1') for m in range(TOTAL_MASCARAS))
+
+# Huecos entre el rango más bajo y el más alto de cada máscara
+HUECOS_ESCALA = bytes(_huecos(m) for m in range(TOTAL_MASCARAS))
+
+
+def mascara_de_valores(valores: Iterable[int]) -> int:
+    """Convierte valores numéricos (1-13) en máscara de rangos"""
+    mascara = 0
+    for valor in valores:
+        mascara |= 1 << (valor - 1)
+    return mascara
+
+
+def trio_valido(mascara_rangos: int, total_cartas: int) -> bool:
+    """
+    Un trío tiene 3 o más cartas y a lo sumo un rango entre las cartas normales
+    """
+    return total_cartas >= 3 and BITS[mascara_rangos] <= 1
+
+
+def escala_valida(mascara: int, normales: int, comodines: int) -> bool:
+    """
+    Una escala de un solo palo es válida si los comodines cubren los huecos
+    y en total suma al menos 3 cartas
+    """
+    if mascara == 0:
+        return normales == 0 and comodines >= 3
+    return normales + comodines >= 3 and comodines >= HUECOS_ESCALA[mascara]
+
+
+def validar_trio_codigos(codigos: Iterable[int]) -> bool:
+    """Valida un trío expresado con códigos de carta"""
+    mascara = 0
+    total = 0
+    for codigo in codigos:
+        mascara |= BIT_RANGO[codigo]
+        total += 1
+    return trio_valido(mascara, total)
+
+
+def validar_escala_codigos(codigos: Iterable[int]) -> bool:
+    """Valida una escala expresada con códigos de carta"""
+    mascara = 0
+    palos = 0
+    normales = 0
+    comodines = 0
+    for codigo in codigos:
+        if ES_COMODIN[codigo]:
+            comodines += 1
+        else:
+            mascara |= BIT_RANGO[codigo]
+            palos |= 1 << PALO[codigo]
+            normales += 1
+
+    # Una escala debe ser del mismo palo
+    if palos & (palos - 1):
+        return False
+
+    return escala_valida(mascara, normales, comodines)
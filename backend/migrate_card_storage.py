@@ -0,0 +1,107 @@
+"""
+Migración de las columnas de cartas al formato binario
+Reescribe mazo, descarte y ultima_carta_descartada (estado_juego) y cartas_en_mano
+(partida_jugadores) que sigan con el JSON anterior como card_codec.empaquetar_cartas:
+un byte de versión + un byte por carta. Las filas ya migradas se saltan, así que se
+puede correr más de una vez; las que decodifican a cartas repetidas quedan sin tocar y
+cuentan como error. Requiere database/update_schema.sql (columnas binarias)
+Uso:
+    python backend/migrate_card_storage.py --lote 500 [--simular]
+"""
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+from card_codec import VERSION_FORMATO_CARTAS, desempaquetar_cartas, empaquetar_cartas
+from db_pool import pool_conexiones
+
+# tabla -> (columna clave, columnas de cartas)
+TABLAS = {
+    'estado_juego': ('id', ('mazo', 'descarte', 'ultima_carta_descartada')),
+    'partida_jugadores': ('id', ('cartas_en_mano',))
+}
+
+
+def _migrada(valor) -> bool:
+    return valor is None or (isinstance(valor, (bytes, bytearray)) and valor[:1] == bytes([VERSION_FORMATO_CARTAS]))
+
+
+def _tamano(valor) -> int:
+    if valor is None:
+        return 0
+    return len(valor.encode('utf-8')) if isinstance(valor, str) else len(valor)
+
+
+def _recodificar(valor) -> bytes:
+    """Empaqueta una columna; rechaza la fila si dos cartas caen en el mismo código"""
+    codigos = desempaquetar_cartas(valor)
+    if len(set(codigos)) != len(codigos):
+        raise ValueError(f"cartas repetidas al decodificar ({len(codigos)} cartas, "
+                         f"{len(set(codigos))} códigos distintos)")
+    return empaquetar_cartas(codigos)
+
+
+def migrar_tabla(tabla: str, lote: int = 500, simular: bool = False) -> Dict:
+    """Migra una tabla por lotes de filas (recorridas por id); devuelve conteos y bytes"""
+    clave, columnas = TABLAS[tabla]
+    resumen = {'tabla': tabla, 'filas': 0, 'migradas': 0, 'errores': 0, 'bytes_antes': 0, 'bytes_despues': 0}
+    ultimo_id = 0
+
+    while True:
+        with pool_conexiones.conexion() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT {clave}, {', '.join(columnas)} FROM {tabla}
+                    WHERE {clave} > %s ORDER BY {clave} LIMIT %s
+                """, (ultimo_id, lote))
+                filas = cursor.fetchall()
+                if not filas:
+                    return resumen
+
+                cambios: List[Sequence] = []
+                for fila in filas:
+                    resumen['filas'] += 1
+                    if all(_migrada(fila[columna]) for columna in columnas):
+                        continue
+                    try:
+                        nuevos = [None if fila[columna] is None else _recodificar(fila[columna])
+                                  for columna in columnas]
+                    except ValueError as e:
+                        print(f"Error migrando {tabla} {fila[clave]}: {str(e)}")
+                        resumen['errores'] += 1
+                        continue
+                    resumen['migradas'] += 1
+                    resumen['bytes_antes'] += sum(_tamano(fila[columna]) for columna in columnas)
+                    resumen['bytes_despues'] += sum(_tamano(valor) for valor in nuevos)
+                    cambios.append((*nuevos, fila[clave]))
+
+                if cambios and not simular:
+                    asignaciones = ', '.join(f"{columna} = %s" for columna in columnas)
+                    cursor.executemany(f"UPDATE {tabla} SET {asignaciones} WHERE {clave} = %s", cambios)
+                    connection.commit()
+
+        ultimo_id = filas[-1][clave]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Migra las columnas de cartas al formato binario')
+    parser.add_argument('--lote', type=int, default=500, help='filas por transacción')
+    parser.add_argument('--simular', action='store_true', help='cuenta lo que se migraría sin escribir')
+    args = parser.parse_args(argv)
+
+    errores = 0
+    for tabla in TABLAS:
+        inicio = time.perf_counter()
+        resumen = migrar_tabla(tabla, args.lote, args.simular)
+        errores += resumen['errores']
+        reduccion = resumen['bytes_antes'] / resumen['bytes_despues'] if resumen['bytes_despues'] else 0
+        print(f"{tabla}: {resumen['migradas']}/{resumen['filas']} filas "
+              f"{'a migrar' if args.simular else 'migradas'}, {resumen['errores']} errores, "
+              f"{resumen['bytes_antes']} -> {resumen['bytes_despues']} bytes ({reduccion:.0f}x) "
+              f"en {time.perf_counter() - inicio:.2f}s")
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
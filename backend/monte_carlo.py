@@ -0,0 +1,209 @@
+"""
+Búsqueda Monte Carlo para las decisiones de robo y descarte
+Determiniza las manos ocultas de los rivales con las cartas no vistas, juega unos pocos
+turnos con una política rápida y elige la opción con mejor resultado promedio, siempre
+dentro de un presupuesto de tiempo real (o, sin reloj, con un número fijo de iteraciones)
+"""
+import math
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from card_codec import ES_COMODIN, PALO, PUNTOS, RANGO, TOTAL_CARTAS
+from contract_distance import DistanciaContratos
+from hand_index import HandIndex
+
+# La política rápida toma la carta del descarte si su utilidad supera este umbral
+UMBRAL_ROBO_DESCARTE = 0.6
+
+# Turnos propios que se juegan en cada simulación
+HORIZONTE = 3
+
+# Penalización por punto en mano al final de la simulación
+PESO_PUNTOS = 0.002
+
+# Olvido del paso más lento observado (un paso lento aislado no frena la búsqueda para siempre)
+DECAIMIENTO_PASO = 0.95
+
+
+def utilidad_rapida(indice: HandIndex, codigo: int, en_mano: bool = False) -> float:
+    """
+    Utilidad de una carta frente a una mano (misma escala que evaluar_utilidad_carta)
+    en_mano: la carta ya está en el índice y no debe contarse a sí misma
+    """
+    if ES_COMODIN[codigo]:
+        return 0.9
+    rango = RANGO[codigo]
+    palo = PALO[codigo]
+    mismo_valor = indice.conteo_rango(rango) - (1 if en_mano else 0)
+    utilidad = 0.8 if mismo_valor >= 2 else 0.4 if mismo_valor == 1 else 0.0
+    utilidad += 0.6 * (indice.copias(palo, rango - 1) + indice.copias(palo, rango + 1))
+    utilidad += 0.3 * (indice.copias(palo, rango - 2) + indice.copias(palo, rango + 2))
+    return min(utilidad, 1.0)
+
+
+def descarte_rapido(indice: HandIndex, mano: List[int]) -> int:
+    """Posición de la carta que la política rápida suelta"""
+    return min(range(len(mano)),
+               key=lambda i: utilidad_rapida(indice, mano[i], True) - 0.2 * PUNTOS[mano[i]] / 25)
+
+
+def cartas_no_vistas(visibles: Iterable[int]) -> List[int]:
+    """Códigos que el jugador no ha visto: mazo y manos rivales"""
+    vistas = set(visibles)
+    return [c for c in range(TOTAL_CARTAS) if c not in vistas]
+
+
+class _SinTiempo(Exception):
+    """Se agotó el presupuesto en medio de una simulación"""
+
+
+# Opción candidata: (mano resultante, roba del mazo antes de evaluar, descarta antes de evaluar)
+Opcion = Tuple[Sequence[int], bool, bool]
+
+
+class BusquedaMonteCarlo:
+    """
+    Compara opciones de robo o descarte con simulaciones cortas
+    Todas las opciones se evalúan con las mismas determinizaciones (números aleatorios
+    comunes) y solo cuentan las iteraciones completas
+    """
+
+    def __init__(self, contratos: Dict[int, Dict], presupuesto: Optional[float], simulaciones: int,
+                 horizonte: int = HORIZONTE, rng: Optional[random.Random] = None):
+        self.contratos = contratos
+        self.presupuesto = presupuesto
+        self.simulaciones = simulaciones
+        self.horizonte = horizonte
+        self.rng = rng or random.Random()
+        self.ultimas_iteraciones = 0
+        # Duración reciente del paso más lento: no se empieza uno que no alcance a terminar
+        self._paso_max = 0.0
+
+    def sin_reloj(self, simulaciones: int):
+        """
+        Sin presupuesto de tiempo: siempre 'simulaciones' iteraciones (como máximo las
+        configuradas). El resultado depende solo del rng, no de la carga de la máquina
+        """
+        self.presupuesto = None
+        self.simulaciones = min(self.simulaciones, simulaciones)
+
+    def elegir_robo(self, mano: Sequence[int], carta_descarte: int, no_vistas: List[int],
+                    cartas_oponentes: Sequence[int], contrato: int) -> Optional[bool]:
+        """
+        True para robar del descarte, False para el mazo; None si no alcanzó el tiempo
+        """
+        opciones = [
+            (list(mano) + [carta_descarte], False, True),
+            (list(mano), True, True)
+        ]
+        mejor = self._buscar(opciones, no_vistas, cartas_oponentes, contrato)
+        return None if mejor is None else mejor == 0
+
+    def elegir_descarte(self, mano: Sequence[int], candidatos: Sequence[int], no_vistas: List[int],
+                        cartas_oponentes: Sequence[int], contrato: int) -> Optional[int]:
+        """
+        Posición (entre 'candidatos') de la carta a descartar; None si no alcanzó el tiempo
+        """
+        opciones = [
+            ([c for j, c in enumerate(mano) if j != i], False, False)
+            for i in candidatos
+        ]
+        mejor = self._buscar(opciones, no_vistas, cartas_oponentes, contrato)
+        return None if mejor is None else candidatos[mejor]
+
+    def _buscar(self, opciones: List[Opcion], no_vistas: List[int],
+                cartas_oponentes: Sequence[int], contrato: int) -> Optional[int]:
+        limite = math.inf if self.presupuesto is None else time.perf_counter() + self.presupuesto
+        totales = [0.0] * len(opciones)
+        iteraciones = 0
+        try:
+            while iteraciones < self.simulaciones and time.perf_counter() + self._paso_max < limite:
+                oponentes, mazo = self._determinizar(no_vistas, cartas_oponentes)
+                semilla = self.rng.getrandbits(32)
+                resultados = [self._simular(opcion, oponentes, mazo, contrato, limite, semilla)
+                              for opcion in opciones]
+                for i, resultado in enumerate(resultados):
+                    totales[i] += resultado
+                iteraciones += 1
+        except _SinTiempo:
+            pass
+
+        self.ultimas_iteraciones = iteraciones
+        if not iteraciones:
+            return None
+        return min(range(len(opciones)), key=totales.__getitem__)
+
+    def _registrar_paso(self, duracion: float):
+        # Acotado a medio presupuesto: un paso anómalo (recolector de basura, caché fría)
+        # no puede dejar a la búsqueda sin iteraciones
+        if self.presupuesto is not None:
+            self._paso_max = min(max(duracion, self._paso_max * DECAIMIENTO_PASO), self.presupuesto / 2)
+
+    def _determinizar(self, no_vistas: List[int],
+                      cartas_oponentes: Sequence[int]) -> Tuple[List[List[int]], List[int]]:
+        """Reparte las cartas no vistas entre las manos rivales y el mazo"""
+        cartas = self.rng.sample(no_vistas, len(no_vistas))
+        oponentes = []
+        inicio = 0
+        for cantidad in cartas_oponentes:
+            oponentes.append(cartas[inicio:inicio + cantidad])
+            inicio += cantidad
+        return oponentes, cartas[inicio:]
+
+    def _simular(self, opcion: Opcion, oponentes: List[List[int]], mazo: List[int],
+                 contrato: int, limite: float, semilla: int) -> float:
+        """
+        Turnos propios hasta poder bajar (menos es mejor) con la política rápida;
+        los rivales roban del mazo y descartan al azar (misma semilla para todas las opciones)
+        """
+        codigos, roba_mazo, descarta = opcion
+        mano = list(codigos)
+        mazo = list(mazo)
+        oponentes = [list(o) for o in oponentes]
+        indice = DistanciaContratos(self.contratos, mano)
+        rng = random.Random(semilla)
+        reloj = time.perf_counter
+        inicio = reloj()
+        if inicio + self._paso_max >= limite:
+            raise _SinTiempo
+
+        # La opción misma: robo (y bajada inmediata si ya se puede) con su descarte
+        if roba_mazo and mazo:
+            robada = mazo.pop()
+            mano.append(robada)
+            indice.agregar(robada)
+        if descarta:
+            if indice.distancia(contrato) == 0:
+                return PESO_PUNTOS * indice.puntos
+            indice.quitar(mano.pop(descarte_rapido(indice, mano)))
+        self._registrar_paso(reloj() - inicio)
+
+        for paso in range(1, self.horizonte + 1):
+            inicio = reloj()
+            if inicio + self._paso_max >= limite:
+                raise _SinTiempo
+
+            # Los rivales juegan antes del próximo turno propio
+            arriba = None
+            for mano_rival in oponentes:
+                if mazo:
+                    mano_rival.append(mazo.pop())
+                if mano_rival:
+                    arriba = mano_rival.pop(rng.randrange(len(mano_rival)))
+
+            if arriba is not None and utilidad_rapida(indice, arriba) > UMBRAL_ROBO_DESCARTE:
+                robada = arriba
+            elif mazo:
+                robada = mazo.pop()
+            else:
+                break
+            mano.append(robada)
+            indice.agregar(robada)
+
+            if indice.distancia(contrato) == 0:
+                return paso + PESO_PUNTOS * indice.puntos
+            indice.quitar(mano.pop(descarte_rapido(indice, mano)))
+            self._registrar_paso(reloj() - inicio)
+
+        return self.horizonte + 1 + indice.distancia(contrato) + PESO_PUNTOS * indice.puntos
@@ -0,0 +1,257 @@
+"""
+Tablas de política precalculadas para los primeros contratos
+Una mano se descompone en patrones por palo (copias 0-2 de cada rango: 3^13 patrones,
+los mismos para los cuatro palos y sin importar la baraja) y para cada patrón se guardan
+las ventanas de escala aprovechables y el costo de armar dos escalas dentro del palo.
+Con eso las cartas que faltan para los contratos 2 y 3 salen de cuatro lecturas (el 1
+depende solo de los conteos por rango), con el mismo resultado que cartas_faltantes
+
+El archivo se genera una vez, fuera de línea (python policy_tables.py), y los bots lo
+abren con mmap de solo lectura: los procesos del servidor comparten las mismas páginas
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, Optional, Sequence, Tuple
+
+from contract_distance import VENTANAS_MINIMAS, cartas_faltantes
+from meld_tables import BITS, TOTAL_MASCARAS
+
+MAGIA = b'CPOL'
+VERSION = 1
+CABECERA = struct.Struct('<4sHHI')  # magia, versión, bytes por entrada, entradas
+
+TOTAL_PATRONES = 3 ** 13
+RUTA_POR_DEFECTO = os.getenv(
+    'TABLAS_POLITICA',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablas_politica.bin')
+)
+
+# Contratos que cubren las tablas, como (tríos, escalas)
+CUBIERTOS = ((2, 0), (1, 1), (0, 2))
+
+# Índice base 3 de cada máscara de rangos (un dígito por rango)
+TRES = tuple(sum(3 ** r for r in range(13) if m >> r & 1) for m in range(TOTAL_MASCARAS))
+
+# Entrada de 32 bits: ventanas de costo 0, ventanas de costo 1 y costo de dos escalas (3 = no hay)
+_BITS_VENTANAS = len(VENTANAS_MINIMAS)
+_MASCARA_VENTANAS = (1 << _BITS_VENTANAS) - 1
+_DESPLAZAMIENTO_DOS = 2 * _BITS_VENTANAS
+
+
+def _ventanas_que_cubren(mascara: int) -> int:
+    """Ventanas de 3 rangos que contienen todos los rangos de la máscara"""
+    cubren = 0
+    for i, ventana in enumerate(VENTANAS_MINIMAS):
+        if mascara & ~ventana == 0:
+            cubren |= 1 << i
+    return cubren
+
+
+CUBREN = tuple(_ventanas_que_cubren(m) for m in range(TOTAL_MASCARAS))
+
+
+def _costo_dos_escalas(simples: int, dobles: int, utiles: Sequence[int]) -> int:
+    """Mínimo de cartas faltantes para dos escalas del mismo palo (3 si no se puede)"""
+    mejor = 3
+    for i in utiles:
+        presentes = simples & VENTANAS_MINIMAS[i]
+        restantes = simples & ~(presentes & ~dobles)
+        for j in range(i, _BITS_VENTANAS):
+            segunda = BITS[restantes & VENTANAS_MINIMAS[j]]
+            if segunda >= 2:
+                mejor = min(mejor, 6 - BITS[presentes] - segunda)
+    return mejor
+
+
+def generar_tablas() -> array:
+    """Calcula la entrada de cada patrón de palo, indexada por TRES[simples] + TRES[dobles]"""
+    tabla = array('I', bytes(4 * TOTAL_PATRONES))
+    for simples in range(TOTAL_MASCARAS):
+        cero = uno = 0
+        for i, ventana in enumerate(VENTANAS_MINIMAS):
+            presentes = BITS[simples & ventana]
+            if presentes == 3:
+                cero |= 1 << i
+            elif presentes == 2:
+                uno |= 1 << i
+        utiles = [i for i in range(_BITS_VENTANAS) if (cero | uno) >> i & 1]
+        base = cero | uno << _BITS_VENTANAS
+
+        # Todas las submáscaras de 'simples' como segunda copia
+        dobles = simples
+        while True:
+            dos = _costo_dos_escalas(simples, dobles, utiles)
+            tabla[TRES[simples] + TRES[dobles]] = base | dos << _DESPLAZAMIENTO_DOS
+            if dobles == 0:
+                break
+            dobles = (dobles - 1) & simples
+    return tabla
+
+
+def escribir_tablas(ruta: str, tabla: array):
+    """Guarda las tablas en formato binario (little-endian)"""
+    if sys.byteorder != 'little':
+        tabla = array('I', tabla)
+        tabla.byteswap()
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(CABECERA.pack(MAGIA, VERSION, tabla.itemsize, len(tabla)))
+        tabla.tofile(archivo)
+    os.replace(temporal, ruta)
+
+
+class TablasPolitica:
+    """
+    Tablas abiertas con mmap; las consultas leen el archivo sin copiarlo
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        with open(ruta, 'rb') as archivo:
+            self._mmap = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, version, ancho, entradas = CABECERA.unpack_from(self._mmap)
+        if (magia != MAGIA or version != VERSION or ancho != 4 or entradas != TOTAL_PATRONES
+                or len(self._mmap) != CABECERA.size + 4 * entradas):
+            self._mmap.close()
+            raise ValueError(f"Tablas de política inválidas o de otra versión: {ruta}")
+        self._entradas = memoryview(self._mmap)[CABECERA.size:].cast('I')
+
+    def faltantes(self, simples: Sequence[int], dobles: Sequence[int], requerido: Tuple[int, int],
+                  conteos: Optional[Sequence[int]] = None) -> Optional[int]:
+        """
+        Cartas que faltan sin contar jokers, como cartas_faltantes para un solo contrato
+        conteos: cartas normales por rango (A..K), si el llamador ya los tiene
+        None si el contrato no está en las tablas
+        """
+        if requerido not in CUBIERTOS:
+            return None
+        trios, escalas = requerido
+
+        if conteos is None:
+            conteos = [0] * 13
+            for mascara in (*simples, *dobles):
+                while mascara:
+                    bit = mascara & -mascara
+                    conteos[bit.bit_length() - 1] += 1
+                    mascara ^= bit
+
+        if escalas == 0:
+            return self._costo_trios(conteos, trios)
+
+        entradas = self._entradas
+        entradas = [entradas[TRES[s] + TRES[d]] for s, d in zip(simples, dobles)]
+        if trios == 0:
+            return self._dos_escalas(entradas, sum(conteos))
+        return self._trio_y_escala(entradas, simples, conteos, sum(conteos))
+
+    @staticmethod
+    def _costo_trios(conteos: Sequence[int], trios: int) -> int:
+        # Cada rango aporta grupos de 3 (costo 0) y un resto de 2 (costo 1) o de 1 (costo 2)
+        faltan = trios
+        unos = doses = 0
+        for cantidad in conteos:
+            faltan -= cantidad // 3
+            resto = cantidad % 3
+            if resto == 2:
+                unos += 1
+            elif resto == 1:
+                doses += 1
+        if faltan <= 0:
+            return 0
+        costo = 0
+        for precio, disponibles in ((1, unos), (2, doses)):
+            usados = min(faltan, disponibles)
+            costo += precio * usados
+            faltan -= usados
+        return costo + 3 * faltan
+
+    @staticmethod
+    def _dos_escalas(entradas: Sequence[int], cartas: int) -> int:
+        mejor = 6 - min(2, cartas)
+        una = []
+        for entrada in entradas:
+            if entrada & _MASCARA_VENTANAS:
+                una.append(0)
+            elif entrada >> _BITS_VENTANAS & _MASCARA_VENTANAS:
+                una.append(1)
+            dos = entrada >> _DESPLAZAMIENTO_DOS
+            if dos < 3:
+                mejor = min(mejor, dos)
+        if una:
+            una.sort()
+            mejor = min(mejor, una[0] + 3 - min(1, cartas - 3 + una[0]))
+            if len(una) > 1:
+                mejor = min(mejor, una[0] + una[1])
+        return mejor
+
+    @staticmethod
+    def _trio_y_escala(entradas: Sequence[int], simples: Sequence[int],
+                       conteos: Sequence[int], cartas: int) -> int:
+        maximo = max(conteos)
+        trio = 3 - min(3, maximo)
+        mejor = trio + 3 - min(1, cartas - 3 + trio)
+
+        # Una escala que se lleva una carta de cada rango con más copias encarece el trío
+        criticos = 0
+        if 1 <= maximo <= 3:
+            for r, cantidad in enumerate(conteos):
+                if cantidad == maximo:
+                    criticos |= 1 << r
+
+        for palo, entrada in enumerate(entradas):
+            penalizadas = CUBREN[criticos] if criticos and criticos & ~simples[palo] == 0 else 0
+            for costo in (0, 1):
+                ventanas = entrada >> (costo * _BITS_VENTANAS) & _MASCARA_VENTANAS
+                if ventanas & ~penalizadas:
+                    mejor = min(mejor, trio + costo)
+                elif ventanas:
+                    mejor = min(mejor, trio + costo + 1)
+        return mejor
+
+
+_cargadas: Dict[str, Optional[TablasPolitica]] = {}
+
+
+def cargar_tablas(ruta: Optional[str] = None) -> Optional[TablasPolitica]:
+    """
+    Abre las tablas una sola vez por proceso; None si no se generaron
+    (los bots siguen con el análisis en vivo)
+    """
+    ruta = ruta or RUTA_POR_DEFECTO
+    if ruta not in _cargadas:
+        try:
+            _cargadas[ruta] = TablasPolitica(ruta) if sys.byteorder == 'little' else None
+        except (OSError, ValueError, struct.error):
+            _cargadas[ruta] = None
+    return _cargadas[ruta]
+
+
+def faltantes(simples: Sequence[int], dobles: Sequence[int], requerido: Tuple[int, int],
+              tablas: Optional[TablasPolitica] = None, conteos: Optional[Sequence[int]] = None) -> int:
+    """Consulta las tablas y, si no cubren el contrato, calcula en vivo"""
+    if tablas is not None:
+        resultado = tablas.faltantes(simples, dobles, requerido, conteos)
+        if resultado is not None:
+            return resultado
+    return cartas_faltantes(tuple(simples), tuple(dobles), (requerido,))[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera las tablas de política de los contratos 1 a 3')
+    parser.add_argument('--salida', default=RUTA_POR_DEFECTO, help='Archivo de tablas a escribir')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    tabla = generar_tablas()
+    escribir_tablas(args.salida, tabla)
+    print(f"{len(tabla)} patrones en {args.salida} "
+          f"({os.path.getsize(args.salida) / 2 ** 20:.1f} MiB, {time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Granja de partidas entre bots en varios procesos
+Reparte lotes de partidas del simulador en un pool de procesos, recibe los resúmenes
+a medida que terminan y agrega victorias, puntos por contrato y latencia de decisión
+por dificultad
+Uso:
+    python backend/self_play.py --partidas 100000 --bots facil medio dificil --salida granja.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from bot_ai import CariocaBotAI
+from simulator import SIMULACIONES_BUSQUEDA, SimuladorCarioca
+
+# Partidas por tarea: suficientes para amortizar el envío entre procesos
+PARTIDAS_POR_LOTE = 50
+
+# Histograma de latencias en cubetas geométricas (cada una 10% más ancha que la anterior)
+RAZON_CUBETAS = 1.1
+_LOG_RAZON = math.log(RAZON_CUBETAS)
+
+
+def cubeta_latencia(ns: int) -> int:
+    return int(math.log(ns) / _LOG_RAZON) if ns > 1 else 0
+
+
+def percentil_us(histograma: Dict[int, int], fraccion: float) -> float:
+    """Percentil de un histograma de latencias por cubetas, en microsegundos"""
+    total = sum(histograma.values())
+    if not total:
+        return 0.0
+    acumulado = 0
+    for cubeta in sorted(histograma):
+        acumulado += histograma[cubeta]
+        if acumulado >= fraccion * total:
+            # Borde superior de la cubeta
+            return RAZON_CUBETAS ** (cubeta + 1) / 1000
+    return 0.0
+
+
+def jugar_lote(tarea: Tuple[Sequence[str], int, int, Optional[int]]) -> List[Dict]:
+    """
+    Juega un lote dentro de un proceso de la granja
+    Con la búsqueda a iteraciones fijas, la semilla del lote fija el mazo y las decisiones
+    de los bots: el resultado (salvo las latencias) no depende de qué proceso lo ejecute.
+    Con simulaciones_busqueda None la búsqueda corre con su reloj y depende de la carga
+    """
+    dificultades, semilla, cantidad, simulaciones_busqueda = tarea
+    random.seed(semilla)
+    bots = [CariocaBotAI(dificultad) for dificultad in dificultades]
+
+    resumenes = []
+    for i in range(cantidad):
+        partida = SimuladorCarioca(bots, semilla=semilla + i,
+                                   simulaciones_busqueda=simulaciones_busqueda).jugar_partida()
+        latencias = [defaultdict(int) for _ in bots]
+        for j, jugador in enumerate(partida['jugadores']):
+            for ns in jugador['latencias_ns']:
+                latencias[j][cubeta_latencia(ns)] += 1
+        resumenes.append({
+            'semilla': partida['semilla'],
+            'dificultades': list(dificultades),
+            'ganador': partida['ganador'],
+            'puntos_totales': partida['puntos_totales'],
+            'puntos_por_contrato': {r['contrato']: r['puntos'] for r in partida['rondas']},
+            'latencias': [dict(h) for h in latencias]
+        })
+    return resumenes
+
+
+class ResultadosGranja:
+    """
+    Acumula resúmenes de partidas por dificultad
+    """
+
+    def __init__(self):
+        self.partidas = 0
+        self.jugadas = defaultdict(int)
+        self.victorias = defaultdict(int)
+        self.puntos = defaultdict(lambda: defaultdict(int))
+        self.rondas = defaultdict(lambda: defaultdict(int))
+        self.latencias = defaultdict(lambda: defaultdict(int))
+
+    def agregar(self, resumen: Dict):
+        self.partidas += 1
+        dificultades = resumen['dificultades']
+        for j, dificultad in enumerate(dificultades):
+            self.jugadas[dificultad] += 1
+            for cubeta, veces in resumen['latencias'][j].items():
+                self.latencias[dificultad][cubeta] += veces
+        self.victorias[dificultades[resumen['ganador']]] += 1
+        for contrato, puntos in resumen['puntos_por_contrato'].items():
+            for j, dificultad in enumerate(dificultades):
+                self.puntos[dificultad][contrato] += puntos[j]
+                self.rondas[dificultad][contrato] += 1
+
+    def _percentil_us(self, dificultad: str, fraccion: float) -> float:
+        return percentil_us(self.latencias[dificultad], fraccion)
+
+    def reporte(self) -> Dict:
+        por_dificultad = {}
+        for dificultad, jugadas in sorted(self.jugadas.items()):
+            por_dificultad[dificultad] = {
+                'partidas': jugadas,
+                'victorias': self.victorias[dificultad],
+                'tasa_victorias': self.victorias[dificultad] / jugadas,
+                'puntos_promedio_por_contrato': {
+                    contrato: self.puntos[dificultad][contrato] / rondas
+                    for contrato, rondas in sorted(self.rondas[dificultad].items())
+                },
+                'decisiones': sum(self.latencias[dificultad].values()),
+                'latencia_p50_us': self._percentil_us(dificultad, 0.50),
+                'latencia_p99_us': self._percentil_us(dificultad, 0.99)
+            }
+        return {'partidas': self.partidas, 'por_dificultad': por_dificultad}
+
+
+def ejecutar_granja(dificultades: Sequence[str], partidas: int, semilla: int = 0,
+                    procesos: Optional[int] = None,
+                    por_lote: int = PARTIDAS_POR_LOTE,
+                    simulaciones_busqueda: Optional[int] = SIMULACIONES_BUSQUEDA) -> Iterator[Dict]:
+    """
+    Reparte las partidas en lotes entre procesos y entrega cada resumen apenas llega
+    Mantiene como máximo dos lotes en vuelo por proceso para no acumular memoria
+    """
+    procesos = procesos or os.cpu_count() or 1
+    tareas = (
+        (tuple(dificultades), semilla + inicio, min(por_lote, partidas - inicio), simulaciones_busqueda)
+        for inicio in range(0, partidas, por_lote)
+    )
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        pendientes = set()
+        for tarea in tareas:
+            pendientes.add(pool.submit(jugar_lote, tarea))
+            if len(pendientes) >= 2 * procesos:
+                listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    yield from futuro.result()
+        for futuro in as_completed(pendientes):
+            yield from futuro.result()
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Granja de partidas entre bots')
+    parser.add_argument('--partidas', type=int, default=1000)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--bots', nargs='+', default=['facil', 'medio', 'dificil'],
+                        help='dificultad de cada jugador de la mesa')
+    parser.add_argument('--procesos', type=int, default=None, help='por defecto, un proceso por núcleo')
+    parser.add_argument('--lote', type=int, default=PARTIDAS_POR_LOTE, help='partidas por tarea')
+    parser.add_argument('--simulaciones-busqueda', type=int, default=SIMULACIONES_BUSQUEDA,
+                        help='iteraciones fijas de la búsqueda Monte Carlo por decisión (0: tiempo real)')
+    parser.add_argument('--salida', help='escribe el reporte como JSON')
+    args = parser.parse_args(argv)
+
+    resultados = ResultadosGranja()
+    inicio = time.perf_counter()
+    for resumen in ejecutar_granja(args.bots, args.partidas, args.semilla, args.procesos, args.lote,
+                                   args.simulaciones_busqueda or None):
+        resultados.agregar(resumen)
+    duracion = time.perf_counter() - inicio
+
+    reporte = resultados.reporte()
+    reporte['segundos'] = duracion
+    reporte['partidas_por_segundo'] = resultados.partidas / duracion if duracion else 0.0
+
+    for dificultad, datos in reporte['por_dificultad'].items():
+        print(f"{dificultad:8} victorias {datos['tasa_victorias']:6.1%}  "
+              f"p50 {datos['latencia_p50_us']:8.0f} µs  p99 {datos['latencia_p99_us']:8.0f} µs")
+    print(f"{resultados.partidas} partidas en {duracion:.1f}s "
+          f"({reporte['partidas_por_segundo']:.1f} partidas/s)")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
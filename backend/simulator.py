@@ -0,0 +1,283 @@
+"""
+Simulador en memoria de partidas entre bots
+Juega los 10 contratos completos sin base de datos: reparte según
+Config.CARTAS_INICIALES_POR_CONTRATO, roba, baja, agrega a la mesa, descarta y puntúa
+Uso:
+    python backend/simulator.py --partidas 100 --bots facil medio dificil
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+from batch_scoring import puntos_manos
+from bot_ai import CariocaBotAI
+from card_codec import TOTAL_CARTAS, decodificar_mano, descarte_rebarajado
+from config import Config
+from game_logic import CariocaGameLogic
+from table_melds import CombinacionMesa
+
+# Las 112 cartas decodificadas una sola vez: manos, mazo y mesa comparten estos diccionarios
+CARTAS = decodificar_mano(range(TOTAL_CARTAS))
+
+# Tope de turnos por jugador y ronda: con las cartas repartidas de los contratos 5 a 10
+# no alcanzan las cartas para bajar, así que esas rondas solo terminan por este tope
+MAX_TURNOS_POR_JUGADOR = 30
+
+# Iteraciones fijas de la búsqueda Monte Carlo en el simulador, sin reloj: las partidas no
+# dependen de la carga de la máquina (se repiten con la semilla) y cada decisión cuesta
+# unas pocas simulaciones en vez de todo el presupuesto de tiempo real del bot
+SIMULACIONES_BUSQUEDA = 8
+
+# Identificador de partida dentro del proceso (los bots reinician su memoria al cambiar)
+_IDS_PARTIDA = itertools.count(1)
+
+
+class SimuladorCarioca:
+    """
+    Partida completa entre bots, toda en memoria
+    El mazo se baraja con un generador propio (semilla); las decisiones de los bots usan
+    el módulo random, que el llamador puede sembrar para repetir partidas exactas
+    """
+
+    def __init__(self, bots: Sequence[CariocaBotAI], semilla: Optional[int] = None,
+                 contratos: Optional[Sequence[int]] = None,
+                 max_turnos_por_jugador: int = MAX_TURNOS_POR_JUGADOR, verificar: bool = False,
+                 reparto: Optional[Sequence[Sequence[int]]] = None, reparto_id: Optional[int] = None,
+                 simulaciones_busqueda: Optional[int] = SIMULACIONES_BUSQUEDA):
+        if not Config.MIN_JUGADORES_POR_PARTIDA <= len(bots) <= Config.MAX_JUGADORES_POR_PARTIDA:
+            raise ValueError(f"Se necesitan entre {Config.MIN_JUGADORES_POR_PARTIDA} y "
+                             f"{Config.MAX_JUGADORES_POR_PARTIDA} bots")
+        self.bots = list(bots)
+        if simulaciones_busqueda is not None:
+            # None deja la búsqueda con su presupuesto de tiempo real, como en el servidor
+            for bot in self.bots:
+                if bot.busqueda is not None:
+                    bot.busqueda.sin_reloj(simulaciones_busqueda)
+        self.partida_id = next(_IDS_PARTIDA)
+        self.semilla = semilla
+        self.rng = random.Random(semilla)
+        self.contratos = list(contratos or range(1, Config.MAX_CONTRATOS + 1))
+        self.max_turnos_por_jugador = max_turnos_por_jugador
+        self.verificar = verificar
+        # Mazo de cada ronda ya barajado (deal_generator); sin él se baraja con la semilla
+        # reparto_id: su número en el lote, para rebarajar el descarte igual que el servidor
+        self.reparto = reparto
+        self.reparto_id = reparto_id if reparto is not None else None
+        self.game_logic = CariocaGameLogic()
+
+        # Estado de la ronda en curso
+        self.mazo: List[int] = []
+        self.descarte: List[Dict] = []
+        self.manos: List[List[Dict]] = []
+        self.mesa: List[CombinacionMesa] = []
+        self.bajados: List[bool] = []
+        self.ronda = 0
+
+        # Latencia de decisión por jugador (ns por turno)
+        self.latencias_ns: List[List[int]] = [[] for _ in self.bots]
+
+    def jugar_partida(self) -> Dict:
+        """
+        Juega todos los contratos; gana quien termina con menos puntos
+        """
+        n = len(self.bots)
+        totales = [0] * n
+        rondas = []
+
+        for ronda, contrato in enumerate(self.contratos):
+            self.ronda = ronda + 1
+            resultado = self.jugar_ronda(contrato, inicial=ronda % n)
+            for j, puntos in enumerate(resultado['puntos']):
+                totales[j] += puntos
+            rondas.append(resultado)
+
+        return {
+            'semilla': self.semilla,
+            'ganador': min(range(n), key=totales.__getitem__),
+            'puntos_totales': totales,
+            'rondas': rondas,
+            'turnos': sum(r['turnos'] for r in rondas),
+            'jugadores': [
+                {
+                    'dificultad': bot.dificultad,
+                    'decisiones': len(self.latencias_ns[j]),
+                    'latencias_ns': self.latencias_ns[j]
+                }
+                for j, bot in enumerate(self.bots)
+            ]
+        }
+
+    def jugar_ronda(self, contrato: int, inicial: int = 0) -> Dict:
+        """
+        Reparte y juega un contrato hasta que alguien se queda sin cartas,
+        se agotan mazo y descarte o se alcanza el tope de turnos
+        """
+        n = len(self.bots)
+        por_jugador = Config.CARTAS_INICIALES_POR_CONTRATO[contrato]
+
+        if self.reparto is not None:
+            self.mazo = [int(codigo) for codigo in self.reparto[self.ronda - 1]]
+        else:
+            self.mazo = list(range(TOTAL_CARTAS))
+            self.rng.shuffle(self.mazo)
+        self.manos = [[CARTAS[c] for c in self.mazo[j * por_jugador:(j + 1) * por_jugador]]
+                      for j in range(n)]
+        del self.mazo[:n * por_jugador]
+        self.descarte = [CARTAS[self.mazo.pop()]]
+        self.mesa = []
+        self.bajados = [False] * n
+
+        ganador = None
+        turnos = 0
+        jugador = inicial
+        while turnos < self.max_turnos_por_jugador * n:
+            turnos += 1
+            if not self.jugar_turno(jugador, contrato):
+                break
+            if self.verificar:
+                self.verificar_invariantes()
+            if not self.manos[jugador]:
+                ganador = jugador
+                break
+            jugador = (jugador + 1) % n
+
+        return {
+            'contrato': contrato,
+            'ganador': ganador,
+            'turnos': turnos,
+            'bajados': list(self.bajados),
+            'puntos': puntos_manos([[c['codigo'] for c in mano] for mano in self.manos]).tolist()
+        }
+
+    def jugar_turno(self, jugador: int, contrato: int) -> bool:
+        """
+        Robo, bajada, cartas agregadas a la mesa y descarte de un jugador
+        Devuelve False si no quedan cartas para robar
+        """
+        bot = self.bots[jugador]
+        mano = self.manos[jugador]
+        reloj = time.perf_counter_ns
+        inicio = reloj()
+
+        # Robar
+        estado = {
+            'partida_id': self.partida_id,
+            'ronda_actual': self.ronda,
+            'contrato_actual': contrato,
+            'ultima_carta_descartada': self.descarte[-1] if self.descarte else None,
+            'descarte': self.descarte,
+            'mesa': self.mesa,
+            'cartas_oponentes': [len(self.manos[(jugador + k) % len(self.manos)])
+                                 for k in range(1, len(self.manos))]
+        }
+        if self.descarte and bot.debe_robar_descarte(estado, mano, contrato):
+            mano.append(self.descarte.pop())
+        else:
+            if not self.mazo:
+                self._rebarajar_descarte()
+            if not self.mazo:
+                return False
+            mano.append(CARTAS[self.mazo.pop()])
+
+        # Bajar el contrato
+        if not self.bajados[jugador]:
+            bajada = bot.decidir_bajada(mano, contrato)
+            if bajada and self.game_logic.validar_contrato(contrato, bajada['combinaciones'])[0]:
+                usadas = set()
+                for combinacion in bajada['combinaciones']:
+                    self.mesa.append(CombinacionMesa(combinacion['cartas'], combinacion['tipo']))
+                    usadas.update(carta['codigo'] for carta in combinacion['cartas'])
+                mano[:] = [carta for carta in mano if carta['codigo'] not in usadas]
+                self.bajados[jugador] = True
+
+        # Agregar a la mesa lo que se pueda (primero cartas normales, los comodines al final)
+        if self.bajados[jugador]:
+            self._agregar_a_mesa(mano)
+
+        # Descartar
+        if mano:
+            descarte = bot.decidir_descarte(mano, contrato, estado_juego=estado)
+            self.descarte.append(mano.pop(descarte['indice']))
+
+        self.latencias_ns[jugador].append(reloj() - inicio)
+        return True
+
+    def _agregar_a_mesa(self, mano: List[Dict]):
+        while mano:
+            agregables = self.game_logic.cartas_agregables(mano, self.mesa)
+            if not agregables:
+                return
+            i, j = min(agregables, key=lambda par: mano[par[0]]['es_comodin'])
+            self.mesa[j].agregar(mano.pop(i))
+
+    def _rebarajar_descarte(self):
+        """El descarte, salvo la carta visible, vuelve al mazo barajado"""
+        if len(self.descarte) <= 1:
+            return
+        self.mazo = descarte_rebarajado([carta['codigo'] for carta in self.descarte],
+                                        self.reparto_id, self.ronda, self.rng)
+        del self.descarte[:-1]
+
+    def verificar_invariantes(self):
+        """
+        Comprueba que no se crearon ni perdieron cartas y que la mesa sigue siendo válida
+        """
+        codigos = list(self.mazo)
+        codigos.extend(carta['codigo'] for carta in self.descarte)
+        for mano in self.manos:
+            codigos.extend(carta['codigo'] for carta in mano)
+        for combinacion in self.mesa:
+            codigos.extend(combinacion.codigos)
+            if combinacion.tipo is None:
+                raise RuntimeError(f"Combinación inválida en mesa: {combinacion.cartas}")
+        if sorted(codigos) != list(range(TOTAL_CARTAS)):
+            raise RuntimeError("Cartas duplicadas o perdidas durante la ronda")
+
+
+def simular_partidas(dificultades: Sequence[str], cantidad: int, semilla: int = 0,
+                     verificar: bool = False,
+                     simulaciones_busqueda: Optional[int] = SIMULACIONES_BUSQUEDA) -> List[Dict]:
+    """
+    Juega 'cantidad' partidas seguidas con una semilla distinta por partida
+    """
+    random.seed(semilla)
+    bots = [CariocaBotAI(dificultad) for dificultad in dificultades]
+    return [
+        SimuladorCarioca(bots, semilla=semilla + i, verificar=verificar,
+                         simulaciones_busqueda=simulaciones_busqueda).jugar_partida()
+        for i in range(cantidad)
+    ]
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Partidas Carioca entre bots, en memoria')
+    parser.add_argument('--partidas', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--bots', nargs='+', default=['facil', 'medio', 'dificil'],
+                        help='dificultad de cada jugador')
+    parser.add_argument('--verificar', action='store_true',
+                        help='comprueba conservación de cartas y mesa válida tras cada turno')
+    parser.add_argument('--simulaciones-busqueda', type=int, default=SIMULACIONES_BUSQUEDA,
+                        help='iteraciones fijas de la búsqueda Monte Carlo por decisión (0: tiempo real)')
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    partidas = simular_partidas(args.bots, args.partidas, args.semilla, args.verificar,
+                                args.simulaciones_busqueda or None)
+    duracion = time.perf_counter() - inicio
+
+    victorias = [0] * len(args.bots)
+    for partida in partidas:
+        victorias[partida['ganador']] += 1
+    for j, dificultad in enumerate(args.bots):
+        promedio = sum(p['puntos_totales'][j] for p in partidas) / len(partidas)
+        print(f"Jugador {j + 1} ({dificultad}): {victorias[j]} victorias, {promedio:.1f} puntos promedio")
+    print(f"{len(partidas)} partidas en {duracion:.2f}s ({len(partidas) / duracion:.1f} partidas/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
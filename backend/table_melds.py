@@ -0,0 +1,150 @@
+"""
+Combinaciones en mesa con índice de cartas aceptadas
+Cada combinación guarda qué cartas puede recibir (el rango de un trío o los dos
+extremos abiertos de una escala) y lo mantiene al crecer
+"""
+from typing import Dict, FrozenSet, List, Optional
+
+from card_codec import ES_COMODIN, FORMA, FORMA_JOKER, PALO, RANGO, codificar_carta, codificar_mano
+from meld_tables import validar_escala_codigos, validar_trio_codigos
+
+# Una combinación solo de comodines acepta cualquier carta
+TODAS_LAS_FORMAS = frozenset(range(FORMA_JOKER))
+
+
+class CombinacionMesa:
+    """
+    Trío o escala bajado en la mesa
+    aceptadas: formas de carta (palo * 13 + rango - 1) que pueden agregarse; los jokers siempre
+    """
+
+    def __init__(self, cartas: List[Dict], tipo: Optional[str] = None):
+        self.cartas = list(cartas)
+        self.codigos = list(codificar_mano(cartas))
+
+        if tipo is None:
+            if validar_trio_codigos(self.codigos):
+                tipo = 'trio'
+            elif validar_escala_codigos(self.codigos):
+                tipo = 'escala'
+        elif tipo == 'trio' and not validar_trio_codigos(self.codigos):
+            tipo = None
+        elif tipo == 'escala' and not validar_escala_codigos(self.codigos):
+            tipo = None
+
+        self.tipo = tipo
+        self.rango = 0
+        self.palo = None
+        self.bajo = 0
+        self.alto = 0
+        self.aceptadas: FrozenSet[int] = frozenset()
+
+        normales = [c for c in self.codigos if not ES_COMODIN[c]]
+        if tipo == 'trio':
+            self.rango = RANGO[normales[0]] if normales else 0
+        elif tipo == 'escala' and normales:
+            self.palo = PALO[normales[0]]
+            self.bajo = min(RANGO[c] for c in normales)
+            self.alto = max(RANGO[c] for c in normales)
+            # Comodines libres (tras cubrir los huecos): los que se bajaron antes de la primera
+            # carta real van debajo y los después de la última, encima (al revés si la escala
+            # se bajó descendente), sin pasar del A ni de la K
+            posiciones = [i for i, c in enumerate(self.codigos) if not ES_COMODIN[c]]
+            libres = len(self.codigos) - (self.alto - self.bajo + 1)
+            antes = posiciones[0]
+            despues = len(self.codigos) - 1 - posiciones[-1]
+            if RANGO[self.codigos[posiciones[0]]] > RANGO[self.codigos[posiciones[-1]]]:
+                antes, despues = despues, antes
+            abajo = max(0, min(antes, libres, self.bajo - 1))
+            self.bajo -= abajo
+            self.alto += max(0, min(despues, libres - abajo, 13 - self.alto))
+            # Comodines que sobran tras cubrir los huecos: arriba y, al llegar a la K, abajo
+            for _ in range(len(self.codigos) - (self.alto - self.bajo + 1)):
+                self._extender_con_comodin()
+
+        self._actualizar_aceptadas()
+
+    def _extender_con_comodin(self):
+        if self.alto < 13:
+            self.alto += 1
+        elif self.bajo > 1:
+            self.bajo -= 1
+
+    def _actualizar_aceptadas(self):
+        if self.tipo == 'trio':
+            if self.rango == 0:
+                self.aceptadas = TODAS_LAS_FORMAS
+            else:
+                self.aceptadas = frozenset(palo * 13 + self.rango - 1 for palo in range(4))
+        elif self.tipo == 'escala':
+            if self.palo is None:
+                self.aceptadas = TODAS_LAS_FORMAS
+            else:
+                extremos = []
+                if self.bajo > 1:
+                    extremos.append(self.palo * 13 + self.bajo - 2)
+                if self.alto < 13:
+                    extremos.append(self.palo * 13 + self.alto)
+                self.aceptadas = frozenset(extremos)
+        else:
+            self.aceptadas = frozenset()
+
+    def acepta(self, codigo: int) -> bool:
+        """Verifica si una carta (código) puede agregarse"""
+        if self.tipo is None:
+            return False
+        if ES_COMODIN[codigo]:
+            # Una escala completa (A a K) ya no admite comodines
+            return self.tipo == 'trio' or self.palo is None or self.bajo > 1 or self.alto < 13
+        return FORMA[codigo] in self.aceptadas
+
+    def agregar(self, carta: Dict) -> bool:
+        """
+        Agrega una carta si es aceptada y actualiza el índice
+        """
+        codigo = codificar_carta(carta)
+        if not self.acepta(codigo):
+            return False
+
+        self.cartas.append(carta)
+        self.codigos.append(codigo)
+
+        if self.tipo == 'trio':
+            if self.rango == 0 and not ES_COMODIN[codigo]:
+                self.rango = RANGO[codigo]
+        elif self.palo is None:
+            if not ES_COMODIN[codigo]:
+                # Escala de solo comodines: la primera carta real fija palo y posición
+                self.palo = PALO[codigo]
+                self.bajo = self.alto = RANGO[codigo]
+                for _ in range(len(self.codigos) - 1):
+                    self._extender_con_comodin()
+        elif ES_COMODIN[codigo]:
+            self._extender_con_comodin()
+        elif RANGO[codigo] < self.bajo:
+            self.bajo = RANGO[codigo]
+        else:
+            self.alto = RANGO[codigo]
+
+        self._actualizar_aceptadas()
+        return True
+
+    def a_dict(self) -> Dict:
+        """Para persistir: las escalas guardan sus extremos (dónde quedaron los comodines)"""
+        datos = {'tipo': self.tipo, 'cartas': self.cartas}
+        if self.tipo == 'escala' and self.palo is not None:
+            datos.update(bajo=self.bajo, alto=self.alto)
+        return datos
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> 'CombinacionMesa':
+        """Reconstruye una combinación de a_dict respetando los extremos guardados"""
+        combinacion = cls(datos.get('cartas', []), datos.get('tipo'))
+        bajo, alto = datos.get('bajo'), datos.get('alto')
+        if combinacion.tipo == 'escala' and combinacion.palo is not None and bajo and alto:
+            normales = [RANGO[c] for c in combinacion.codigos if not ES_COMODIN[c]]
+            if (1 <= bajo <= min(normales) and max(normales) <= alto <= 13
+                    and alto - bajo + 1 == len(combinacion.codigos)):
+                combinacion.bajo, combinacion.alto = bajo, alto
+                combinacion._actualizar_aceptadas()
+        return combinacion
@@ -0,0 +1,347 @@
+"""
+Torneo entre configuraciones de bots
+Todos contra todos de a dos: cada reparto se juega dos veces con los asientos invertidos,
+las partidas se reparten en procesos y el resultado se resume en un rating Elo
+(Bradley-Terry por máxima verosimilitud, intervalo de 95%) junto a decisiones por
+segundo y latencia de decisión
+Uso:
+    python backend/tournament.py --bots facil medio dificil --partidas 200 --salida torneo.json
+    python backend/tournament.py --participantes configs.json --comparar torneo.json
+configs.json: [{"nombre": "dificil_sin_busqueda", "dificultad": "dificil",
+                "config": {"presupuesto_busqueda": 0}}, ...]
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from bot_ai import CariocaBotAI
+from self_play import PARTIDAS_POR_LOTE, cubeta_latencia, percentil_us
+from simulator import SimuladorCarioca
+
+ELO_BASE = 1500.0
+_ESCALA_ELO = 400 / math.log(10)
+
+# Un empate virtual por pareja: evita ratings infinitos con 100% de victorias
+EMPATES_PREVIOS = 1.0
+
+Participante = Tuple[str, str, Optional[Dict]]  # nombre, dificultad, ajustes de config
+
+
+def crear_bot(participante: Participante, tiempo_real: bool = False) -> CariocaBotAI:
+    """
+    Sin tiempo_real la búsqueda corre sus simulaciones configuradas sin reloj: el torneo
+    se repite con la semilla, pero los participantes que solo difieren en
+    presupuesto_busqueda juegan igual
+    """
+    _, dificultad, config = participante
+    bot = CariocaBotAI(dificultad, config)
+    if bot.busqueda is not None and not tiempo_real:
+        bot.busqueda.sin_reloj(bot.busqueda.simulaciones)
+    return bot
+
+
+def jugar_enfrentamiento(tarea: Tuple[Participante, Participante, int, int, bool]) -> List[Dict]:
+    """
+    Juega 'cantidad' repartos entre dos participantes, cada uno con ambos órdenes de asiento
+    Todas las parejas usan las mismas semillas de reparto
+    """
+    a, b, semilla, cantidad, tiempo_real = tarea
+    random.seed(semilla)
+    bots = {a[0]: crear_bot(a, tiempo_real), b[0]: crear_bot(b, tiempo_real)}
+
+    resumenes = []
+    for i in range(cantidad):
+        for asientos in ((a[0], b[0]), (b[0], a[0])):
+            partida = SimuladorCarioca([bots[nombre] for nombre in asientos], semilla=semilla + i,
+                                       simulaciones_busqueda=None).jugar_partida()
+            latencias = []
+            for jugador in partida['jugadores']:
+                histograma = defaultdict(int)
+                for ns in jugador['latencias_ns']:
+                    histograma[cubeta_latencia(ns)] += 1
+                latencias.append({'histograma': dict(histograma), 'total_ns': sum(jugador['latencias_ns'])})
+            resumenes.append({
+                'semilla': partida['semilla'],
+                'asientos': list(asientos),
+                'puntos_totales': partida['puntos_totales'],
+                'latencias': latencias
+            })
+    return resumenes
+
+
+def ejecutar_torneo(participantes: Sequence[Participante], partidas: int, semilla: int = 0,
+                    procesos: Optional[int] = None,
+                    por_lote: int = PARTIDAS_POR_LOTE // 2,
+                    tiempo_real: bool = False) -> Iterator[Dict]:
+    """
+    Reparte los enfrentamientos en lotes de repartos entre procesos
+    'partidas': repartos por pareja (cada uno son dos partidas)
+    """
+    procesos = procesos or os.cpu_count() or 1
+    tareas = [
+        (a, b, semilla + inicio, min(por_lote, partidas - inicio), tiempo_real)
+        for a, b in itertools.combinations(participantes, 2)
+        for inicio in range(0, partidas, por_lote)
+    ]
+
+    if procesos == 1:
+        for tarea in tareas:
+            yield from jugar_enfrentamiento(tarea)
+        return
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        pendientes = set()
+        for tarea in tareas:
+            pendientes.add(pool.submit(jugar_enfrentamiento, tarea))
+            if len(pendientes) >= 2 * procesos:
+                listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    yield from futuro.result()
+        for futuro in as_completed(pendientes):
+            yield from futuro.result()
+
+
+def _invertir(matriz: List[List[float]]) -> List[List[float]]:
+    """Inversa por Gauss-Jordan (matrices pequeñas: una fila por participante)"""
+    n = len(matriz)
+    filas = [list(fila) + [1.0 if i == j else 0.0 for j in range(n)] for i, fila in enumerate(matriz)]
+    for col in range(n):
+        pivote = max(range(col, n), key=lambda f: abs(filas[f][col]))
+        filas[col], filas[pivote] = filas[pivote], filas[col]
+        divisor = filas[col][col]
+        filas[col] = [v / divisor for v in filas[col]]
+        for f in range(n):
+            if f != col and filas[f][col]:
+                factor = filas[f][col]
+                filas[f] = [v - factor * p for v, p in zip(filas[f], filas[col])]
+    return [fila[n:] for fila in filas]
+
+
+def calcular_elo(nombres: Sequence[str], puntuacion: Dict[Tuple[str, str], float],
+                 jugadas: Dict[Tuple[str, str], int], iteraciones: int = 1000) -> Dict[str, Dict]:
+    """
+    Rating Bradley-Terry en escala Elo (media ELO_BASE) con intervalo de 95%
+    puntuacion[(a, b)]: victorias de a sobre b (empate = 0.5); jugadas[(a, b)]: partidas entre ambos
+    El error estándar sale de la información de Fisher (pseudo-inversa, la media queda fija)
+    """
+    k = len(nombres)
+    parejas = {}
+    for i, j in itertools.combinations(range(k), 2):
+        a, b = nombres[i], nombres[j]
+        n = jugadas.get((a, b), 0) + jugadas.get((b, a), 0)
+        if n:
+            parejas[i, j] = (n + 2 * EMPATES_PREVIOS,
+                             puntuacion.get((a, b), 0.0) + EMPATES_PREVIOS)
+
+    # Algoritmo MM de Hunter sobre las fuerzas
+    fuerza = [1.0] * k
+    for _ in range(iteraciones):
+        ganadas = [0.0] * k
+        denominador = [0.0] * k
+        for (i, j), (n, s_i) in parejas.items():
+            ganadas[i] += s_i
+            ganadas[j] += n - s_i
+            comun = n / (fuerza[i] + fuerza[j])
+            denominador[i] += comun
+            denominador[j] += comun
+        nueva = [ganadas[i] / denominador[i] if denominador[i] else 1.0 for i in range(k)]
+        media = math.exp(sum(math.log(f) for f in nueva) / k)
+        nueva = [f / media for f in nueva]
+        cambio = max(abs(math.log(n / f)) for n, f in zip(nueva, fuerza))
+        fuerza = nueva
+        if cambio < 1e-10:
+            break
+
+    # Información de Fisher en log-fuerza; (L + J/k)^-1 - J/k es la pseudo-inversa
+    informacion = [[1.0 / k] * k for _ in range(k)]
+    for (i, j), (n, _) in parejas.items():
+        p = fuerza[i] / (fuerza[i] + fuerza[j])
+        w = n * p * (1 - p)
+        informacion[i][i] += w
+        informacion[j][j] += w
+        informacion[i][j] -= w
+        informacion[j][i] -= w
+    covarianza = _invertir(informacion)
+
+    ratings = {}
+    for i, nombre in enumerate(nombres):
+        elo = ELO_BASE + _ESCALA_ELO * math.log(fuerza[i])
+        error = _ESCALA_ELO * math.sqrt(max(0.0, covarianza[i][i] - 1.0 / k))
+        ratings[nombre] = {'elo': elo, 'elo_ic95': [elo - 1.96 * error, elo + 1.96 * error]}
+    return ratings
+
+
+class ResultadosTorneo:
+    """
+    Acumula partidas por participante y por pareja
+    """
+
+    def __init__(self, participantes: Sequence[Participante]):
+        self.participantes = list(participantes)
+        self.partidas = 0
+        self.puntuacion = defaultdict(float)
+        self.jugadas = defaultdict(int)
+        self.resultados = defaultdict(lambda: [0, 0, 0])  # victorias, empates, derrotas
+        self.puntos = defaultdict(int)
+        self.latencias = defaultdict(lambda: defaultdict(int))
+        self.tiempo_ns = defaultdict(int)
+
+    def agregar(self, resumen: Dict):
+        self.partidas += 1
+        a, b = resumen['asientos']
+        puntos_a, puntos_b = resumen['puntos_totales']
+        # Gana quien termina con menos puntos
+        resultado_a = 1.0 if puntos_a < puntos_b else 0.0 if puntos_a > puntos_b else 0.5
+        self.puntuacion[a, b] += resultado_a
+        self.puntuacion[b, a] += 1 - resultado_a
+        self.jugadas[a, b] += 1
+        self.resultados[a][{1.0: 0, 0.5: 1, 0.0: 2}[resultado_a]] += 1
+        self.resultados[b][{0.0: 0, 0.5: 1, 1.0: 2}[resultado_a]] += 1
+
+        for nombre, puntos, latencia in zip(resumen['asientos'], resumen['puntos_totales'],
+                                            resumen['latencias']):
+            self.puntos[nombre] += puntos
+            self.tiempo_ns[nombre] += latencia['total_ns']
+            for cubeta, veces in latencia['histograma'].items():
+                self.latencias[nombre][int(cubeta)] += veces
+
+    def reporte(self) -> Dict:
+        nombres = [p[0] for p in self.participantes]
+        ratings = calcular_elo(nombres, self.puntuacion, self.jugadas)
+
+        participantes = {}
+        for nombre, dificultad, config in self.participantes:
+            victorias, empates, derrotas = self.resultados[nombre]
+            jugadas = victorias + empates + derrotas
+            decisiones = sum(self.latencias[nombre].values())
+            participantes[nombre] = {
+                'dificultad': dificultad,
+                'config': config or {},
+                **ratings[nombre],
+                'partidas': jugadas,
+                'victorias': victorias,
+                'empates': empates,
+                'derrotas': derrotas,
+                'puntos_promedio': self.puntos[nombre] / jugadas if jugadas else 0.0,
+                'decisiones': decisiones,
+                'decisiones_por_segundo': decisiones / (self.tiempo_ns[nombre] / 1e9) if self.tiempo_ns[nombre] else 0.0,
+                'latencia_p50_us': percentil_us(self.latencias[nombre], 0.50),
+                'latencia_p99_us': percentil_us(self.latencias[nombre], 0.99)
+            }
+
+        enfrentamientos = []
+        for a, b in itertools.combinations(nombres, 2):
+            jugadas = self.jugadas[a, b] + self.jugadas[b, a]
+            enfrentamientos.append({
+                'a': a,
+                'b': b,
+                'partidas': jugadas,
+                'puntuacion_a': self.puntuacion[a, b],
+                'puntuacion_b': self.puntuacion[b, a]
+            })
+
+        return {
+            'partidas': self.partidas,
+            'participantes': participantes,
+            'enfrentamientos': enfrentamientos
+        }
+
+
+def _commit_actual() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def leer_participantes(ruta: Optional[str], dificultades: Sequence[str]) -> List[Participante]:
+    """Participantes de un JSON (nombre, dificultad, config) y/o dificultades sueltas"""
+    participantes = [(dificultad, dificultad, None) for dificultad in dificultades]
+    if ruta:
+        with open(ruta, encoding='utf-8') as archivo:
+            for entrada in json.load(archivo):
+                participantes.append((entrada['nombre'], entrada.get('dificultad', 'medio'), entrada.get('config')))
+    nombres = [p[0] for p in participantes]
+    if len(set(nombres)) != len(nombres):
+        raise ValueError("Los nombres de los participantes deben ser únicos")
+    if len(participantes) < 2:
+        raise ValueError("Se necesitan al menos dos participantes")
+    return participantes
+
+
+def imprimir(reporte: Dict, base: Dict = None):
+    print(f"{'participante':24} {'elo':>7} {'ic 95%':>17} {'victorias':>10} {'dec/s':>9} "
+          f"{'p99 µs':>9} {'vs base':>9}")
+    ordenados = sorted(reporte['participantes'].items(), key=lambda x: -x[1]['elo'])
+    for nombre, datos in ordenados:
+        bajo, alto = datos['elo_ic95']
+        delta = ''
+        anterior = (base or {}).get('participantes', {}).get(nombre)
+        if anterior:
+            delta = f"{datos['elo'] - anterior['elo']:+.0f}"
+        tasa = datos['victorias'] / datos['partidas'] if datos['partidas'] else 0.0
+        print(f"{nombre:24} {datos['elo']:7.0f} [{bajo:6.0f}, {alto:6.0f}] {tasa:10.1%} "
+              f"{datos['decisiones_por_segundo']:9.0f} {datos['latencia_p99_us']:9.0f} {delta:>9}")
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Torneo de bots con rating Elo')
+    parser.add_argument('--bots', nargs='*', default=[], help='dificultades que participan tal cual')
+    parser.add_argument('--participantes', help='JSON con [{"nombre", "dificultad", "config"}]')
+    parser.add_argument('--partidas', type=int, default=100, help='repartos por pareja (dos partidas cada uno)')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--procesos', type=int, default=None, help='por defecto, un proceso por núcleo')
+    parser.add_argument('--tiempo-real', action='store_true',
+                        help='búsqueda con su presupuesto de tiempo (no se repite con la semilla)')
+    parser.add_argument('--salida', help='escribe el reporte como JSON')
+    parser.add_argument('--comparar', help='reporte JSON anterior contra el cual comparar el Elo')
+    args = parser.parse_args(argv)
+
+    dificultades = args.bots if args.bots or args.participantes else ['facil', 'medio', 'dificil']
+    participantes = leer_participantes(args.participantes, dificultades)
+
+    resultados = ResultadosTorneo(participantes)
+    inicio = time.perf_counter()
+    for resumen in ejecutar_torneo(participantes, args.partidas, args.semilla, args.procesos,
+                                   tiempo_real=args.tiempo_real):
+        resultados.agregar(resumen)
+    duracion = time.perf_counter() - inicio
+
+    reporte = resultados.reporte()
+    reporte.update({
+        'semilla': args.semilla,
+        'repartos_por_pareja': args.partidas,
+        'tiempo_real': args.tiempo_real,
+        'segundos': duracion,
+        'commit': _commit_actual(),
+        'python': platform.python_version(),
+        'maquina': platform.machine()
+    })
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+
+    imprimir(reporte, base)
+    print(f"{resultados.partidas} partidas en {duracion:.1f}s")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
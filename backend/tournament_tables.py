@@ -0,0 +1,214 @@
+"""
+Torneos por mesas (también duplicados)
+Crea las mesas de un cuadro: las que tienen humanos pasan por
+CariocaGameManager.crear_partida_completa y se juegan en el servidor; las de solo bots
+se juegan en un pool de procesos con el simulador, fuera del proceso web. Con un lote de
+repartos las mesas con el mismo reparto_id reciben exactamente las mismas cartas.
+Las posiciones se actualizan a medida que terminan las mesas
+"""
+import random
+from concurrent.futures import Future, ProcessPoolExecutor
+from threading import Condition
+from typing import Callable, Dict, List, Optional, Sequence
+
+from bot_ai import CariocaBotAI
+from config import Config
+from deal_generator import LoteRepartos
+from simulator import SimuladorCarioca
+
+# Lotes de repartos abiertos en cada proceso del pool (mmap compartido entre mesas)
+_repartos_abiertos: Dict[str, LoteRepartos] = {}
+
+
+def _lote_repartos(ruta: str) -> LoteRepartos:
+    if ruta not in _repartos_abiertos:
+        _repartos_abiertos[ruta] = LoteRepartos.abrir(ruta)
+    return _repartos_abiertos[ruta]
+
+
+def jugar_mesa_bots(tarea: Dict) -> Dict:
+    """
+    Juega una mesa de solo bots dentro de un proceso del pool
+    tarea: {'bots': [{'dificultad', 'config'}], 'semilla', 'ruta_repartos', 'reparto_id'}
+    """
+    random.seed(tarea['semilla'])
+    bots = [CariocaBotAI(bot['dificultad'], bot.get('config')) for bot in tarea['bots']]
+    reparto = reparto_id = None
+    if tarea.get('ruta_repartos') and tarea.get('reparto_id') is not None:
+        reparto_id = tarea['reparto_id']
+        reparto = _lote_repartos(tarea['ruta_repartos']).reparto(reparto_id)
+    partida = SimuladorCarioca(bots, semilla=tarea['semilla'], reparto=reparto,
+                               reparto_id=reparto_id).jugar_partida()
+    return {'puntos_totales': partida['puntos_totales'], 'ganador': partida['ganador']}
+
+
+class TorneoMesas:
+    """
+    Cuadro de un torneo: participantes por nombre y mesas con los nombres sentados en orden
+    participantes: {nombre: {'usuario_id': id}} para humanos, {nombre: {'dificultad', 'config'}} para bots
+    mesas: [{'jugadores': [nombre, ...], 'reparto_id': n (opcional)}]
+    Sin reparto_id, la mesa i usa el reparto i (si hay lote de repartos)
+    """
+
+    def __init__(self, game_manager, participantes: Dict[str, Dict], mesas: Sequence[Dict],
+                 semilla: int = 0, ruta_repartos: Optional[str] = None, procesos: Optional[int] = None,
+                 al_terminar_mesa: Optional[Callable[[int, Dict], None]] = None):
+        self.game_manager = game_manager
+        self.participantes = participantes
+        self.mesas = [dict(mesa) for mesa in mesas]
+        self.semilla = semilla
+        self.ruta_repartos = ruta_repartos
+        self.procesos = procesos
+        self.al_terminar_mesa = al_terminar_mesa
+
+        for i, mesa in enumerate(self.mesas):
+            jugadores = mesa['jugadores']
+            if not Config.MIN_JUGADORES_POR_PARTIDA <= len(jugadores) <= Config.MAX_JUGADORES_POR_PARTIDA:
+                raise ValueError(f"La mesa {i} debe tener entre {Config.MIN_JUGADORES_POR_PARTIDA} y "
+                                 f"{Config.MAX_JUGADORES_POR_PARTIDA} jugadores")
+            desconocidos = [nombre for nombre in jugadores if nombre not in participantes]
+            if desconocidos:
+                raise ValueError(f"Participantes desconocidos en la mesa {i}: {', '.join(desconocidos)}")
+            if ruta_repartos and mesa.get('reparto_id') is None:
+                mesa['reparto_id'] = i
+
+        self.resultados: Dict[int, Dict] = {}
+        self.partidas: Dict[int, int] = {}  # mesa -> partida_id de las mesas con humanos
+        self.errores: Dict[int, str] = {}
+        self._lock = Condition()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._mesas_bots_pendientes = 0
+
+    def _es_humano(self, nombre: str) -> bool:
+        return 'usuario_id' in self.participantes[nombre]
+
+    def iniciar(self) -> Dict:
+        """
+        Crea las mesas con humanos en la base de datos y lanza las de solo bots en el pool
+        Vuelve de inmediato; las mesas de bots se registran al terminar
+        """
+        if self.ruta_repartos and self.game_manager.repartos is None:
+            self.game_manager.repartos = LoteRepartos.abrir(self.ruta_repartos)
+
+        tareas = []
+        for i, mesa in enumerate(self.mesas):
+            jugadores = mesa['jugadores']
+            if any(self._es_humano(nombre) for nombre in jugadores):
+                self._crear_mesa_servidor(i, mesa)
+            else:
+                tareas.append((i, {
+                    'bots': [self.participantes[nombre] for nombre in jugadores],
+                    'semilla': self.semilla + i,
+                    'ruta_repartos': self.ruta_repartos,
+                    'reparto_id': mesa.get('reparto_id')
+                }))
+
+        if tareas:
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos)
+            with self._lock:
+                self._mesas_bots_pendientes += len(tareas)
+            for i, tarea in tareas:
+                futuro = self._pool.submit(jugar_mesa_bots, tarea)
+                futuro.add_done_callback(lambda f, mesa=i: self._mesa_bots_terminada(mesa, f))
+
+        return {
+            'mesas': len(self.mesas),
+            'mesas_servidor': dict(self.partidas),
+            'mesas_bots': len(tareas),
+            'errores': dict(self.errores)
+        }
+
+    def _crear_mesa_servidor(self, i: int, mesa: Dict):
+        # Sentados en el orden del cuadro: el asiento decide qué mano del reparto recibe cada uno
+        resultado = self.game_manager.crear_partida_completa({
+            'tipo': 'privada',
+            'max_jugadores': len(mesa['jugadores']),
+            'asientos': [self.participantes[nombre] for nombre in mesa['jugadores']],
+            'reparto_id': mesa.get('reparto_id'),
+            'torneo': {'mesa': i, 'semilla': self.semilla}
+        })
+        if resultado.get('exito'):
+            self.partidas[i] = resultado['partida_id']
+            self.game_manager.al_terminar_por_partida[resultado['partida_id']] = (
+                lambda fin, mesa=i: self._mesa_servidor_terminada(mesa, fin))
+        else:
+            self.errores[i] = resultado.get('error', 'Error creando la mesa')
+
+    def _mesa_servidor_terminada(self, mesa: int, fin: Dict):
+        """Resultado de la partida del servidor (game_manager._terminar_partida) por asiento"""
+        jugadores = sorted(fin['jugadores'], key=lambda jugador: jugador['posicion'])
+        self.registrar_resultado(mesa, [fin['puntos_totales'][jugador['id']] for jugador in jugadores])
+
+    def _mesa_bots_terminada(self, mesa: int, futuro: Future):
+        try:
+            self.registrar_resultado(mesa, futuro.result()['puntos_totales'])
+        except Exception as e:
+            with self._lock:
+                self.errores[mesa] = f"Error jugando la mesa: {str(e)}"
+        finally:
+            with self._lock:
+                self._mesas_bots_pendientes -= 1
+                self._lock.notify_all()
+
+    def registrar_resultado(self, mesa: int, puntos_totales: Sequence[int]):
+        """
+        Anota el resultado de una mesa (puntos por asiento, en el orden de 'jugadores')
+        Las mesas con humanos lo reportan al terminar su partida en el servidor
+        """
+        puntos = list(puntos_totales)
+        resultado = {
+            'jugadores': list(self.mesas[mesa]['jugadores']),
+            'puntos_totales': puntos,
+            'ganador': puntos.index(min(puntos))
+        }
+        with self._lock:
+            self.resultados[mesa] = resultado
+        if self.al_terminar_mesa:
+            self.al_terminar_mesa(mesa, resultado)
+
+    def terminado(self) -> bool:
+        with self._lock:
+            return len(self.resultados.keys() | self.errores.keys()) == len(self.mesas)
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que terminen y se registren las mesas de bots (las de humanos siguen
+        su propio ritmo); False si se cumplió el timeout
+        """
+        with self._lock:
+            listas = self._lock.wait_for(lambda: self._mesas_bots_pendientes == 0, timeout)
+        if listas and self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        return listas
+
+    def posiciones(self) -> List[Dict]:
+        """
+        Tabla de posiciones con las mesas terminadas: más victorias y luego menos puntos
+        En duplicado, 'diferencia_duplicado' compara los puntos de cada jugador con el
+        promedio de quienes se sentaron en el mismo asiento del mismo reparto
+        """
+        with self._lock:
+            resultados = [(self.mesas[i], r) for i, r in self.resultados.items()]
+
+        por_asiento = {}
+        for mesa, resultado in resultados:
+            for asiento, puntos in enumerate(resultado['puntos_totales']):
+                clave = (mesa.get('reparto_id'), len(resultado['jugadores']), asiento)
+                por_asiento.setdefault(clave, []).append(puntos)
+
+        tabla = {}
+        for mesa, resultado in resultados:
+            for asiento, (nombre, puntos) in enumerate(zip(resultado['jugadores'], resultado['puntos_totales'])):
+                fila = tabla.setdefault(nombre, {
+                    'nombre': nombre, 'mesas': 0, 'victorias': 0, 'puntos': 0, 'diferencia_duplicado': 0.0
+                })
+                fila['mesas'] += 1
+                fila['puntos'] += puntos
+                if asiento == resultado['ganador']:
+                    fila['victorias'] += 1
+                if mesa.get('reparto_id') is not None:
+                    mismos = por_asiento[(mesa.get('reparto_id'), len(resultado['jugadores']), asiento)]
+                    fila['diferencia_duplicado'] += puntos - sum(mismos) / len(mismos)
+
+        return sorted(tabla.values(), key=lambda fila: (-fila['victorias'], fila['puntos']))
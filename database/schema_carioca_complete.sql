@@ -62,7 +62,7 @@ CREATE TABLE partida_jugadores (
     dificultad_bot ENUM('facil', 'medio', 'dificil') NULL,
     puntos_ronda INT DEFAULT 0,
     puntos_totales INT DEFAULT 0,
-    cartas_en_mano JSON, -- Array de cartas
+    cartas_en_mano VARBINARY(113), -- Versión + un byte por carta (card_codec.empaquetar_cartas)
     ha_bajado BOOLEAN DEFAULT FALSE,
     combinaciones_bajadas JSON, -- Array de combinaciones
     estado ENUM('activo', 'desconectado', 'eliminado') DEFAULT 'activo',
@@ -96,9 +96,9 @@ UPDATE cartas SET baraja = 'roja' WHERE imagen LIKE 'roja/%';
 CREATE TABLE estado_juego (
     id INT AUTO_INCREMENT PRIMARY KEY,
     partida_id INT NOT NULL,
-    mazo JSON NOT NULL, -- Cartas restantes en el mazo
-    descarte JSON NOT NULL, -- Pila de descarte
-    ultima_carta_descartada JSON NULL,
+    mazo VARBINARY(113) NOT NULL, -- Cartas restantes en el mazo (versión + un byte por carta)
+    descarte VARBINARY(113) NOT NULL, -- Pila de descarte (mismo formato)
+    ultima_carta_descartada VARBINARY(2) NULL,
     jugador_turno_id INT NOT NULL,
     fase_turno ENUM('robar', 'bajar', 'descartar') DEFAULT 'robar',
     tiempo_turno_inicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
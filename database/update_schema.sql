@@ -0,0 +1,24 @@
+-- Columnas de cartas en formato binario: un byte de versión + un byte por carta
+-- Aplicar ANTES de desplegar el servidor que escribe el formato nuevo; el servidor sigue
+-- leyendo las filas con el JSON anterior, que se convierten con:
+--     python backend/migrate_card_storage.py
+USE carioca_online;
+
+-- 1. Columnas binarias (MEDIUMBLOB admite el JSON anterior mientras se migra)
+ALTER TABLE estado_juego
+    MODIFY mazo MEDIUMBLOB NOT NULL,
+    MODIFY descarte MEDIUMBLOB NOT NULL,
+    MODIFY ultima_carta_descartada MEDIUMBLOB NULL;
+
+ALTER TABLE partida_jugadores
+    MODIFY cartas_en_mano MEDIUMBLOB;
+
+-- 2. python backend/migrate_card_storage.py
+
+-- 3. Con todas las filas migradas, achicar las columnas al tamaño del formato binario
+-- ALTER TABLE estado_juego
+--     MODIFY mazo VARBINARY(113) NOT NULL,
+--     MODIFY descarte VARBINARY(113) NOT NULL,
+--     MODIFY ultima_carta_descartada VARBINARY(2) NULL;
+-- ALTER TABLE partida_jugadores
+--     MODIFY cartas_en_mano VARBINARY(113);